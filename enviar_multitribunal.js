@@ -14,7 +14,16 @@ const ROBOS = {
   trf3: "robo_trf3.py",
   trt2: "robo_trt2.py",
 };
+const ROBO_WORKER = "robo_worker.py";
+const WORKER_ESPERA_APOS_FALHA_MS = 5 * 60 * 1000;
+const WORKER_TIMEOUT_INICIO_MS = 30000;
+const WORKER_LINHAS_STDERR = 20;
 const ENVIOS_EM_ANDAMENTO = new Set();
+// O portal pode ter aceitado a peticao: repetir arriscaria protocolar duas vezes.
+const STATUS_SEM_REPETICAO = new Set(["conferir", "protocolo_ja_acionado", "clique_incerto"]);
+let workerRobo = null;
+let inicioWorkerRobo = null;
+let workerIndisponivelAte = 0;
 
 const TRIBUNAL_LABEL = {
   tjsp: "TJSP",
@@ -150,6 +159,9 @@ function deveRepetirFalha(respostaRobo) {
   if (!respostaRobo || respostaRobo.ok) {
     return false;
   }
+  if (STATUS_SEM_REPETICAO.has(String(respostaRobo.statusExecucao || "").trim().toLowerCase())) {
+    return false;
+  }
   if (falhaDefinitivaParaRetry(respostaRobo)) {
     return false;
   }
@@ -269,10 +281,7 @@ function parseRoboOutput(stdout, fallbackPayload) {
   }
 }
 
-async function executarRoboPython(scriptName, payload) {
-  const scriptPath = path.join(__dirname, scriptName);
-  const payloadSerializado = JSON.stringify(payload);
-  const timeoutMs = obterTimeoutRoboMs(payload);
+function montarCandidatosPython(scriptPath) {
   const candidatos = [];
 
   if ((process.env.PYTHON_BIN || "").trim()) {
@@ -285,6 +294,243 @@ async function executarRoboPython(scriptName, payload) {
   candidatos.push({ comando: "python", args: [scriptPath] });
   candidatos.push({ comando: "py", args: ["-3", scriptPath] });
   candidatos.push({ comando: "py", args: [scriptPath] });
+  return candidatos;
+}
+
+function usarWorkerPersistente() {
+  const valor = String(process.env.PETICIONADOR_ROBO_PERSISTENTE || "")
+    .trim()
+    .toLowerCase();
+  return ["1", "true", "sim", "yes", "on"].includes(valor);
+}
+
+function falhaPeticaoDespachada(motivo) {
+  // A linha ja foi entregue ao worker: o robo pode ter protocolado antes de morrer.
+  // Repetir em outro processo arriscaria um protocolo em dobro.
+  const falha = new Error(`Worker do robo parou durante a peticao: ${motivo.message}`);
+  falha.peticaoDespachada = true;
+  return falha;
+}
+
+function encerrarWorkerRobo(worker, motivo) {
+  if (!worker) {
+    return;
+  }
+  if (workerRobo === worker) {
+    workerRobo = null;
+  }
+  for (const pendente of worker.pendentes.values()) {
+    clearTimeout(pendente.timer);
+    pendente.reject(falhaPeticaoDespachada(motivo));
+  }
+  worker.pendentes.clear();
+  worker.rejeitarInicio(motivo);
+  try {
+    worker.processo.kill();
+  } catch (_error) {}
+}
+
+function repassarStderrWorker(worker, chunk) {
+  const linhas = `${worker.stderrParcial}${chunk.toString()}`.split(/\r?\n/);
+  worker.stderrParcial = linhas.pop();
+  for (const linha of linhas) {
+    if (!linha.trim()) {
+      continue;
+    }
+    process.stderr.write(`[${ROBO_WORKER}] ${linha}\n`);
+    worker.stderrRecente.push(linha);
+    if (worker.stderrRecente.length > WORKER_LINHAS_STDERR) {
+      worker.stderrRecente.shift();
+    }
+  }
+}
+
+function iniciarWorkerRobo(candidato) {
+  const processo = spawn(candidato.comando, candidato.args, {
+    cwd: __dirname,
+    windowsHide: true,
+  });
+  const worker = {
+    processo,
+    candidato,
+    buffer: "",
+    stderrParcial: "",
+    stderrRecente: [],
+    pendentes: new Map(),
+    fila: Promise.resolve(),
+  };
+  // O worker so conta como iniciado depois de responder a um ping: interpretador
+  // inexistente ou import quebrado falham aqui, antes de qualquer peticao ser enviada.
+  worker.pronto = new Promise((resolve, reject) => {
+    const timer = setTimeout(() => {
+      const falha = new Error(`Worker do robo nao respondeu em ${WORKER_TIMEOUT_INICIO_MS} ms.`);
+      encerrarWorkerRobo(worker, falha);
+    }, WORKER_TIMEOUT_INICIO_MS);
+    worker.confirmarInicio = () => {
+      clearTimeout(timer);
+      resolve(worker);
+    };
+    worker.rejeitarInicio = (motivo) => {
+      clearTimeout(timer);
+      reject(motivo);
+    };
+  });
+  worker.pronto.catch(() => {});
+
+  processo.stdout.on("data", (chunk) => {
+    worker.buffer += chunk.toString();
+    const linhas = worker.buffer.split(/\r?\n/);
+    worker.buffer = linhas.pop();
+    for (const linha of linhas) {
+      if (!linha.trim()) {
+        continue;
+      }
+      let resposta = null;
+      try {
+        resposta = JSON.parse(linha);
+      } catch (_error) {
+        continue;
+      }
+      if (resposta.requisicaoId === "inicio") {
+        worker.confirmarInicio();
+        continue;
+      }
+      const pendente = worker.pendentes.get(resposta.requisicaoId);
+      if (!pendente) {
+        continue;
+      }
+      worker.pendentes.delete(resposta.requisicaoId);
+      clearTimeout(pendente.timer);
+      delete resposta.requisicaoId;
+      pendente.resolve(resposta);
+    }
+  });
+  processo.stderr.on("data", (chunk) => repassarStderrWorker(worker, chunk));
+  processo.on("error", (error) => {
+    encerrarWorkerRobo(worker, new Error(`Worker do robo indisponivel: ${error.message}`));
+  });
+  processo.on("close", (code) => {
+    const stderr = worker.stderrRecente.join(" | ");
+    encerrarWorkerRobo(
+      worker,
+      new Error(`Worker do robo encerrado com codigo ${code}.${stderr ? ` STDERR: ${stderr}` : ""}`)
+    );
+  });
+  processo.stdin.on("error", () => {});
+  processo.stdin.write(`${JSON.stringify({ comando: "ping", requisicaoId: "inicio" })}\n`);
+
+  return worker;
+}
+
+async function iniciarWorkerComCandidatos() {
+  const falhas = [];
+  for (const candidato of montarCandidatosPython(path.join(__dirname, ROBO_WORKER))) {
+    try {
+      return await iniciarWorkerRobo(candidato).pronto;
+    } catch (error) {
+      falhas.push(`${candidato.comando}: ${error.message}`);
+    }
+  }
+  throw new Error(`Nenhum interpretador iniciou o worker do robo. ${falhas.join(" | ")}`);
+}
+
+async function obterWorkerRobo() {
+  if (workerRobo) {
+    return workerRobo;
+  }
+  if (Date.now() < workerIndisponivelAte) {
+    const falha = new Error("Worker do robo indisponivel apos falha recente ao iniciar.");
+    falha.workerIndisponivel = true;
+    throw falha;
+  }
+  if (!inicioWorkerRobo) {
+    // Requisicoes simultaneas esperam o mesmo inicio em vez de abrir um worker cada.
+    inicioWorkerRobo = iniciarWorkerComCandidatos()
+      .then((worker) => {
+        workerRobo = worker;
+        return worker;
+      })
+      .catch((error) => {
+        workerIndisponivelAte = Date.now() + WORKER_ESPERA_APOS_FALHA_MS;
+        error.workerIndisponivel = true;
+        throw error;
+      })
+      .finally(() => {
+        inicioWorkerRobo = null;
+      });
+  }
+  return inicioWorkerRobo;
+}
+
+async function executarViaWorker(payload, timeoutMs) {
+  const worker = await obterWorkerRobo();
+  const requisicaoId = crypto.randomBytes(8).toString("hex");
+
+  // O worker atende uma peticao por vez; o timeout so comeca a contar quando a
+  // requisicao sai da fila local, para nao penalizar quem esperou a vez.
+  const execucao = worker.fila.then(
+    () =>
+      new Promise((resolve, reject) => {
+        if (workerRobo !== worker) {
+          const falha = new Error("Worker do robo reiniciado.");
+          falha.workerIndisponivel = true;
+          reject(falha);
+          return;
+        }
+        const timer = setTimeout(() => {
+          encerrarWorkerRobo(worker, new Error(`Timeout ao executar: ${ROBO_WORKER}`));
+        }, timeoutMs);
+        worker.pendentes.set(requisicaoId, { resolve, reject, timer });
+        worker.processo.stdin.write(`${JSON.stringify({ ...payload, requisicaoId })}\n`);
+      })
+  );
+  worker.fila = execucao.catch(() => {});
+  return execucao;
+}
+
+function falhaPeticaoInterrompida(payload, erro) {
+  return {
+    ok: false,
+    statusExecucao: "conferir",
+    mensagem:
+      "O worker do robo parou com a peticao em andamento. " +
+      "Confira no portal antes de enviar de novo.",
+    tribunal: payload.tribunal,
+    protocolo: payload.protocolo,
+    erroOriginal: erro.message,
+  };
+}
+
+function falhaExecucaoPython(payload, erro) {
+  return {
+    ok: false,
+    simulado: true,
+    mensagem:
+      "Nao foi possivel executar robo Python. Configure python/py no PATH ou PYTHON_BIN.",
+    tribunal: payload.tribunal,
+    protocolo: payload.protocolo,
+    erroOriginal: erro ? erro.message : "Erro desconhecido",
+  };
+}
+
+async function executarRoboPython(scriptName, payload) {
+  const scriptPath = path.join(__dirname, scriptName);
+  const payloadSerializado = JSON.stringify(payload);
+  const timeoutMs = obterTimeoutRoboMs(payload);
+  const candidatos = montarCandidatosPython(scriptPath);
+
+  if (usarWorkerPersistente()) {
+    try {
+      return await executarViaWorker(payload, timeoutMs);
+    } catch (error) {
+      if (error.peticaoDespachada) {
+        return falhaPeticaoInterrompida(payload, error);
+      }
+      if (!error.workerIndisponivel) {
+        return falhaExecucaoPython(payload, error);
+      }
+    }
+  }
 
   let ultimoErro = null;
   for (const candidato of candidatos) {
@@ -301,15 +547,7 @@ async function executarRoboPython(scriptName, payload) {
     }
   }
 
-  return {
-    ok: false,
-    simulado: true,
-    mensagem:
-      "Nao foi possivel executar robo Python. Configure python/py no PATH ou PYTHON_BIN.",
-    tribunal: payload.tribunal,
-    protocolo: payload.protocolo,
-    erroOriginal: ultimoErro ? ultimoErro.message : "Erro desconhecido",
-  };
+  return falhaExecucaoPython(payload, ultimoErro);
 }
 
 function validarEntrada({ tribunal, numeroProcesso, arquivo }) {
@@ -635,8 +873,14 @@ async function enviarLotePorPdfs({
   };
 }
 
+process.on("exit", () => {
+  encerrarWorkerRobo(workerRobo, new Error("Aplicativo encerrado."));
+});
+
 module.exports = {
+  deveRepetirFalha,
   enviarLote,
   enviarLotePorPdfs,
   enviarPeticao,
+  falhaPeticaoInterrompida,
 };
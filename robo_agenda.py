@@ -0,0 +1,114 @@
+import heapq
+import time
+from datetime import datetime, time as hora
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+# Sem prazo o trabalho vai para o fim da fila EDF (31/12/9999), sem precisar de NULL no indice.
+SEM_PRAZO = 253402300799.0
+DURACAO_PADRAO_SEGUNDOS = {"real": 240.0, "simulado": 1.0}
+AMOSTRAS_DURACAO = 50
+
+
+def _texto(valor: Any) -> str:
+    return str(valor or "").strip()
+
+
+def prazo_payload(payload: Dict[str, Any]) -> float:
+    # "2026-10-20" vale ate o fim do dia; data/hora sem fuso e hora local, como no forum.
+    texto = _texto(payload.get("prazo"))
+    if not texto:
+        return SEM_PRAZO
+    try:
+        if len(texto) == 10:
+            return datetime.combine(datetime.strptime(texto, "%Y-%m-%d").date(), hora(23, 59, 59)).timestamp()
+        return datetime.fromisoformat(texto.replace("Z", "+00:00")).timestamp()
+    except ValueError as error:
+        raise ValueError(f"Prazo invalido no payload: {texto!r}. Use data ISO (AAAA-MM-DD) ou data/hora ISO.") from error
+
+
+def prazo_payload_seguro(payload: Dict[str, Any]) -> float:
+    try:
+        return prazo_payload(payload)
+    except ValueError:
+        return SEM_PRAZO
+
+
+def chave_estimativa(tribunal: str, modo_execucao: str) -> str:
+    modo = "real" if _texto(modo_execucao).lower() in ("real", "real_assistido") else "simulado"
+    return f"{_texto(tribunal).lower()}|{modo}"
+
+
+def chave_estimativa_payload(payload: Dict[str, Any]) -> str:
+    return chave_estimativa(_texto(payload.get("tribunal")), _texto(payload.get("modoExecucao")))
+
+
+def duracao_padrao(chave: str) -> float:
+    return DURACAO_PADRAO_SEGUNDOS["real" if chave.endswith("|real") else "simulado"]
+
+
+def mediana(valores: List[float]) -> float:
+    ordenados = sorted(valores)
+    meio = len(ordenados) // 2
+    return ordenados[meio] if len(ordenados) % 2 else (ordenados[meio - 1] + ordenados[meio]) / 2
+
+
+def estimar_duracoes(
+    tentativas: Iterable[Tuple[str, float]],
+    passos: Iterable[Tuple[str, str, float]],
+) -> Dict[str, Any]:
+    # tentativas: (chave, duracao em segundos); passos: (chave, passo, segundos desde o inicio da tentativa).
+    # Mediana e nao media: um login travado ate o timeout nao deve inflar a previsao de todos.
+    por_chave: Dict[str, List[float]] = {}
+    for chave, duracao in tentativas:
+        amostras = por_chave.setdefault(chave, [])
+        if len(amostras) < AMOSTRAS_DURACAO:
+            amostras.append(duracao)
+    por_passo: Dict[Tuple[str, str], List[float]] = {}
+    for chave, passo, decorrido in passos:
+        amostras = por_passo.setdefault((chave, passo.split(":", 1)[0]), [])
+        if len(amostras) < AMOSTRAS_DURACAO:
+            amostras.append(decorrido)
+    return {
+        "total": {chave: mediana(valores) for chave, valores in por_chave.items()},
+        "passos": {chave: mediana(valores) for chave, valores in por_passo.items()},
+    }
+
+
+def duracao_restante(estimativas: Dict[str, Any], chave: str, ultimo_passo: str, decorrido: float) -> float:
+    total = estimativas["total"].get(chave, duracao_padrao(chave))
+    # Pelo passo ja alcancado, e nao pelo relogio: um robo lento no login ainda tem o resto todo pela frente.
+    alcancado = estimativas["passos"].get((chave, ultimo_passo.split(":", 1)[0]), decorrido) if ultimo_passo else 0.0
+    return max(0.0, total - min(alcancado, total))
+
+
+def prever_conclusoes(
+    em_execucao: List[Dict[str, Any]],
+    pendentes: List[Dict[str, Any]],
+    estimativas: Dict[str, Any],
+    paralelo: int,
+    agora: float = 0.0,
+) -> List[Dict[str, Any]]:
+    # Simula a fila EDF com o ritmo atual: "paralelo" robos, cada um pega o pendente de prazo mais curto.
+    agora = agora or time.time()
+    livres = [agora] * max(1, paralelo)
+    ocupados = sorted(agora + item["restante"] for item in em_execucao)
+    for indice, fim in enumerate(ocupados[: len(livres)]):
+        livres[indice] = fim
+    heapq.heapify(livres)
+    previsoes: List[Dict[str, Any]] = []
+    for item in sorted(pendentes, key=lambda item: (item["prazo"], item["disponivelEm"], item["id"])):
+        inicio = max(heapq.heappop(livres), item["disponivelEm"])
+        fim = inicio + estimativas["total"].get(item["chave"], duracao_padrao(item["chave"]))
+        heapq.heappush(livres, fim)
+        com_prazo = item["prazo"] < SEM_PRAZO
+        previsoes.append(
+            {
+                "id": item["id"],
+                "inicioPrevisto": inicio,
+                "terminoPrevisto": fim,
+                "folgaSegundos": round(item["prazo"] - fim, 1) if com_prazo else None,
+                "emRisco": com_prazo and fim > item["prazo"],
+            }
+        )
+    return previsoes
@@ -0,0 +1,274 @@
+import atexit
+import contextlib
+import contextvars
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Union
+
+
+GRAVADOR_THREADS_PADRAO = 2
+GRAVADOR_MAX_PENDENTES_PADRAO = 8
+NOME_PASTA_OBJETOS = "objetos"
+ORFAOS_IDADE_MINIMA_SEGUNDOS = 3600
+ESQUEMA_OBJETOS = """
+CREATE TABLE IF NOT EXISTS objetos (
+    hash TEXT PRIMARY KEY,
+    arquivo TEXT NOT NULL,
+    tamanho INTEGER NOT NULL,
+    tamanho_gravado INTEGER NOT NULL,
+    referencias INTEGER NOT NULL DEFAULT 0,
+    criado_em TEXT NOT NULL
+);
+"""
+
+
+def gravar_arquivo_duravel(arquivo: Path, dados: Union[bytes, str]) -> None:
+    conteudo = dados.encode("utf-8") if isinstance(dados, str) else dados
+    temporario = Path(f"{arquivo}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(temporario, "wb") as destino:
+        destino.write(conteudo)
+        destino.flush()
+        os.fsync(destino.fileno())
+    os.replace(temporario, arquivo)
+
+
+def _gravar_e_registrar(arquivo: Path, dados: Union[bytes, str], ao_gravar: Optional[Callable[[], None]]) -> None:
+    # Na mesma tarefa: quando descarregar() volta, o registro pos-gravacao tambem ja terminou.
+    gravar_arquivo_duravel(arquivo, dados)
+    if ao_gravar is not None:
+        ao_gravar()
+
+
+class ExecucaoGravacao:
+    # Gravacoes de uma unica execucao do robo: descarregar espera so as dela e devolve so as falhas dela.
+    def __init__(self) -> None:
+        self._trava = threading.Lock()
+        self._pendentes: Set[Future] = set()
+        self._falhas: List[str] = []
+
+    def _registrar(self, futuro: Future) -> None:
+        with self._trava:
+            self._pendentes.add(futuro)
+
+    def _concluir(self, futuro: Future, caminho: str, ok: bool) -> None:
+        with self._trava:
+            self._pendentes.discard(futuro)
+            if not ok:
+                self._falhas.append(caminho)
+
+    def descarregar(self) -> List[str]:
+        with self._trava:
+            pendentes = list(self._pendentes)
+        for futuro in pendentes:
+            try:
+                futuro.result()
+            except Exception:
+                pass
+        with self._trava:
+            falhas, self._falhas = self._falhas, []
+        return falhas
+
+
+_EXECUCAO_ATUAL: contextvars.ContextVar[Optional[ExecucaoGravacao]] = contextvars.ContextVar(
+    "execucao_gravacao", default=None
+)
+
+
+@contextlib.contextmanager
+def execucao_gravacao() -> Iterator[ExecucaoGravacao]:
+    # Cada peticao roda na propria thread (ExecutorPeticoes): o contexto separa as gravacoes de cada uma.
+    execucao = ExecucaoGravacao()
+    token = _EXECUCAO_ATUAL.set(execucao)
+    try:
+        yield execucao
+    finally:
+        _EXECUCAO_ATUAL.reset(token)
+
+
+class GravadorArtefatos:
+    def __init__(
+        self,
+        threads: int = GRAVADOR_THREADS_PADRAO,
+        max_pendentes: int = GRAVADOR_MAX_PENDENTES_PADRAO,
+    ) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="gravador-artefatos")
+        self._vagas = threading.BoundedSemaphore(max(1, max_pendentes))
+        # Gravacoes feitas fora de uma execucao_gravacao() (ex.: scripts avulsos).
+        self._avulsas = ExecucaoGravacao()
+
+    def gravar(
+        self,
+        arquivo: Path,
+        dados: Union[bytes, str],
+        ao_gravar: Optional[Callable[[], None]] = None,
+    ) -> str:
+        # ao_gravar roda so depois do fsync; se ele falhar, o arquivo conta como nao gravado.
+        execucao = _EXECUCAO_ATUAL.get() or self._avulsas
+        # Bloqueia quando a fila esta cheia: o fluxo nunca acumula mais capturas que o disco absorve.
+        self._vagas.acquire()
+        try:
+            futuro = self._executor.submit(_gravar_e_registrar, Path(arquivo), dados, ao_gravar)
+        except Exception:
+            self._vagas.release()
+            raise
+        execucao._registrar(futuro)
+        futuro.add_done_callback(
+            lambda concluido, caminho=str(arquivo): self._concluir(execucao, concluido, caminho)
+        )
+        return str(arquivo)
+
+    def _concluir(self, execucao: ExecucaoGravacao, futuro: Future, caminho: str) -> None:
+        execucao._concluir(futuro, caminho, futuro.exception() is None)
+        self._vagas.release()
+
+    def encerrar(self) -> None:
+        # Espera as gravacoes na fila; as falhas ja foram entregues a quem descarregou a propria execucao.
+        self._executor.shutdown(wait=True)
+
+
+_GRAVADOR: Optional[GravadorArtefatos] = None
+_TRAVA_GRAVADOR = threading.Lock()
+
+
+def gravador_artefatos() -> GravadorArtefatos:
+    global _GRAVADOR
+    with _TRAVA_GRAVADOR:
+        if _GRAVADOR is None:
+            _GRAVADOR = GravadorArtefatos()
+            atexit.register(_GRAVADOR.encerrar)
+        return _GRAVADOR
+
+
+class ArmazemConteudo:
+    def __init__(self, pasta: Path) -> None:
+        self._pasta = Path(pasta)
+        self._pasta.mkdir(parents=True, exist_ok=True)
+        self._banco = self._pasta / "indice.sqlite3"
+        self._trava = threading.Lock()
+        with self._conectar() as conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.executescript(ESQUEMA_OBJETOS)
+
+    @contextlib.contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        conexao = sqlite3.connect(str(self._banco), timeout=30)
+        try:
+            with conexao:
+                yield conexao
+        finally:
+            conexao.close()
+
+    def guardar(
+        self,
+        dados: Union[bytes, str],
+        extensao: str,
+        comprimir: bool = False,
+        gravar: Optional[Callable[[Path, bytes, Callable[[], None]], str]] = None,
+    ) -> Dict[str, Any]:
+        bruto = dados.encode("utf-8") if isinstance(dados, str) else dados
+        digest = hashlib.sha256(bruto).hexdigest()
+        nome = f"{digest}.{extensao}" + (".gz" if comprimir else "")
+        subpasta = self._pasta / digest[:2]
+        arquivo = subpasta / nome
+
+        with self._trava, self._conectar() as conexao:
+            linha = conexao.execute("SELECT arquivo FROM objetos WHERE hash = ?", (digest,)).fetchone()
+            if linha is not None and (self._pasta / linha[0]).exists():
+                conexao.execute("UPDATE objetos SET referencias = referencias + 1 WHERE hash = ?", (digest,))
+                return {"hash": digest, "caminho": str(self._pasta / linha[0]), "tamanho": len(bruto), "novo": False}
+
+        # A linha (e a referencia) so entra depois que o arquivo esta no disco: indice nunca aponta para o vazio.
+        subpasta.mkdir(parents=True, exist_ok=True)
+        conteudo = gzip.compress(bruto, mtime=0) if comprimir else bruto
+
+        def registrar() -> None:
+            self._registrar(digest, arquivo, len(bruto), len(conteudo))
+
+        if gravar is not None:
+            caminho = gravar(arquivo, conteudo, registrar)
+        else:
+            gravar_arquivo_duravel(arquivo, conteudo)
+            registrar()
+            caminho = str(arquivo)
+        if not caminho:
+            return {}
+        return {"hash": digest, "caminho": str(arquivo), "tamanho": len(bruto), "novo": True}
+
+    def _registrar(self, digest: str, arquivo: Path, tamanho: int, tamanho_gravado: int) -> None:
+        with self._trava, self._conectar() as conexao:
+            conexao.execute(
+                "INSERT OR REPLACE INTO objetos "
+                "(hash, arquivo, tamanho, tamanho_gravado, referencias, criado_em) "
+                "VALUES (?, ?, ?, ?, COALESCE((SELECT referencias FROM objetos WHERE hash = ?), 0) + 1, ?)",
+                (
+                    digest,
+                    str(arquivo.relative_to(self._pasta)),
+                    tamanho,
+                    tamanho_gravado,
+                    digest,
+                    datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+                ),
+            )
+
+    def liberar(self, digest: str) -> bool:
+        with self._trava, self._conectar() as conexao:
+            linha = conexao.execute(
+                "SELECT arquivo, referencias FROM objetos WHERE hash = ?", (digest,)
+            ).fetchone()
+            if linha is None:
+                return False
+            if int(linha[1]) > 1:
+                conexao.execute("UPDATE objetos SET referencias = referencias - 1 WHERE hash = ?", (digest,))
+                return False
+            conexao.execute("DELETE FROM objetos WHERE hash = ?", (digest,))
+        with contextlib.suppress(OSError):
+            (self._pasta / linha[0]).unlink()
+        return True
+
+    def liberar_relatorio(self, conteudo: Dict[str, Any]) -> int:
+        return sum(1 for digest in hashes_artefatos(conteudo) if self.liberar(digest))
+
+    def limpar_orfaos(self, idade_minima_segundos: float = ORFAOS_IDADE_MINIMA_SEGUNDOS) -> Dict[str, int]:
+        # Arquivo sem linha no indice: o processo morreu entre o fsync e o registro, ou sobrou um .tmp.
+        # Os recentes ficam, porque podem ser gravacoes do gravador que ainda vao registrar.
+        limite = time.time() - max(0.0, idade_minima_segundos)
+        with self._trava, self._conectar() as conexao:
+            conhecidos = {str(linha[0]) for linha in conexao.execute("SELECT arquivo FROM objetos")}
+            # Linha sem arquivo (apagado por fora) so ocupa o indice: guardar() grava de novo se precisar.
+            sem_arquivo = [arquivo for arquivo in conhecidos if not (self._pasta / arquivo).exists()]
+            conexao.executemany("DELETE FROM objetos WHERE arquivo = ?", [(arquivo,) for arquivo in sem_arquivo])
+        apagados = 0
+        for arquivo in self._pasta.glob("??/*"):
+            if str(arquivo.relative_to(self._pasta)) in conhecidos:
+                continue
+            try:
+                if arquivo.stat().st_mtime > limite:
+                    continue
+                arquivo.unlink()
+            except OSError:
+                continue
+            apagados += 1
+        return {"arquivosApagados": apagados, "registrosSemArquivo": len(sem_arquivo)}
+
+    def abrir(self, digest: str) -> bytes:
+        with self._conectar() as conexao:
+            linha = conexao.execute("SELECT arquivo FROM objetos WHERE hash = ?", (digest,)).fetchone()
+        if linha is None:
+            raise KeyError(digest)
+        dados = (self._pasta / linha[0]).read_bytes()
+        return gzip.decompress(dados) if linha[0].endswith(".gz") else dados
+
+
+def hashes_artefatos(conteudo: Dict[str, Any]) -> List[str]:
+    # Uma entrada por captura guardada: cada uma corresponde a uma referencia no indice.
+    resposta = conteudo.get("resposta") if isinstance(conteudo.get("resposta"), dict) else conteudo
+    detalhes = resposta.get("detalhesExecucao") if isinstance(resposta.get("detalhesExecucao"), dict) else {}
+    artefatos = detalhes.get("artefatos") or resposta.get("artefatos") or []
+    return [str(item["hash"]) for item in artefatos if isinstance(item, dict) and item.get("hash")]
@@ -0,0 +1,145 @@
+import contextlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+LIMITE_FALHAS_SEGUIDAS_PADRAO = 2
+# chave -> seletor -> contadores
+Entradas = Dict[str, Dict[str, Dict[str, Any]]]
+# Uma trava por arquivo: instancias diferentes no mesmo processo nao intercalam ler-juntar-gravar.
+_TRAVAS_ARQUIVOS: Dict[str, threading.Lock] = {}
+_TRAVA_TRAVAS_ARQUIVOS = threading.Lock()
+
+
+def _agora_iso_utc() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _trava_arquivo(arquivo: Path) -> threading.Lock:
+    with _TRAVA_TRAVAS_ARQUIVOS:
+        return _TRAVAS_ARQUIVOS.setdefault(os.path.normcase(os.path.abspath(arquivo)), threading.Lock())
+
+
+def _juntar(destino: Entradas, pendentes: Entradas) -> None:
+    # Contadores somam o que cada processo viu; falhasSeguidas e a observacao mais recente deste processo.
+    for chave, valores in pendentes.items():
+        for valor, delta in valores.items():
+            info = destino.setdefault(chave, {}).setdefault(
+                valor, {"acertos": 0, "falhas": 0, "falhasSeguidas": 0}
+            )
+            info["acertos"] = int(info.get("acertos", 0)) + int(delta.get("acertos", 0))
+            info["falhas"] = int(info.get("falhas", 0)) + int(delta.get("falhas", 0))
+            info["falhasSeguidas"] = int(delta.get("falhasSeguidas", info.get("falhasSeguidas", 0)))
+            if str(delta.get("ultimoAcerto", "")) > str(info.get("ultimoAcerto", "")):
+                info["ultimoAcerto"] = delta["ultimoAcerto"]
+
+
+class CacheSeletores:
+    def __init__(self, arquivo: Path, limite_falhas_seguidas: int = LIMITE_FALHAS_SEGUIDAS_PADRAO) -> None:
+        self._arquivo = Path(arquivo)
+        self._limite_falhas_seguidas = max(1, limite_falhas_seguidas)
+        self._trava = threading.Lock()
+        self._entradas: Entradas = self._ler()
+        # O que esta instancia aprendeu desde o ultimo salvar: e isso que se junta ao arquivo.
+        self._pendentes: Entradas = {}
+
+    @staticmethod
+    def chave(host: str, modulo: str, papel: str) -> str:
+        return "|".join([str(host or "").lower(), str(modulo or "").lower(), papel])
+
+    def _ler(self) -> Entradas:
+        try:
+            dados = json.loads(self._arquivo.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return dados if isinstance(dados, dict) else {}
+
+    def preferidos(self, chave: str) -> List[str]:
+        with self._trava:
+            entradas = dict(self._entradas.get(chave) or {})
+        ativos = [
+            (valor, info)
+            for valor, info in entradas.items()
+            if int(info.get("acertos", 0)) > 0
+            and int(info.get("falhasSeguidas", 0)) < self._limite_falhas_seguidas
+        ]
+        ativos.sort(
+            key=lambda item: (
+                int(item[1].get("acertos", 0)) - int(item[1].get("falhas", 0)),
+                str(item[1].get("ultimoAcerto", "")),
+            ),
+            reverse=True,
+        )
+        return [valor for valor, _ in ativos]
+
+    def registrar(self, chave: str, valor: str, sucesso: bool) -> None:
+        if not valor:
+            return
+        with self._trava:
+            info = self._entradas.setdefault(chave, {}).setdefault(
+                valor, {"acertos": 0, "falhas": 0, "falhasSeguidas": 0}
+            )
+            delta = self._pendentes.setdefault(chave, {}).setdefault(valor, {"acertos": 0, "falhas": 0})
+            if sucesso:
+                info["acertos"] = int(info.get("acertos", 0)) + 1
+                info["falhasSeguidas"] = 0
+                info["ultimoAcerto"] = _agora_iso_utc()
+                delta["acertos"] += 1
+                delta["ultimoAcerto"] = info["ultimoAcerto"]
+            else:
+                info["falhas"] = int(info.get("falhas", 0)) + 1
+                info["falhasSeguidas"] = int(info.get("falhasSeguidas", 0)) + 1
+                delta["falhas"] += 1
+            delta["falhasSeguidas"] = info["falhasSeguidas"]
+
+    def registrar_uso(self, chave: str, preferidos: List[str], vencedor: str) -> None:
+        for valor in preferidos:
+            if valor == vencedor:
+                break
+            self.registrar(chave, valor, False)
+        self.registrar(chave, vencedor, True)
+
+    def salvar(self) -> None:
+        # Le o arquivo de novo e junta o que esta instancia aprendeu: outro worker que salvou no meio
+        # tempo nao perde os seletores dele, e esta instancia passa a ver os aprendidos por ele.
+        with _trava_arquivo(self._arquivo):
+            with self._trava:
+                if not self._pendentes:
+                    return
+                pendentes, self._pendentes = self._pendentes, {}
+            entradas = self._ler()
+            _juntar(entradas, pendentes)
+            conteudo = json.dumps(entradas, ensure_ascii=True, indent=2, sort_keys=True)
+            temporario = ""
+            try:
+                self._arquivo.parent.mkdir(parents=True, exist_ok=True)
+                # Nome unico: outro processo salvando ao mesmo tempo nao escreve no mesmo .tmp.
+                with tempfile.NamedTemporaryFile(
+                    "w",
+                    encoding="utf-8",
+                    dir=str(self._arquivo.parent),
+                    prefix=f"{self._arquivo.name}.",
+                    suffix=".tmp",
+                    delete=False,
+                ) as destino:
+                    temporario = destino.name
+                    destino.write(conteudo)
+                os.replace(temporario, self._arquivo)
+            except OSError:
+                if temporario:
+                    with contextlib.suppress(OSError):
+                        os.unlink(temporario)
+                with self._trava:
+                    # Devolve o aprendizado nao gravado, somado ao que chegou durante a tentativa.
+                    _juntar(pendentes, self._pendentes)
+                    self._pendentes = pendentes
+                return
+            with self._trava:
+                # Registros feitos durante a gravacao ainda nao estao no arquivo: continuam valendo por cima.
+                _juntar(entradas, self._pendentes)
+                self._entradas = entradas
@@ -0,0 +1,227 @@
+import asyncio
+import base64
+import json
+import os
+import struct
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+
+TIMEOUT_CONEXAO_CDP_SEGUNDOS = 10.0
+TIMEOUT_COMANDO_CDP_SEGUNDOS = 30.0
+CHAVES_OPCOES_DEBUGGER = ["goog:chromeOptions", "ms:edgeOptions"]
+
+
+class ErroCdp(RuntimeError):
+    pass
+
+
+def _mascarar(dados: bytes, mascara: bytes) -> bytes:
+    if not dados:
+        return dados
+    repetida = (mascara * (len(dados) // 4 + 1))[: len(dados)]
+    valor = int.from_bytes(dados, "big") ^ int.from_bytes(repetida, "big")
+    return valor.to_bytes(len(dados), "big")
+
+
+def _montar_frame(opcode: int, dados: bytes) -> bytes:
+    cabecalho = bytearray([0x80 | opcode])
+    tamanho = len(dados)
+    if tamanho < 126:
+        cabecalho.append(0x80 | tamanho)
+    elif tamanho < 65536:
+        cabecalho.append(0x80 | 126)
+        cabecalho += struct.pack("!H", tamanho)
+    else:
+        cabecalho.append(0x80 | 127)
+        cabecalho += struct.pack("!Q", tamanho)
+    mascara = os.urandom(4)
+    return bytes(cabecalho) + mascara + _mascarar(dados, mascara)
+
+
+class ConexaoCdp:
+    def __init__(self, leitor: asyncio.StreamReader, escritor: asyncio.StreamWriter) -> None:
+        self._leitor = leitor
+        self._escritor = escritor
+        self._proximo_id = 0
+        self._pendentes: Dict[int, asyncio.Future] = {}
+        self._eventos: asyncio.Queue = asyncio.Queue()
+        self._ouvinte: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._fechada = False
+        self._tarefa_leitura = asyncio.ensure_future(self._ler_mensagens())
+
+    @classmethod
+    async def conectar(cls, ws_url: str, timeout: float = TIMEOUT_CONEXAO_CDP_SEGUNDOS) -> "ConexaoCdp":
+        alvo = urlparse(ws_url)
+        host = alvo.hostname or "127.0.0.1"
+        porta = alvo.port or 80
+        leitor, escritor = await asyncio.wait_for(asyncio.open_connection(host, porta), timeout)
+
+        chave = base64.b64encode(os.urandom(16)).decode("ascii")
+        caminho = alvo.path + (f"?{alvo.query}" if alvo.query else "")
+        escritor.write(
+            (
+                f"GET {caminho} HTTP/1.1\r\n"
+                f"Host: {host}:{porta}\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {chave}\r\n"
+                "Sec-WebSocket-Version: 13\r\n\r\n"
+            ).encode("ascii")
+        )
+        await escritor.drain()
+        resposta = await asyncio.wait_for(leitor.readuntil(b"\r\n\r\n"), timeout)
+        linha_status = resposta.split(b"\r\n", 1)[0]
+        if b" 101 " not in linha_status:
+            escritor.close()
+            raise ErroCdp(f"Handshake DevTools recusado: {linha_status.decode('latin-1')}")
+        return cls(leitor, escritor)
+
+    async def _ler_frame(self) -> Tuple[bool, int, bytes]:
+        cabecalho = await self._leitor.readexactly(2)
+        fin = bool(cabecalho[0] & 0x80)
+        opcode = cabecalho[0] & 0x0F
+        mascarado = bool(cabecalho[1] & 0x80)
+        tamanho = cabecalho[1] & 0x7F
+        if tamanho == 126:
+            (tamanho,) = struct.unpack("!H", await self._leitor.readexactly(2))
+        elif tamanho == 127:
+            (tamanho,) = struct.unpack("!Q", await self._leitor.readexactly(8))
+        mascara = await self._leitor.readexactly(4) if mascarado else b""
+        dados = await self._leitor.readexactly(tamanho) if tamanho else b""
+        if mascarado:
+            dados = _mascarar(dados, mascara)
+        return fin, opcode, dados
+
+    async def _ler_mensagens(self) -> None:
+        partes: List[bytes] = []
+        try:
+            while True:
+                fin, opcode, dados = await self._ler_frame()
+                if opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    self._escritor.write(_montar_frame(0xA, dados))
+                    continue
+                if opcode == 0xA:
+                    continue
+                partes.append(dados)
+                if not fin:
+                    continue
+                bruto = b"".join(partes)
+                partes = []
+                self._despachar(json.loads(bruto.decode("utf-8")))
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._fechada = True
+            for futuro in self._pendentes.values():
+                if not futuro.done():
+                    futuro.set_exception(ErroCdp("Conexao DevTools encerrada."))
+            self._pendentes.clear()
+            self._eventos.put_nowait(None)
+
+    def _despachar(self, mensagem: Dict[str, Any]) -> None:
+        if "id" in mensagem:
+            futuro = self._pendentes.pop(mensagem["id"], None)
+            if futuro is None or futuro.done():
+                return
+            if "error" in mensagem:
+                erro = mensagem["error"] or {}
+                futuro.set_exception(ErroCdp(f"{erro.get('message', 'Erro DevTools')} ({erro.get('code')})"))
+            else:
+                futuro.set_result(mensagem.get("result") or {})
+            return
+        if self._ouvinte is not None:
+            self._ouvinte(mensagem)
+            return
+        self._eventos.put_nowait(mensagem)
+
+    def definir_ouvinte(self, ouvinte: Optional[Callable[[Dict[str, Any]], None]]) -> None:
+        # Com ouvinte, os eventos vao direto para ele e nao acumulam na fila de proximo_evento.
+        self._ouvinte = ouvinte
+
+    @property
+    def fechada(self) -> bool:
+        return self._fechada
+
+    async def enviar(
+        self,
+        metodo: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: float = TIMEOUT_COMANDO_CDP_SEGUNDOS,
+        sessao: str = "",
+    ) -> Dict[str, Any]:
+        if self._fechada:
+            raise ErroCdp("Conexao DevTools encerrada.")
+        self._proximo_id += 1
+        mensagem_id = self._proximo_id
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendentes[mensagem_id] = futuro
+        mensagem: Dict[str, Any] = {"id": mensagem_id, "method": metodo, "params": params or {}}
+        if sessao:
+            mensagem["sessionId"] = sessao
+        self._escritor.write(_montar_frame(0x1, json.dumps(mensagem).encode("utf-8")))
+        await self._escritor.drain()
+        try:
+            return await asyncio.wait_for(futuro, timeout)
+        finally:
+            self._pendentes.pop(mensagem_id, None)
+
+    async def proximo_evento(self, timeout: float) -> Optional[Dict[str, Any]]:
+        if self._fechada and self._eventos.empty():
+            return None
+        try:
+            return await asyncio.wait_for(self._eventos.get(), max(0.0, timeout))
+        except asyncio.TimeoutError:
+            return {}
+
+    async def fechar(self) -> None:
+        if not self._fechada:
+            try:
+                self._escritor.write(_montar_frame(0x8, b""))
+                await self._escritor.drain()
+            except Exception:
+                pass
+        self._tarefa_leitura.cancel()
+        try:
+            self._escritor.close()
+        except Exception:
+            pass
+
+
+def endereco_debugger(driver: Any) -> str:
+    try:
+        capacidades = dict(driver.capabilities or {})
+    except Exception:
+        return ""
+    for chave in CHAVES_OPCOES_DEBUGGER:
+        opcoes = capacidades.get(chave)
+        if isinstance(opcoes, dict) and opcoes.get("debuggerAddress"):
+            return str(opcoes["debuggerAddress"]).strip()
+    return ""
+
+
+def listar_alvos(endereco: str, timeout: float = TIMEOUT_CONEXAO_CDP_SEGUNDOS) -> List[Dict[str, Any]]:
+    with urllib.request.urlopen(f"http://{endereco}/json/list", timeout=timeout) as resposta:
+        alvos = json.loads(resposta.read().decode("utf-8"))
+    return alvos if isinstance(alvos, list) else []
+
+
+def url_websocket_pagina(endereco: str, alvo_id: str = "") -> str:
+    # Sem a aba exata, "" (quem chama volta ao polling): outra aba do mesmo navegador pode ser
+    # a de outro robo ou a de um comprovante.
+    alvo_id = (alvo_id or "").strip().upper()
+    if not alvo_id:
+        return ""
+    for alvo in listar_alvos(endereco):
+        if alvo.get("type") == "page" and str(alvo.get("id", "")).upper() == alvo_id:
+            return str(alvo.get("webSocketDebuggerUrl") or "")
+    return ""
+
+
+def url_websocket_navegador(endereco: str, timeout: float = TIMEOUT_CONEXAO_CDP_SEGUNDOS) -> str:
+    with urllib.request.urlopen(f"http://{endereco}/json/version", timeout=timeout) as resposta:
+        versao = json.loads(resposta.read().decode("utf-8"))
+    return str((versao or {}).get("webSocketDebuggerUrl") or "")
@@ -0,0 +1,122 @@
+import contextlib
+import hashlib
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+
+NOME_BANCO_CERTIFICADOS = "certificados.sqlite3"
+# Uso mais antigo que isso e de um robo que morreu sem liberar; nenhum robo real dura tanto.
+VALIDADE_USO_SEGUNDOS_PADRAO = 6 * 60 * 60
+ESQUEMA_CERTIFICADOS = """
+CREATE TABLE IF NOT EXISTS certificados (
+    hash_pfx TEXT PRIMARY KEY,
+    thumbprint TEXT NOT NULL,
+    importado_em TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hash_pfx TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    criado_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_usos_hash ON usos (hash_pfx);
+"""
+
+
+def hash_arquivo_pfx(caminho_arquivo: str) -> str:
+    return hashlib.sha256(Path(caminho_arquivo).read_bytes()).hexdigest()
+
+
+class CacheCertificados:
+    def __init__(self, arquivo: Path, validade_uso_segundos: int = VALIDADE_USO_SEGUNDOS_PADRAO) -> None:
+        self._arquivo = Path(arquivo)
+        self._validade_uso_segundos = max(60, validade_uso_segundos)
+        self._arquivo.parent.mkdir(parents=True, exist_ok=True)
+        conexao = sqlite3.connect(str(self._arquivo), timeout=180)
+        try:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.executescript(ESQUEMA_CERTIFICADOS)
+        finally:
+            conexao.close()
+
+    @contextlib.contextmanager
+    def _transacao(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE serializa robos de processos diferentes; o timeout cobre uma importacao em andamento.
+        conexao = sqlite3.connect(str(self._arquivo), timeout=180, isolation_level=None)
+        try:
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                yield conexao
+            except BaseException:
+                conexao.execute("ROLLBACK")
+                raise
+            conexao.execute("COMMIT")
+        finally:
+            conexao.close()
+
+    def adquirir(self, repositorio: Any, caminho_arquivo: str, senha: str) -> Dict[str, Any]:
+        hash_pfx = hash_arquivo_pfx(caminho_arquivo)
+        with self._transacao() as conexao:
+            conexao.execute(
+                "DELETE FROM usos WHERE criado_em < ?", (time.time() - self._validade_uso_segundos,)
+            )
+            linha = conexao.execute(
+                "SELECT thumbprint FROM certificados WHERE hash_pfx = ?", (hash_pfx,)
+            ).fetchone()
+            if linha is not None and repositorio.presente(linha[0]):
+                resultado: Dict[str, Any] = {
+                    "importado": True,
+                    "thumbprint": linha[0],
+                    "mensagem": "Certificado A1 ja presente no repositorio; importacao dispensada.",
+                    "reaproveitado": True,
+                }
+            else:
+                # A importacao roda com a transacao aberta: outro robo nao remove o certificado
+                # entre a importacao e o registro do uso.
+                resultado = {**repositorio.importar(caminho_arquivo, senha), "reaproveitado": False}
+                if not resultado.get("importado") or not resultado.get("thumbprint"):
+                    return resultado
+                conexao.execute(
+                    "INSERT OR REPLACE INTO certificados (hash_pfx, thumbprint, importado_em) VALUES (?, ?, ?)",
+                    (
+                        hash_pfx,
+                        resultado["thumbprint"],
+                        datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+                    ),
+                )
+            cursor = conexao.execute(
+                "INSERT INTO usos (hash_pfx, pid, criado_em) VALUES (?, ?, ?)",
+                (hash_pfx, os.getpid(), time.time()),
+            )
+            return {**resultado, "hashPfx": hash_pfx, "uso": int(cursor.lastrowid or 0)}
+
+    def liberar(self, repositorio: Any, uso: int, remover_sem_uso: bool) -> bool:
+        with self._transacao() as conexao:
+            linha = conexao.execute(
+                "SELECT u.hash_pfx, c.thumbprint FROM usos u "
+                "LEFT JOIN certificados c ON c.hash_pfx = u.hash_pfx WHERE u.id = ?",
+                (uso,),
+            ).fetchone()
+            if linha is None:
+                return False
+            conexao.execute("DELETE FROM usos WHERE id = ?", (uso,))
+            restantes = conexao.execute(
+                "SELECT COUNT(*) FROM usos WHERE hash_pfx = ?", (linha[0],)
+            ).fetchone()[0]
+            if restantes or not remover_sem_uso or not linha[1]:
+                return False
+            repositorio.remover(linha[1])
+            conexao.execute("DELETE FROM certificados WHERE hash_pfx = ?", (linha[0],))
+            return True
+
+    def usos_ativos(self, caminho_arquivo: str) -> int:
+        with self._transacao() as conexao:
+            return int(
+                conexao.execute(
+                    "SELECT COUNT(*) FROM usos WHERE hash_pfx = ?", (hash_arquivo_pfx(caminho_arquivo),)
+                ).fetchone()[0]
+            )
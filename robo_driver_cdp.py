@@ -0,0 +1,619 @@
+import asyncio
+import base64
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from robo_cdp import ConexaoCdp, ErroCdp, url_websocket_navegador
+
+
+TIMEOUT_INICIO_NAVEGADOR_SEGUNDOS = 20.0
+TIMEOUT_ENCERRAMENTO_SEGUNDOS = 10.0
+TIMEOUT_CARGA_PADRAO_SEGUNDOS = 300.0
+LIMITE_LOG_REDE = 5000
+LIMITE_TEXTO_POR_TECLA = 200
+# Estrategias de busca do WebDriver (mesmos valores de By.CSS_SELECTOR e By.XPATH do Selenium),
+# para o fluxo buscar elementos sem importar o Selenium quando roda so pelo DevTools.
+POR_CSS = "css selector"
+POR_XPATH = "xpath"
+DOMINIOS_NAVEGADOR = ("Target.", "Browser.", "SystemInfo.")
+EXECUTAVEIS_NAVEGADOR = {
+    "edge": [
+        r"C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe",
+        r"C:\Program Files\Microsoft\Edge\Application\msedge.exe",
+        "microsoft-edge",
+        "microsoft-edge-stable",
+        "msedge",
+    ],
+    "chrome": [
+        r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+        r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+        os.path.join(os.environ.get("LOCALAPPDATA", ""), "Google", "Chrome", "Application", "chrome.exe"),
+        "google-chrome",
+        "google-chrome-stable",
+        "chromium",
+        "chromium-browser",
+        "chrome",
+    ],
+}
+
+# Executa o corpo do script como o WebDriver (funcao com `arguments`) e troca elementos por
+# marcadores registrados na pagina, para que o resultado volte por valor em uma unica ida ao navegador.
+PRELUDIO_SCRIPT = r"""
+function (funcao, argumentos) {
+  var registro = window.__peticionadorElementos;
+  if (!registro) {
+    registro = window.__peticionadorElementos = {seq: 0, itens: {}, ids: new WeakMap()};
+  }
+  function entrada(valor) {
+    if (!valor || typeof valor !== 'object') { return valor; }
+    if (Object.prototype.hasOwnProperty.call(valor, '__elementoCdp__')) {
+      var elemento = registro.itens[valor.__elementoCdp__];
+      if (!elemento || !elemento.isConnected) {
+        throw new Error('Elemento obsoleto: nao esta mais no documento.');
+      }
+      return elemento;
+    }
+    if (Array.isArray(valor)) { return valor.map(entrada); }
+    var copia = {};
+    Object.keys(valor).forEach(function (chave) { copia[chave] = entrada(valor[chave]); });
+    return copia;
+  }
+  function saida(valor, profundidade) {
+    if (valor === undefined || typeof valor === 'function' || typeof valor === 'symbol') { return null; }
+    if (valor === null || typeof valor !== 'object' || profundidade > 32) { return valor; }
+    if (valor.nodeType === 1) {
+      var id = registro.ids.get(valor);
+      if (!id) {
+        registro.seq += 1;
+        id = registro.seq;
+        registro.ids.set(valor, id);
+        registro.itens[id] = valor;
+      }
+      return {__elementoCdp__: id};
+    }
+    if (Array.isArray(valor) || valor instanceof NodeList || valor instanceof HTMLCollection) {
+      return Array.prototype.map.call(valor, function (item) { return saida(item, profundidade + 1); });
+    }
+    var copia = {};
+    Object.keys(valor).forEach(function (chave) { copia[chave] = saida(valor[chave], profundidade + 1); });
+    return copia;
+  }
+  var resultado = funcao.apply(window, entrada(argumentos));
+  return Promise.resolve(resultado).then(function (valor) { return saida(valor, 0); });
+}
+"""
+SCRIPT_BUSCAR_ELEMENTOS = """
+if (arguments[0] === 'xpath') {
+  var achados = document.evaluate(arguments[1], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+  var saida = [];
+  for (var i = 0; i < achados.snapshotLength; i++) {
+    if (achados.snapshotItem(i).nodeType === 1) { saida.push(achados.snapshotItem(i)); }
+  }
+  return saida;
+}
+return Array.prototype.slice.call(document.querySelectorAll(arguments[1]));
+"""
+SCRIPT_PONTO_CLIQUE = """
+var elemento = arguments[0];
+elemento.scrollIntoView({block: 'center', inline: 'center'});
+var caixa = elemento.getBoundingClientRect();
+if (!caixa.width || !caixa.height) { return null; }
+var x = caixa.left + caixa.width / 2;
+var y = caixa.top + caixa.height / 2;
+var topo = document.elementFromPoint(x, y);
+return {x: x, y: y, livre: !!topo && (topo === elemento || elemento.contains(topo) || topo.contains(elemento))};
+"""
+SCRIPT_LIMPAR = """
+var elemento = arguments[0];
+elemento.focus();
+if ('value' in elemento) {
+  elemento.value = '';
+  elemento.dispatchEvent(new Event('input', {bubbles: true}));
+  elemento.dispatchEvent(new Event('change', {bubbles: true}));
+} else if (elemento.isContentEditable) {
+  elemento.textContent = '';
+}
+"""
+SCRIPT_ATRIBUTO = """
+var elemento = arguments[0];
+var valor = (arguments[1] in elemento) ? elemento[arguments[1]] : elemento.getAttribute(arguments[1]);
+if (valor === true) { return 'true'; }
+if (valor === false || valor === null || valor === undefined) { return null; }
+return String(valor);
+"""
+
+
+def localizar_executavel_navegador(navegador: str) -> str:
+    for candidato in EXECUTAVEIS_NAVEGADOR.get(navegador, []):
+        if os.path.isabs(candidato):
+            if os.path.isfile(candidato):
+                return candidato
+            continue
+        encontrado = shutil.which(candidato)
+        if encontrado:
+            return encontrado
+    return ""
+
+
+def _aguardar_porta_devtools(pasta_perfil: str, processo: subprocess.Popen, timeout: float) -> str:
+    arquivo = os.path.join(pasta_perfil, "DevToolsActivePort")
+    limite = time.time() + timeout
+    while time.time() < limite:
+        if processo.poll() is not None:
+            raise ErroCdp(f"Navegador encerrou ao iniciar (codigo {processo.returncode}).")
+        try:
+            with open(arquivo, "r", encoding="utf-8") as porta_ativa:
+                linhas = porta_ativa.read().splitlines()
+        except OSError:
+            linhas = []
+        if len(linhas) >= 2 and linhas[0].strip().isdigit():
+            return f"127.0.0.1:{linhas[0].strip()}"
+        time.sleep(0.05)
+    raise ErroCdp("Timeout aguardando a porta DevTools do navegador.")
+
+
+def _eventos_tecla(texto: str) -> List[Tuple[str, Dict[str, Any]]]:
+    comandos: List[Tuple[str, Dict[str, Any]]] = []
+    for caractere in texto:
+        if caractere == "\n":
+            tecla = {"key": "Enter", "code": "Enter", "windowsVirtualKeyCode": 13}
+            comandos.append(("Input.dispatchKeyEvent", {"type": "keyDown", "text": "\r", **tecla}))
+            comandos.append(("Input.dispatchKeyEvent", {"type": "keyUp", **tecla}))
+            continue
+        comandos.append(
+            ("Input.dispatchKeyEvent", {"type": "keyDown", "key": caractere, "text": caractere, "unmodifiedText": caractere})
+        )
+        comandos.append(("Input.dispatchKeyEvent", {"type": "keyUp", "key": caractere}))
+    return comandos
+
+
+class ElementoCdp:
+    def __init__(self, driver: "DriverCdp", sessao: str, identificador: int) -> None:
+        self._driver = driver
+        self._sessao = sessao
+        self.id = identificador
+
+    def __eq__(self, outro: object) -> bool:
+        return isinstance(outro, ElementoCdp) and (outro._sessao, outro.id) == (self._sessao, self.id)
+
+    def __hash__(self) -> int:
+        return hash((self._sessao, self.id))
+
+    def _script(self, corpo: str, *argumentos: Any) -> Any:
+        return self._driver._executar_script(self._sessao, corpo, [self, *argumentos])
+
+    @property
+    def text(self) -> str:
+        return self._script("return (arguments[0].innerText || '').trim();") or ""
+
+    @property
+    def tag_name(self) -> str:
+        return (self._script("return arguments[0].tagName;") or "").lower()
+
+    def get_attribute(self, nome: str) -> Optional[str]:
+        return self._script(SCRIPT_ATRIBUTO, nome)
+
+    def is_enabled(self) -> bool:
+        return bool(self._script("return !arguments[0].disabled;"))
+
+    def is_displayed(self) -> bool:
+        return bool(
+            self._script(
+                "var caixa = arguments[0].getBoundingClientRect();"
+                "var estilo = getComputedStyle(arguments[0]);"
+                "return !!(caixa.width && caixa.height) && estilo.visibility !== 'hidden' && estilo.display !== 'none';"
+            )
+        )
+
+    def clear(self) -> None:
+        self._script(SCRIPT_LIMPAR)
+
+    def click(self) -> None:
+        ponto = self._script(SCRIPT_PONTO_CLIQUE)
+        if not ponto:
+            raise ErroCdp("Elemento sem area visivel para clique.")
+        if not ponto.get("livre"):
+            raise ErroCdp("Clique interceptado por outro elemento.")
+        posicao = {"x": ponto["x"], "y": ponto["y"]}
+        self._driver._enviar_lote(
+            self._sessao,
+            [
+                ("Input.dispatchMouseEvent", {"type": "mouseMoved", **posicao}),
+                ("Input.dispatchMouseEvent", {"type": "mousePressed", "button": "left", "clickCount": 1, **posicao}),
+                ("Input.dispatchMouseEvent", {"type": "mouseReleased", "button": "left", "clickCount": 1, **posicao}),
+            ],
+        )
+
+    def send_keys(self, *valores: Any) -> None:
+        texto = "".join(str(valor) for valor in valores)
+        tipo = self._script(
+            "var elemento = arguments[0]; elemento.focus();"
+            "return elemento.tagName === 'INPUT' && (elemento.type || '').toLowerCase() === 'file' ? 'arquivo' : 'texto';"
+        )
+        if tipo == "arquivo":
+            objeto = self._driver._objeto_elemento(self._sessao, self.id)
+            self._driver._enviar_lote(
+                self._sessao,
+                [("DOM.setFileInputFiles", {"files": [linha for linha in texto.split("\n") if linha], "objectId": objeto})],
+            )
+            return
+        if len(texto) > LIMITE_TEXTO_POR_TECLA:
+            self._driver._enviar_lote(self._sessao, [("Input.insertText", {"text": texto})])
+            return
+        self._driver._enviar_lote(self._sessao, _eventos_tecla(texto))
+
+
+class _TrocaJanela:
+    def __init__(self, driver: "DriverCdp") -> None:
+        self._driver = driver
+
+    def window(self, alvo: str) -> None:
+        self._driver._trocar_aba(alvo)
+
+
+class DriverCdp:
+    def __init__(
+        self,
+        navegador: str,
+        endereco: str,
+        processo: Optional[subprocess.Popen] = None,
+        pasta_perfil: str = "",
+        registrar_rede: bool = False,
+    ) -> None:
+        self.navegador = navegador
+        self.service = SimpleNamespace(process=processo) if processo is not None else None
+        self.switch_to = _TrocaJanela(self)
+        self._endereco = endereco
+        self._processo = processo
+        self._pasta_perfil = pasta_perfil
+        self._registrar_rede = registrar_rede
+        self._timeout_carga = TIMEOUT_CARGA_PADRAO_SEGUNDOS
+        self._conexao: Optional[ConexaoCdp] = None
+        self._sessoes: Dict[str, str] = {}
+        # Mexida pela thread do loop (eventos de abas) e pelas threads de quem usa o driver.
+        self._ordem_abas: List[str] = []
+        self._trava_abas = threading.Lock()
+        self._cargas: Dict[str, asyncio.Event] = {}
+        self._log_rede: Deque[Dict[str, Any]] = deque(maxlen=LIMITE_LOG_REDE)
+        self._contexto: Optional[str] = None
+        self._alvo_atual = ""
+        self._encerrado = False
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="driver-cdp", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def iniciar(
+        cls,
+        executavel: str,
+        argumentos: List[str],
+        navegador: str,
+        registrar_rede: bool = False,
+    ) -> "DriverCdp":
+        pasta_perfil = tempfile.mkdtemp(prefix="peticionador-cdp-")
+        comando = [
+            executavel,
+            "--remote-debugging-port=0",
+            f"--user-data-dir={pasta_perfil}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            *argumentos,
+            "about:blank",
+        ]
+        processo = subprocess.Popen(comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            endereco = _aguardar_porta_devtools(pasta_perfil, processo, TIMEOUT_INICIO_NAVEGADOR_SEGUNDOS)
+        except Exception:
+            processo.kill()
+            shutil.rmtree(pasta_perfil, ignore_errors=True)
+            raise
+        driver = cls(navegador, endereco, processo, pasta_perfil, registrar_rede)
+        try:
+            driver._conectar(anexar_primeira_aba=True)
+        except Exception:
+            driver.quit()
+            raise
+        return driver
+
+    @classmethod
+    def anexar(cls, endereco: str, navegador: str, registrar_rede: bool = False) -> "DriverCdp":
+        # Navegador de outro dono (contextos isolados): quit fecha so esta conexao.
+        driver = cls(navegador, endereco, registrar_rede=registrar_rede)
+        try:
+            driver._conectar(anexar_primeira_aba=False)
+        except Exception:
+            driver.quit()
+            raise
+        return driver
+
+    def _rodar(self, corotina: Any, timeout: Optional[float] = None) -> Any:
+        return asyncio.run_coroutine_threadsafe(corotina, self._loop).result(timeout)
+
+    async def _enviar(self, metodo: str, params: Optional[Dict[str, Any]] = None, sessao: str = "") -> Dict[str, Any]:
+        if self._conexao is None:
+            raise ErroCdp("Driver DevTools sem conexao.")
+        return await self._conexao.enviar(metodo, params, sessao=sessao)
+
+    def _conectar(self, anexar_primeira_aba: bool) -> None:
+        ws_url = url_websocket_navegador(self._endereco)
+        if not ws_url:
+            raise ErroCdp("Navegador nao informou o endereco websocket DevTools.")
+
+        async def conectar() -> None:
+            self._conexao = await ConexaoCdp.conectar(ws_url)
+            self._conexao.definir_ouvinte(self._ao_evento)
+            if not anexar_primeira_aba:
+                return
+            alvos = (await self._enviar("Target.getTargets")).get("targetInfos") or []
+            paginas = [alvo["targetId"] for alvo in alvos if alvo.get("type") == "page"]
+            if not paginas:
+                paginas = [(await self._enviar("Target.createTarget", {"url": "about:blank"}))["targetId"]]
+            await self._anexar_alvo(paginas[0])
+            self._alvo_atual = paginas[0]
+
+        self._rodar(conectar())
+
+    async def _preparar_sessao(self, alvo: str, sessao: str) -> None:
+        self._sessoes[alvo] = sessao
+        self._registrar_abas([alvo])
+        self._cargas[sessao] = asyncio.Event()
+        comandos = [self._enviar("Page.enable", sessao=sessao)]
+        if self._registrar_rede:
+            comandos.append(self._enviar("Network.enable", sessao=sessao))
+        comandos.append(self._enviar("Runtime.runIfWaitingForDebugger", sessao=sessao))
+        await asyncio.gather(*comandos)
+
+    async def _anexar_alvo(self, alvo: str) -> str:
+        if alvo in self._sessoes:
+            return self._sessoes[alvo]
+        sessao = (await self._enviar("Target.attachToTarget", {"targetId": alvo, "flatten": True}))["sessionId"]
+        await self._preparar_sessao(alvo, sessao)
+        if self._contexto is None:
+            info = (await self._enviar("Target.getTargetInfo", {"targetId": alvo})).get("targetInfo") or {}
+            self._contexto = str(info.get("browserContextId") or "")
+            # Abas novas do mesmo contexto (comprovante, popups) ficam pausadas ate o Network ser ligado.
+            await self._enviar(
+                "Target.setAutoAttach",
+                {"autoAttach": True, "waitForDebuggerOnStart": True, "flatten": True},
+            )
+        return sessao
+
+    async def _ao_anexar(self, params: Dict[str, Any]) -> None:
+        info = params.get("targetInfo") or {}
+        sessao = str(params.get("sessionId") or "")
+        alvo = str(info.get("targetId") or "")
+        propria = (
+            info.get("type") == "page"
+            and str(info.get("browserContextId") or "") == self._contexto
+            and alvo not in self._sessoes
+        )
+        try:
+            if propria:
+                await self._preparar_sessao(alvo, sessao)
+                return
+            await self._enviar("Runtime.runIfWaitingForDebugger", sessao=sessao)
+            await self._enviar("Target.detachFromTarget", {"sessionId": sessao})
+        except ErroCdp:
+            pass
+
+    def _ao_evento(self, mensagem: Dict[str, Any]) -> None:
+        metodo = str(mensagem.get("method") or "")
+        params = mensagem.get("params") or {}
+        sessao = str(mensagem.get("sessionId") or "")
+        if metodo == "Target.attachedToTarget":
+            asyncio.ensure_future(self._ao_anexar(params))
+        elif metodo == "Target.detachedFromTarget":
+            alvo = str(params.get("targetId") or "")
+            if self._sessoes.get(alvo) == params.get("sessionId"):
+                self._sessoes.pop(alvo, None)
+                self._cargas.pop(str(params.get("sessionId")), None)
+                self._remover_aba(alvo)
+        elif metodo == "Page.loadEventFired":
+            carga = self._cargas.get(sessao)
+            if carga is not None:
+                carga.set()
+        elif metodo.startswith("Network.") and self._registrar_rede and sessao in self._cargas:
+            # Mesmo formato do log "performance" do chromedriver, lido por ler_log_rede.
+            self._log_rede.append(
+                {
+                    "level": "INFO",
+                    "timestamp": int(time.time() * 1000),
+                    "message": json.dumps({"message": {"method": metodo, "params": params}, "webview": sessao}),
+                }
+            )
+
+    def _registrar_abas(self, abas: List[str]) -> List[str]:
+        with self._trava_abas:
+            for aba in abas:
+                if aba not in self._ordem_abas:
+                    self._ordem_abas.append(aba)
+            return list(self._ordem_abas)
+
+    def _remover_aba(self, alvo: str) -> None:
+        with self._trava_abas:
+            if alvo in self._ordem_abas:
+                self._ordem_abas.remove(alvo)
+
+    def _sessao_atual(self) -> str:
+        sessao = self._sessoes.get(self._alvo_atual)
+        if not sessao:
+            raise ErroCdp("Nenhuma aba ativa no driver DevTools.")
+        return sessao
+
+    def _enviar_lote(self, sessao: str, comandos: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        async def enviar_todos() -> List[Dict[str, Any]]:
+            # As mensagens saem na ordem da lista sem esperar cada resposta.
+            return list(await asyncio.gather(*(self._enviar(metodo, params, sessao) for metodo, params in comandos)))
+
+        return self._rodar(enviar_todos())
+
+    def _marcar(self, valor: Any) -> Any:
+        if isinstance(valor, ElementoCdp):
+            return {"__elementoCdp__": valor.id}
+        if isinstance(valor, (list, tuple)):
+            return [self._marcar(item) for item in valor]
+        if isinstance(valor, dict):
+            return {chave: self._marcar(item) for chave, item in valor.items()}
+        return valor
+
+    def _desmarcar(self, sessao: str, valor: Any) -> Any:
+        if isinstance(valor, list):
+            return [self._desmarcar(sessao, item) for item in valor]
+        if isinstance(valor, dict):
+            if set(valor) == {"__elementoCdp__"}:
+                return ElementoCdp(self, sessao, int(valor["__elementoCdp__"]))
+            return {chave: self._desmarcar(sessao, item) for chave, item in valor.items()}
+        return valor
+
+    def _executar_script(self, sessao: str, script: str, argumentos: List[Any]) -> Any:
+        expressao = f"({PRELUDIO_SCRIPT})(function () {{\n{script}\n}}, {json.dumps(self._marcar(argumentos))})"
+        resposta = self._enviar_lote(
+            sessao,
+            [
+                (
+                    "Runtime.evaluate",
+                    {"expression": expressao, "returnByValue": True, "awaitPromise": True, "userGesture": True},
+                )
+            ],
+        )[0]
+        if resposta.get("exceptionDetails"):
+            detalhes = resposta["exceptionDetails"]
+            descricao = (detalhes.get("exception") or {}).get("description") or detalhes.get("text")
+            raise ErroCdp(f"Erro no script da pagina: {descricao}")
+        return self._desmarcar(sessao, (resposta.get("result") or {}).get("value"))
+
+    def _objeto_elemento(self, sessao: str, identificador: int) -> str:
+        resposta = self._enviar_lote(
+            sessao,
+            [("Runtime.evaluate", {"expression": f"window.__peticionadorElementos.itens[{int(identificador)}]"})],
+        )[0]
+        objeto = (resposta.get("result") or {}).get("objectId")
+        if not objeto:
+            raise ErroCdp("Elemento obsoleto: nao esta mais no documento.")
+        return objeto
+
+    def _trocar_aba(self, alvo: str) -> None:
+        self._rodar(self._anexar_alvo(str(alvo)))
+        self._alvo_atual = str(alvo)
+
+    @property
+    def capabilities(self) -> Dict[str, Any]:
+        chave = "ms:edgeOptions" if self.navegador == "edge" else "goog:chromeOptions"
+        return {"browserName": "msedge" if self.navegador == "edge" else "chrome", chave: {"debuggerAddress": self._endereco}}
+
+    @property
+    def current_window_handle(self) -> str:
+        return self._alvo_atual
+
+    @property
+    def window_handles(self) -> List[str]:
+        alvos = self._rodar(self._enviar("Target.getTargets")).get("targetInfos") or []
+        abas = [
+            str(alvo["targetId"])
+            for alvo in alvos
+            if alvo.get("type") == "page" and str(alvo.get("browserContextId") or "") == self._contexto
+        ]
+        return [aba for aba in self._registrar_abas(abas) if aba in abas]
+
+    @property
+    def current_url(self) -> str:
+        return str(self._executar_script(self._sessao_atual(), "return location.href;", []) or "")
+
+    @property
+    def page_source(self) -> str:
+        return str(
+            self._executar_script(
+                self._sessao_atual(),
+                "return document.documentElement ? document.documentElement.outerHTML : '';",
+                [],
+            )
+            or ""
+        )
+
+    def set_page_load_timeout(self, segundos: float) -> None:
+        self._timeout_carga = float(segundos)
+
+    def get(self, url: str) -> None:
+        sessao = self._sessao_atual()
+
+        async def navegar() -> None:
+            carga = self._cargas.setdefault(sessao, asyncio.Event())
+            carga.clear()
+            resposta = await self._enviar("Page.navigate", {"url": url}, sessao)
+            erro = resposta.get("errorText")
+            if erro and erro != "net::ERR_ABORTED":
+                raise ErroCdp(f"Falha ao abrir {url}: {erro}")
+            if not resposta.get("loaderId"):
+                return
+            try:
+                await asyncio.wait_for(carga.wait(), self._timeout_carga)
+            except asyncio.TimeoutError:
+                raise ErroCdp(f"Timeout carregando {url}.") from None
+
+        self._rodar(navegar())
+
+    def execute_script(self, script: str, *argumentos: Any) -> Any:
+        return self._executar_script(self._sessao_atual(), script, list(argumentos))
+
+    def execute_cdp_cmd(self, comando: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        sessao = "" if comando.startswith(DOMINIOS_NAVEGADOR) else self._sessao_atual()
+        return self._rodar(self._enviar(comando, params, sessao))
+
+    def find_elements(self, por: str, valor: str) -> List[ElementoCdp]:
+        if por not in (POR_CSS, POR_XPATH):
+            raise ErroCdp(f"Estrategia de busca nao suportada pelo driver DevTools: {por}")
+        return self._executar_script(self._sessao_atual(), SCRIPT_BUSCAR_ELEMENTOS, [por, valor]) or []
+
+    def get_screenshot_as_png(self) -> bytes:
+        resposta = self.execute_cdp_cmd("Page.captureScreenshot", {"format": "png"})
+        return base64.b64decode(resposta.get("data") or "")
+
+    def get_log(self, tipo: str) -> List[Dict[str, Any]]:
+        if tipo != "performance":
+            return []
+        entradas: List[Dict[str, Any]] = []
+        while True:
+            try:
+                entradas.append(self._log_rede.popleft())
+            except IndexError:
+                return entradas
+
+    def close(self) -> None:
+        alvo = self._alvo_atual
+        self._rodar(self._enviar("Target.closeTarget", {"targetId": alvo}))
+        self._sessoes.pop(alvo, None)
+        self._remover_aba(alvo)
+        self._alvo_atual = ""
+
+    def quit(self) -> None:
+        if self._encerrado:
+            return
+        self._encerrado = True
+        try:
+            if self._conexao is not None:
+                if self._processo is not None:
+                    try:
+                        self._rodar(self._enviar("Browser.close"), TIMEOUT_ENCERRAMENTO_SEGUNDOS)
+                    except Exception:
+                        pass
+                self._rodar(self._conexao.fechar(), TIMEOUT_ENCERRAMENTO_SEGUNDOS)
+        except Exception:
+            pass
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(TIMEOUT_ENCERRAMENTO_SEGUNDOS)
+            if self._processo is not None:
+                try:
+                    self._processo.wait(TIMEOUT_ENCERRAMENTO_SEGUNDOS)
+                except subprocess.TimeoutExpired:
+                    self._processo.kill()
+            if self._pasta_perfil:
+                shutil.rmtree(self._pasta_perfil, ignore_errors=True)
@@ -0,0 +1,301 @@
+import asyncio
+import contextlib
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from robo_agenda import prazo_payload_seguro
+from robo_tjsp_base import (
+    chave_sessao_navegador,
+    inteiro_env,
+    liberar_navegadores_ociosos,
+    montar_dados_acesso,
+    normalizar_canal,
+    normalizar_modo_execucao,
+    texto_limpo,
+)
+from robo_worker import executar_payload
+
+
+TRIBUNAIS_COM_NAVEGADOR = {"tjsp", "tjsp2"}
+MAX_SIMULTANEAS_PADRAO = 4
+MAX_NAVEGADORES_PADRAO = 3
+MAX_SIMULADOS_PADRAO = 32
+POR_TRIBUNAL_PADRAO = "*=2"
+POR_HOST_PADRAO = "*=2"
+TAXA_POR_MINUTO_PADRAO = "*=12"
+RAJADA_PADRAO = 2
+
+ItemLote = Tuple[int, Dict[str, Any]]
+
+
+def ler_limites(texto: str) -> Dict[str, float]:
+    # Formato "chave=valor" separado por virgula; "*" vale para chaves nao listadas.
+    limites: Dict[str, float] = {}
+    for parte in texto.split(","):
+        chave, _, valor = parte.partition("=")
+        try:
+            limites[texto_limpo(chave).lower() or "*"] = float(valor)
+        except ValueError:
+            continue
+    return limites
+
+
+def ler_limites_env(nome: str, padrao: str) -> Dict[str, float]:
+    return ler_limites(texto_limpo(os.environ.get(nome)) or padrao)
+
+
+def limite_para(limites: Dict[str, float], chave: str) -> float:
+    return limites.get(chave, limites.get("*", 0.0))
+
+
+class BaldeTokens:
+    def __init__(self, por_minuto: float, rajada: int) -> None:
+        self._taxa = max(0.0, por_minuto) / 60.0
+        self._capacidade = float(max(1, rajada))
+        self._tokens = self._capacidade
+        self._atualizado = time.monotonic()
+
+    def _repor(self, agora: float) -> None:
+        # Um balde criado depois do "agora" de quem consulta nao pode perder tokens.
+        self._tokens = min(self._capacidade, self._tokens + max(0.0, agora - self._atualizado) * self._taxa)
+        self._atualizado = max(self._atualizado, agora)
+
+    def espera(self, agora: float) -> float:
+        if self._taxa <= 0:
+            return 0.0
+        self._repor(agora)
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self._taxa
+
+    def consumir(self, agora: float) -> None:
+        if self._taxa <= 0:
+            return
+        self._repor(agora)
+        self._tokens -= 1
+
+
+class LimitesExecutor:
+    def __init__(
+        self,
+        max_simultaneas: int = MAX_SIMULTANEAS_PADRAO,
+        max_navegadores: int = MAX_NAVEGADORES_PADRAO,
+        max_simulados: int = MAX_SIMULADOS_PADRAO,
+        por_tribunal: Optional[Dict[str, float]] = None,
+        por_host: Optional[Dict[str, float]] = None,
+        taxa_por_minuto: Optional[Dict[str, float]] = None,
+        rajada: int = RAJADA_PADRAO,
+    ) -> None:
+        self.max_simultaneas = max(1, max_simultaneas)
+        self.max_navegadores = max(1, max_navegadores)
+        self.max_simulados = max(1, max_simulados)
+        self.por_tribunal = por_tribunal if por_tribunal is not None else ler_limites(POR_TRIBUNAL_PADRAO)
+        self.por_host = por_host if por_host is not None else ler_limites(POR_HOST_PADRAO)
+        self.taxa_por_minuto = taxa_por_minuto if taxa_por_minuto is not None else ler_limites(TAXA_POR_MINUTO_PADRAO)
+        self.rajada = rajada
+
+    @classmethod
+    def do_ambiente(cls) -> "LimitesExecutor":
+        return cls(
+            max_simultaneas=inteiro_env("PETICIONADOR_EXECUTOR_MAX", MAX_SIMULTANEAS_PADRAO),
+            max_navegadores=inteiro_env("PETICIONADOR_EXECUTOR_MAX_NAVEGADORES", MAX_NAVEGADORES_PADRAO),
+            max_simulados=inteiro_env("PETICIONADOR_EXECUTOR_MAX_SIMULADOS", MAX_SIMULADOS_PADRAO),
+            por_tribunal=ler_limites_env("PETICIONADOR_EXECUTOR_POR_TRIBUNAL", POR_TRIBUNAL_PADRAO),
+            por_host=ler_limites_env("PETICIONADOR_EXECUTOR_POR_HOST", POR_HOST_PADRAO),
+            taxa_por_minuto=ler_limites_env("PETICIONADOR_EXECUTOR_TAXA_POR_MINUTO", TAXA_POR_MINUTO_PADRAO),
+            rajada=inteiro_env("PETICIONADOR_EXECUTOR_RAJADA", RAJADA_PADRAO),
+        )
+
+
+def payload_usa_navegador(payload: Dict[str, Any]) -> bool:
+    if texto_limpo(payload.get("tribunal")).lower() not in TRIBUNAIS_COM_NAVEGADOR:
+        return False
+    try:
+        return normalizar_modo_execucao(payload) == "real"
+    except ValueError:
+        return False
+
+
+def host_payload(payload: Dict[str, Any]) -> str:
+    tribunal = texto_limpo(payload.get("tribunal")).lower()
+    try:
+        acesso = montar_dados_acesso(payload, normalizar_canal(payload))
+    except ValueError:
+        return tribunal
+    return texto_limpo(urlparse(texto_limpo(acesso.get("entradaUrl"))).hostname).lower() or tribunal
+
+
+def chave_sessao_payload(payload: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+    try:
+        acesso = montar_dados_acesso(payload, normalizar_canal(payload))
+    except ValueError:
+        return None
+    certificado = payload.get("certificado") if isinstance(payload.get("certificado"), dict) else {}
+    return chave_sessao_navegador(acesso, certificado)
+
+
+class ExecutorPeticoes:
+    def __init__(
+        self,
+        limites: Optional[LimitesExecutor] = None,
+        executar: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+    ) -> None:
+        self.limites = limites or LimitesExecutor.do_ambiente()
+        self._executar = executar or (lambda payload: executar_payload(payload, redirecionar_saida=False))
+        self._condicao = threading.Condition()
+        self._ativos = 0
+        self._ativos_tribunal: Dict[str, int] = {}
+        self._ativos_host: Dict[str, int] = {}
+        self._baldes: Dict[str, BaldeTokens] = {}
+
+    def _executar_seguro(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return self._executar(payload)
+        except Exception as error:
+            return {
+                "ok": False,
+                "tribunal": payload.get("tribunal"),
+                "protocolo": payload.get("protocolo"),
+                "mensagem": f"Falha inesperada no executor: {texto_limpo(error)}",
+            }
+
+    def _balde(self, host: str) -> BaldeTokens:
+        balde = self._baldes.get(host)
+        if balde is None:
+            balde = BaldeTokens(limite_para(self.limites.taxa_por_minuto, host), self.limites.rajada)
+            self._baldes[host] = balde
+        return balde
+
+    def _espera_para_iniciar(self, tribunal: str, host: str, agora: float) -> Optional[float]:
+        # None: bloqueado por concorrencia (acorda quando alguem terminar); numero: espera do balde.
+        # Limite zero ou negativo significa sem limite para aquela chave.
+        limite_ativos = min(self.limites.max_simultaneas, self.limites.max_navegadores)
+        if self._ativos >= limite_ativos:
+            return None
+        limite_tribunal = limite_para(self.limites.por_tribunal, tribunal)
+        if limite_tribunal > 0 and self._ativos_tribunal.get(tribunal, 0) >= limite_tribunal:
+            return None
+        limite_host = limite_para(self.limites.por_host, host)
+        if limite_host > 0 and self._ativos_host.get(host, 0) >= limite_host:
+            return None
+        return self._balde(host).espera(agora)
+
+    def _aguardar_balde(self, host: str) -> None:
+        with self._condicao:
+            while True:
+                agora = time.monotonic()
+                espera = self._balde(host).espera(agora)
+                if espera <= 0:
+                    self._balde(host).consumir(agora)
+                    return
+                self._condicao.wait(espera)
+
+    def _abrir_espaco_navegador(self, payload: Dict[str, Any]) -> None:
+        # Navegadores parados no pool (de grupos que ja terminaram) tambem estao vivos: somados as
+        # vagas ocupadas, nao passam de max_navegadores antes de a peticao abrir o seu.
+        with self._condicao:
+            manter = self.limites.max_navegadores - self._ativos
+        liberar_navegadores_ociosos(manter, chave_sessao_payload(payload))
+
+    def _rodar_com_navegador(
+        self,
+        itens: List[ItemLote],
+        tribunal: str,
+        host: str,
+        resultados: List[Dict[str, Any]],
+    ) -> None:
+        # Os itens de um grupo rodam em sequencia na mesma vaga: o navegador e o login do
+        # primeiro ficam no pool e servem aos seguintes.
+        try:
+            for posicao, (indice, payload) in enumerate(itens):
+                if posicao:
+                    self._aguardar_balde(host)
+                self._abrir_espaco_navegador(payload)
+                resultados[indice] = self._executar_seguro(payload)
+        finally:
+            with self._condicao:
+                self._ativos -= 1
+                self._ativos_tribunal[tribunal] -= 1
+                self._ativos_host[host] -= 1
+                self._condicao.notify_all()
+
+    def _executar_com_navegador(self, grupos: List[List[ItemLote]], resultados: List[Dict[str, Any]]) -> None:
+        # Prazo mais curto primeiro (campo "prazo"), dentro e entre os grupos; sem prazo, ordem do lote.
+        # Um grupo com hosts diferentes vira uma unidade por host: os limites valem para cada item.
+        pendentes: List[Tuple[List[ItemLote], str, str]] = []
+        for itens in grupos:
+            por_host: Dict[Tuple[str, str], List[ItemLote]] = {}
+            for item in sorted(itens, key=lambda item: prazo_payload_seguro(item[1])):
+                chave = (texto_limpo(item[1].get("tribunal")).lower(), host_payload(item[1]))
+                por_host.setdefault(chave, []).append(item)
+            pendentes.extend((parte, tribunal, host) for (tribunal, host), parte in por_host.items())
+        pendentes.sort(key=lambda item: prazo_payload_seguro(item[0][0][1]))
+        with ThreadPoolExecutor(
+            max_workers=min(self.limites.max_simultaneas, self.limites.max_navegadores),
+            thread_name_prefix="executor-peticoes",
+        ) as pool:
+            with self._condicao:
+                while pendentes:
+                    agora = time.monotonic()
+                    proxima: Optional[float] = None
+                    # Respeita a ordem da fila, mas um host travado nao segura os demais.
+                    for item in list(pendentes):
+                        itens, tribunal, host = item
+                        espera = self._espera_para_iniciar(tribunal, host, agora)
+                        if espera is None:
+                            continue
+                        if espera > 0:
+                            proxima = espera if proxima is None else min(proxima, espera)
+                            continue
+                        self._balde(host).consumir(agora)
+                        self._ativos += 1
+                        self._ativos_tribunal[tribunal] = self._ativos_tribunal.get(tribunal, 0) + 1
+                        self._ativos_host[host] = self._ativos_host.get(host, 0) + 1
+                        pendentes.remove(item)
+                        pool.submit(self._rodar_com_navegador, itens, tribunal, host, resultados)
+                    if pendentes:
+                        self._condicao.wait(proxima)
+
+    async def _executar_simulados(self, itens: List[ItemLote], resultados: List[Dict[str, Any]]) -> None:
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(
+            max_workers=self.limites.max_simulados,
+            thread_name_prefix="executor-simulado",
+        ) as pool:
+            respostas = await asyncio.gather(
+                *(loop.run_in_executor(pool, self._executar_seguro, payload) for _, payload in itens)
+            )
+        for (indice, _), resposta in zip(itens, respostas):
+            resultados[indice] = resposta
+
+    def executar_lote(
+        self,
+        payloads: List[Dict[str, Any]],
+        grupos: Optional[List[List[int]]] = None,
+    ) -> List[Dict[str, Any]]:
+        # grupos: indices que devem dividir um navegador/login, um grupo por vaga; sem grupos, uma vaga por peticao.
+        resultados: List[Dict[str, Any]] = [{} for _ in payloads]
+        grupos = grupos if grupos is not None else [[indice] for indice in range(len(payloads))]
+        com_navegador = [
+            [(indice, payloads[indice]) for indice in grupo if payload_usa_navegador(payloads[indice])]
+            for grupo in grupos
+        ]
+        simulados = [(indice, payload) for indice, payload in enumerate(payloads) if not payload_usa_navegador(payload)]
+
+        # redirect_stdout troca sys.stdout do processo inteiro: feito uma vez aqui, nunca por thread.
+        with contextlib.redirect_stdout(sys.stderr):
+            reais = threading.Thread(
+                target=self._executar_com_navegador,
+                args=(com_navegador, resultados),
+                name="executor-despacho",
+            )
+            reais.start()
+            try:
+                if simulados:
+                    asyncio.run(self._executar_simulados(simulados, resultados))
+            finally:
+                reais.join()
+        return resultados
@@ -0,0 +1,471 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import socket
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from robo_agenda import (
+    SEM_PRAZO,
+    chave_estimativa_payload,
+    duracao_restante,
+    estimar_duracoes,
+    prazo_payload,
+    prever_conclusoes,
+)
+from robo_segredos import proteger_texto, revelar_texto
+
+
+NOME_BANCO_FILA = "fila.sqlite3"
+MAX_TENTATIVAS_PADRAO = 3
+ATRASO_BASE_SEGUNDOS_PADRAO = 60
+ATRASO_MAXIMO_SEGUNDOS = 30 * 60
+# Uma reserva vencida e de um robo que morreu; nenhuma peticao real passa disso.
+RESERVA_SEGUNDOS_PADRAO = 30 * 60
+LIMITE_LISTAGEM_PADRAO = 100
+# Gravado antes do clique em protocolar: a partir dele o trabalho nunca volta a ser executado sozinho.
+PASSO_PROTOCOLO = "protocolo_em_andamento"
+ESTADOS_FILA = ("pendente", "executando", "concluido", "falhou", "conferir")
+ESQUEMA_FILA = """
+CREATE TABLE IF NOT EXISTS trabalhos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chave TEXT NOT NULL UNIQUE,
+    tribunal TEXT NOT NULL,
+    protocolo TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendente',
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    max_tentativas INTEGER NOT NULL,
+    disponivel_em REAL NOT NULL,
+    reservado_ate REAL,
+    dono TEXT,
+    ultimo_passo TEXT NOT NULL DEFAULT '',
+    passou_protocolo INTEGER NOT NULL DEFAULT 0,
+    mensagem TEXT NOT NULL DEFAULT '',
+    resultado TEXT,
+    criado_em TEXT NOT NULL,
+    atualizado_em TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transicoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    trabalho_id INTEGER NOT NULL,
+    tentativa INTEGER NOT NULL,
+    passo TEXT NOT NULL,
+    registrado_em TEXT NOT NULL
+);
+"""
+# Colunas da agenda por prazo, acrescentadas tambem em filas criadas antes dela.
+COLUNAS_AGENDA = {
+    "trabalhos": (
+        ("prazo", f"REAL NOT NULL DEFAULT {SEM_PRAZO}"),
+        ("estimativa", "TEXT NOT NULL DEFAULT ''"),
+        ("iniciado_em", "REAL"),
+        ("duracao_ms", "REAL"),
+    ),
+    "transicoes": (("decorrido_ms", "REAL"),),
+}
+INDICES_FILA = """
+DROP INDEX IF EXISTS idx_trabalhos_estado;
+CREATE INDEX IF NOT EXISTS idx_trabalhos_edf ON trabalhos (estado, prazo, disponivel_em, id);
+CREATE INDEX IF NOT EXISTS idx_transicoes_trabalho ON transicoes (trabalho_id, id);
+"""
+# Amostras mais recentes usadas para estimar a duracao de cada tribunal/modo e de cada passo.
+LIMITE_HISTORICO_TENTATIVAS = 2000
+LIMITE_HISTORICO_PASSOS = 20000
+
+
+def _agora_iso_utc() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _texto(valor: Any) -> str:
+    return str(valor or "").strip()
+
+
+def _prazo_iso(valor: Optional[float]) -> Optional[str]:
+    if valor is None or valor >= SEM_PRAZO:
+        return None
+    return datetime.fromtimestamp(valor, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _payload_para_gravar(payload: Dict[str, Any]) -> str:
+    # A senha do certificado nunca vai em claro para o banco (no Windows o modo 0600 nao vale).
+    certificado = payload.get("certificado")
+    if isinstance(certificado, dict) and certificado.get("senha"):
+        try:
+            senha = proteger_texto(_texto(certificado["senha"]))
+        except OSError as error:
+            raise ValueError(f"Nao foi possivel proteger a senha do certificado: {_texto(error)}") from error
+        payload = {**payload, "certificado": {**certificado, "senha": senha}}
+    return json.dumps(payload, ensure_ascii=True)
+
+
+def _payload_gravado(conteudo: str) -> Dict[str, Any]:
+    payload = json.loads(conteudo)
+    certificado = payload.get("certificado")
+    if isinstance(certificado, dict) and certificado.get("senha"):
+        try:
+            certificado["senha"] = revelar_texto(_texto(certificado["senha"]))
+        except OSError:
+            # Gravada por outro usuario do Windows: sem senha o robo recusa o payload sem abrir o portal.
+            certificado["senha"] = ""
+    return payload
+
+
+def chave_trabalho(tribunal: str, protocolo: str) -> str:
+    return f"{_texto(tribunal).lower()}|{_texto(protocolo)}"
+
+
+def passo_de_protocolo(passo: str) -> bool:
+    return passo == PASSO_PROTOCOLO or passo.startswith("botao_protocolo")
+
+
+def resposta_passou_protocolo(resposta: Dict[str, Any]) -> bool:
+    if resposta.get("statusExecucao") in ("protocolo_ja_acionado", "clique_incerto"):
+        return True
+    detalhes = resposta.get("detalhesExecucao") if isinstance(resposta.get("detalhesExecucao"), dict) else {}
+    if detalhes.get("cliqueProtocoloEfetuado"):
+        return True
+    return any(passo_de_protocolo(_texto(passo)) for passo in detalhes.get("passos") or [])
+
+
+def atraso_nova_tentativa(tentativa: int, atraso_base_segundos: float) -> float:
+    # Backoff exponencial com jitter: falhas do portal costumam atingir varios trabalhos juntos.
+    atraso = min(ATRASO_MAXIMO_SEGUNDOS, atraso_base_segundos * (2 ** max(0, tentativa - 1)))
+    return atraso * random.uniform(0.5, 1.0)
+
+
+class FilaPeticoes:
+    def __init__(self, arquivo: Path) -> None:
+        self._arquivo = Path(arquivo)
+        self._arquivo.parent.mkdir(parents=True, exist_ok=True)
+        # O payload guarda a senha do certificado: o banco nasce legivel so pelo dono
+        # (o SQLite cria -wal e -shm com as mesmas permissoes).
+        os.close(os.open(str(self._arquivo), os.O_RDWR | os.O_CREAT, 0o600))
+        conexao = sqlite3.connect(str(self._arquivo), timeout=30)
+        try:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.executescript(ESQUEMA_FILA)
+            for tabela, colunas in COLUNAS_AGENDA.items():
+                existentes = {linha[1] for linha in conexao.execute(f"PRAGMA table_info({tabela})")}
+                for nome, definicao in colunas:
+                    if nome not in existentes:
+                        conexao.execute(f"ALTER TABLE {tabela} ADD COLUMN {nome} {definicao}")
+            conexao.executescript(INDICES_FILA)
+        finally:
+            conexao.close()
+
+    @contextlib.contextmanager
+    def _transacao(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE: dois processos consumindo a fila nunca reservam o mesmo trabalho.
+        conexao = sqlite3.connect(str(self._arquivo), timeout=30, isolation_level=None)
+        conexao.row_factory = sqlite3.Row
+        try:
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                yield conexao
+            except BaseException:
+                conexao.execute("ROLLBACK")
+                raise
+            conexao.execute("COMMIT")
+        finally:
+            conexao.close()
+
+    def enfileirar(self, payload: Dict[str, Any], max_tentativas: int = MAX_TENTATIVAS_PADRAO) -> Dict[str, Any]:
+        tribunal = _texto(payload.get("tribunal")).lower()
+        protocolo = _texto(payload.get("protocolo"))
+        if not tribunal or not protocolo:
+            raise ValueError("Payload da fila precisa de 'tribunal' e 'protocolo'.")
+        chave = chave_trabalho(tribunal, protocolo)
+        prazo = prazo_payload(payload)
+        conteudo = _payload_para_gravar(payload)
+        agora = _agora_iso_utc()
+        with self._transacao() as conexao:
+            # Reenfileirar o mesmo protocolo nao cria outro trabalho nem mexe no que ja existe.
+            cursor = conexao.execute(
+                "INSERT OR IGNORE INTO trabalhos "
+                "(chave, tribunal, protocolo, payload, max_tentativas, disponivel_em, prazo, estimativa, "
+                "criado_em, atualizado_em) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    chave,
+                    tribunal,
+                    protocolo,
+                    conteudo,
+                    max(1, max_tentativas),
+                    time.time(),
+                    prazo,
+                    chave_estimativa_payload(payload),
+                    agora,
+                    agora,
+                ),
+            )
+            linha = conexao.execute("SELECT id, estado FROM trabalhos WHERE chave = ?", (chave,)).fetchone()
+        return {"id": linha["id"], "chave": chave, "estado": linha["estado"], "novo": cursor.rowcount == 1}
+
+    def _recuperar_reservas_vencidas(self, conexao: sqlite3.Connection, agora: float) -> None:
+        conexao.execute(
+            "UPDATE trabalhos SET "
+            "estado = CASE WHEN passou_protocolo THEN 'conferir' ELSE 'pendente' END, "
+            "mensagem = CASE WHEN passou_protocolo "
+            "THEN 'Robo interrompido depois do clique em protocolar; confira no portal.' "
+            "ELSE 'Robo interrompido antes do protocolo; trabalho devolvido a fila.' END, "
+            "dono = NULL, reservado_ate = NULL, atualizado_em = ? "
+            "WHERE estado = 'executando' AND reservado_ate < ?",
+            (_agora_iso_utc(), agora),
+        )
+
+    def reservar(self, dono: str, reserva_segundos: int = RESERVA_SEGUNDOS_PADRAO) -> Optional[Dict[str, Any]]:
+        agora = time.time()
+        with self._transacao() as conexao:
+            self._recuperar_reservas_vencidas(conexao, agora)
+            # Prazo mais curto primeiro (EDF); sem prazo, ordem de chegada.
+            linha = conexao.execute(
+                "SELECT id, payload, tentativas FROM trabalhos "
+                "WHERE estado = 'pendente' AND disponivel_em <= ? ORDER BY prazo, disponivel_em, id LIMIT 1",
+                (agora,),
+            ).fetchone()
+            if linha is None:
+                return None
+            conexao.execute(
+                "UPDATE trabalhos SET estado = 'executando', tentativas = tentativas + 1, dono = ?, "
+                "reservado_ate = ?, iniciado_em = ?, atualizado_em = ? WHERE id = ?",
+                (dono, agora + max(60, reserva_segundos), agora, _agora_iso_utc(), linha["id"]),
+            )
+        return {"id": linha["id"], "payload": _payload_gravado(linha["payload"]), "tentativa": linha["tentativas"] + 1}
+
+    def registrar_passo(self, trabalho_id: int, passo: str) -> None:
+        with self._transacao() as conexao:
+            conexao.execute(
+                "UPDATE trabalhos SET ultimo_passo = ?, passou_protocolo = MAX(passou_protocolo, ?), "
+                "atualizado_em = ? WHERE id = ?",
+                (passo, int(passo_de_protocolo(passo)), _agora_iso_utc(), trabalho_id),
+            )
+            conexao.execute(
+                "INSERT INTO transicoes (trabalho_id, tentativa, passo, registrado_em, decorrido_ms) "
+                "SELECT id, tentativas, ?, ?, (? - iniciado_em) * 1000 FROM trabalhos WHERE id = ?",
+                (passo, _agora_iso_utc(), time.time(), trabalho_id),
+            )
+
+    def concluir(
+        self,
+        trabalho_id: int,
+        resposta: Dict[str, Any],
+        atraso_base_segundos: float = ATRASO_BASE_SEGUNDOS_PADRAO,
+    ) -> str:
+        with self._transacao() as conexao:
+            linha = conexao.execute(
+                "SELECT tentativas, max_tentativas, passou_protocolo, iniciado_em FROM trabalhos WHERE id = ?",
+                (trabalho_id,),
+            ).fetchone()
+            if linha is None:
+                return ""
+            passou_protocolo = bool(linha["passou_protocolo"]) or resposta_passou_protocolo(resposta)
+            disponivel_em = time.time()
+            duracao_ms = (disponivel_em - linha["iniciado_em"]) * 1000 if linha["iniciado_em"] else None
+            if resposta.get("ok"):
+                estado = "concluido"
+            elif passou_protocolo:
+                # O portal pode ter aceitado a peticao: repetir arriscaria protocolar duas vezes.
+                estado = "conferir"
+            elif resposta.get("statusExecucao") == "erro" and linha["tentativas"] < linha["max_tentativas"]:
+                # So falhas do fluxo real (timeout, seletor, rede) sao transientes; erro de validacao nao muda.
+                estado = "pendente"
+                disponivel_em += atraso_nova_tentativa(linha["tentativas"], atraso_base_segundos)
+            else:
+                estado = "falhou"
+            conexao.execute(
+                "UPDATE trabalhos SET estado = ?, passou_protocolo = ?, disponivel_em = ?, dono = NULL, "
+                "reservado_ate = NULL, duracao_ms = ?, mensagem = ?, resultado = ?, atualizado_em = ? WHERE id = ?",
+                (
+                    estado,
+                    int(passou_protocolo),
+                    disponivel_em,
+                    duracao_ms,
+                    _texto(resposta.get("mensagem")),
+                    json.dumps(resposta, ensure_ascii=True, default=str),
+                    _agora_iso_utc(),
+                    trabalho_id,
+                ),
+            )
+        return estado
+
+    def reabrir(self, trabalho_id: int) -> bool:
+        # So trabalhos que falharam antes do protocolo; 'conferir' exige olhar o portal primeiro.
+        with self._transacao() as conexao:
+            cursor = conexao.execute(
+                "UPDATE trabalhos SET estado = 'pendente', tentativas = 0, disponivel_em = ?, atualizado_em = ? "
+                "WHERE id = ? AND estado = 'falhou' AND passou_protocolo = 0",
+                (time.time(), _agora_iso_utc(), trabalho_id),
+            )
+            return cursor.rowcount == 1
+
+    def listar(self, estado: str = "", limite: int = LIMITE_LISTAGEM_PADRAO) -> List[Dict[str, Any]]:
+        filtro = "WHERE estado = ?" if estado else ""
+        with self._transacao() as conexao:
+            linhas = conexao.execute(
+                "SELECT id, tribunal, protocolo, estado, tentativas, max_tentativas, ultimo_passo, "
+                f"passou_protocolo, prazo, mensagem, criado_em, atualizado_em FROM trabalhos {filtro} "
+                "ORDER BY id DESC LIMIT ?",
+                ((estado,) if estado else ()) + (max(1, limite),),
+            ).fetchall()
+        return [{**dict(linha), "prazo": _prazo_iso(linha["prazo"])} for linha in linhas]
+
+    def estimativas(self) -> Dict[str, Any]:
+        with self._transacao() as conexao:
+            tentativas = conexao.execute(
+                "SELECT estimativa, duracao_ms / 1000.0 FROM trabalhos WHERE duracao_ms IS NOT NULL "
+                "ORDER BY atualizado_em DESC LIMIT ?",
+                (LIMITE_HISTORICO_TENTATIVAS,),
+            ).fetchall()
+            passos = conexao.execute(
+                "SELECT t.estimativa, x.passo, x.decorrido_ms / 1000.0 FROM transicoes x "
+                "JOIN trabalhos t ON t.id = x.trabalho_id WHERE x.decorrido_ms IS NOT NULL "
+                "ORDER BY x.id DESC LIMIT ?",
+                (LIMITE_HISTORICO_PASSOS,),
+            ).fetchall()
+        return estimar_duracoes([tuple(linha) for linha in tentativas], [tuple(linha) for linha in passos])
+
+    def prever(self, paralelo: int = 0) -> Dict[str, Any]:
+        # Sem "paralelo", o ritmo atual e o numero de consumidores com trabalho em andamento.
+        estimativas = self.estimativas()
+        agora = time.time()
+        with self._transacao() as conexao:
+            linhas = conexao.execute(
+                "SELECT id, tribunal, protocolo, estado, prazo, estimativa, disponivel_em, ultimo_passo, "
+                "iniciado_em, dono FROM trabalhos WHERE estado IN ('pendente', 'executando')"
+            ).fetchall()
+        em_execucao = [
+            {
+                "restante": duracao_restante(
+                    estimativas, linha["estimativa"], linha["ultimo_passo"], agora - (linha["iniciado_em"] or agora)
+                )
+            }
+            for linha in linhas
+            if linha["estado"] == "executando"
+        ]
+        paralelo = paralelo or max(1, len({linha["dono"] for linha in linhas if linha["estado"] == "executando"}))
+        pendentes = [
+            {"id": linha["id"], "prazo": linha["prazo"], "disponivelEm": linha["disponivel_em"], "chave": linha["estimativa"]}
+            for linha in linhas
+            if linha["estado"] == "pendente"
+        ]
+        por_id = {linha["id"]: linha for linha in linhas}
+        previsoes = [
+            {
+                "id": previsao["id"],
+                "tribunal": por_id[previsao["id"]]["tribunal"],
+                "protocolo": por_id[previsao["id"]]["protocolo"],
+                "prazo": _prazo_iso(por_id[previsao["id"]]["prazo"]),
+                "terminoPrevisto": _prazo_iso(previsao["terminoPrevisto"]),
+                "folgaSegundos": previsao["folgaSegundos"],
+                "emRisco": previsao["emRisco"],
+            }
+            for previsao in prever_conclusoes(em_execucao, pendentes, estimativas, paralelo, agora)
+        ]
+        return {
+            "paralelo": paralelo,
+            "emExecucao": len(em_execucao),
+            "emRisco": sum(1 for previsao in previsoes if previsao["emRisco"]),
+            "duracoesEstimadasSegundos": {chave: round(valor, 1) for chave, valor in estimativas["total"].items()},
+            "trabalhos": previsoes,
+        }
+
+    def transicoes(self, trabalho_id: int) -> List[Dict[str, Any]]:
+        with self._transacao() as conexao:
+            linhas = conexao.execute(
+                "SELECT tentativa, passo, registrado_em FROM transicoes WHERE trabalho_id = ? ORDER BY id",
+                (trabalho_id,),
+            ).fetchall()
+        return [dict(linha) for linha in linhas]
+
+
+def processar_fila(
+    fila: FilaPeticoes,
+    executar: Optional[Callable[[Dict[str, Any], Callable[[str], None]], Dict[str, Any]]] = None,
+    limite: int = 0,
+    dono: str = "",
+    reserva_segundos: int = RESERVA_SEGUNDOS_PADRAO,
+) -> Dict[str, int]:
+    if executar is None:
+        from robo_worker import executar_payload
+
+        def executar(payload: Dict[str, Any], ao_passo: Callable[[str], None]) -> Dict[str, Any]:
+            return executar_payload(payload, ao_passo=ao_passo)
+
+    dono = dono or f"{socket.gethostname()}:{os.getpid()}"
+    contagem: Dict[str, int] = {}
+    processados = 0
+    while not limite or processados < limite:
+        trabalho = fila.reservar(dono, reserva_segundos)
+        if trabalho is None:
+            break
+        trabalho_id = trabalho["id"]
+        try:
+            resposta = executar(trabalho["payload"], lambda passo: fila.registrar_passo(trabalho_id, passo))
+        except Exception as error:
+            resposta = {"ok": False, "statusExecucao": "erro", "mensagem": f"Falha inesperada na fila: {_texto(error)}"}
+        estado = fila.concluir(trabalho_id, resposta)
+        contagem[estado] = contagem.get(estado, 0) + 1
+        processados += 1
+    return contagem
+
+
+def main() -> None:
+    from robo_lote import carregar_manifesto
+    from robo_tjsp_base import encerrar_sessoes_navegador, pasta_automacao
+
+    parser = argparse.ArgumentParser(description="Fila local e duravel de peticoes (SQLite).")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    entrada = subcomandos.add_parser("enfileirar", help="Enfileira os payloads de um manifesto (sem duplicar).")
+    entrada.add_argument("manifesto", help="Arquivo JSON com array de payloads ou pasta com um payload .json por arquivo.")
+    entrada.add_argument("--tribunal", default="", help="Tribunal usado nas entradas sem campo 'tribunal'.")
+    entrada.add_argument("--max-tentativas", type=int, default=MAX_TENTATIVAS_PADRAO)
+    processamento = subcomandos.add_parser("processar", help="Executa os trabalhos disponiveis, um por vez.")
+    processamento.add_argument("--limite", type=int, default=0, help="Maximo de trabalhos nesta execucao (0: todos).")
+    previsao = subcomandos.add_parser("prever", help="Preve o termino de cada trabalho e aponta os que perdem o prazo.")
+    previsao.add_argument("--paralelo", type=int, default=0, help="Robos simultaneos (0: os que estao rodando agora).")
+    listagem = subcomandos.add_parser("listar", help="Lista trabalhos (mais recentes primeiro).")
+    listagem.add_argument("--estado", default="", choices=("",) + ESTADOS_FILA)
+    listagem.add_argument("--limite", type=int, default=LIMITE_LISTAGEM_PADRAO)
+    reabertura = subcomandos.add_parser("reabrir", help="Devolve a fila um trabalho que falhou antes do protocolo.")
+    reabertura.add_argument("id", type=int)
+    args = parser.parse_args()
+
+    fila = FilaPeticoes(pasta_automacao() / NOME_BANCO_FILA)
+    resultado: Any
+    if args.comando == "enfileirar":
+        try:
+            payloads = carregar_manifesto(args.manifesto, _texto(args.tribunal).lower())
+        except (OSError, ValueError) as error:
+            print(json.dumps({"ok": False, "mensagem": f"Manifesto invalido: {_texto(error)}"}, ensure_ascii=True))
+            return
+        itens = []
+        for payload in payloads:
+            try:
+                itens.append(fila.enfileirar(payload, args.max_tentativas))
+            except ValueError as error:
+                itens.append({"novo": False, "mensagem": _texto(error), "protocolo": payload.get("protocolo")})
+        resultado = {"ok": all("id" in item for item in itens), "itens": itens}
+    elif args.comando == "processar":
+        os.environ.setdefault("PETICIONADOR_POOL_SESSOES", "1")
+        em_risco = [item["protocolo"] for item in fila.prever(1)["trabalhos"] if item["emRisco"]]
+        try:
+            resultado = {"ok": True, "emRisco": em_risco, "estados": processar_fila(fila, limite=args.limite)}
+        finally:
+            encerrar_sessoes_navegador()
+    elif args.comando == "prever":
+        resultado = fila.prever(args.paralelo)
+    elif args.comando == "listar":
+        resultado = fila.listar(args.estado, args.limite)
+    else:
+        resultado = {"ok": fila.reabrir(args.id)}
+    print(json.dumps(resultado, ensure_ascii=True))
+
+
+if __name__ == "__main__":
+    main()
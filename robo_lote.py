@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from robo_agenda import prazo_payload_seguro
+from robo_executor import ExecutorPeticoes
+from robo_tjsp_base import encerrar_sessoes_navegador, normalizar_canal, obter_fluxo_tjsp, texto_limpo
+from robo_worker import executar_payload
+
+
+TRIBUNAIS_COM_CANAL = {"tjsp", "tjsp2"}
+
+
+def carregar_manifesto(caminho: str, tribunal_padrao: str = "") -> List[Dict[str, Any]]:
+    origem = Path(caminho)
+    if origem.is_dir():
+        entradas = []
+        for arquivo in sorted(origem.glob("*.json")):
+            entradas.append(json.loads(arquivo.read_text(encoding="utf-8")))
+    else:
+        entradas = json.loads(origem.read_text(encoding="utf-8"))
+        if isinstance(entradas, dict):
+            entradas = entradas.get("payloads") or entradas.get("itens") or []
+
+    if not isinstance(entradas, list):
+        raise ValueError("Manifesto do lote deve ser um array JSON ou uma pasta de payloads.")
+
+    payloads: List[Dict[str, Any]] = []
+    for entrada in entradas:
+        payload = dict(entrada) if isinstance(entrada, dict) else {}
+        if tribunal_padrao and not texto_limpo(payload.get("tribunal")):
+            payload["tribunal"] = tribunal_padrao
+        payloads.append(payload)
+    return payloads
+
+
+def chave_grupo_lote(payload: Dict[str, Any]) -> Tuple[str, str, str]:
+    tribunal = texto_limpo(payload.get("tribunal")).lower()
+    canal = ""
+    if tribunal in TRIBUNAIS_COM_CANAL:
+        try:
+            canal = normalizar_canal(payload)
+        except ValueError:
+            canal = "invalido"
+    modulo = texto_limpo(obter_fluxo_tjsp(payload).get("modulo")).lower()
+    return (tribunal, canal, modulo)
+
+
+def agrupar_lote(payloads: List[Dict[str, Any]]) -> Dict[Tuple[str, str, str], List[int]]:
+    grupos: Dict[Tuple[str, str, str], List[int]] = {}
+    for indice, payload in enumerate(payloads):
+        grupos.setdefault(chave_grupo_lote(payload), []).append(indice)
+    return grupos
+
+
+def executar_lote(payloads: List[Dict[str, Any]], simultaneo: bool = False) -> Dict[str, Any]:
+    resultados: List[Dict[str, Any]] = [{} for _ in payloads]
+    resumo_grupos: List[Dict[str, Any]] = []
+
+    prazos = [prazo_payload_seguro(payload) for payload in payloads]
+    # O grupo com o prazo mais curto entra primeiro, sem desfazer o agrupamento por login.
+    grupos = sorted(agrupar_lote(payloads).items(), key=lambda grupo: min(prazos[indice] for indice in grupo[1]))
+    if simultaneo:
+        # Grupos diferentes rodam ao mesmo tempo; cada grupo ocupa uma vaga do executor e segue
+        # em sequencia nela, mantendo um navegador e um login por grupo. Limites: PETICIONADOR_EXECUTOR_*.
+        try:
+            resultados = ExecutorPeticoes().executar_lote(payloads, [indices for _, indices in grupos])
+        finally:
+            encerrar_sessoes_navegador()
+    for (tribunal, canal, modulo), indices in grupos:
+        indices = sorted(indices, key=lambda indice: prazos[indice])
+        if not simultaneo:
+            try:
+                for indice in indices:
+                    resultados[indice] = executar_payload(payloads[indice])
+            finally:
+                # Cada grupo usa um navegador/login do pool; ao trocar de grupo ele e liberado.
+                encerrar_sessoes_navegador()
+        resumo_grupos.append(
+            {
+                "tribunal": tribunal,
+                "canal": canal,
+                "modulo": modulo,
+                "total": len(indices),
+                "sucesso": sum(1 for indice in indices if resultados[indice].get("ok")),
+            }
+        )
+
+    return {
+        "ok": all(resultado.get("ok") for resultado in resultados),
+        "total": len(resultados),
+        "sucesso": sum(1 for resultado in resultados if resultado.get("ok")),
+        "falha": sum(1 for resultado in resultados if not resultado.get("ok")),
+        "grupos": resumo_grupos,
+        "resultados": resultados,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Protocolo em lote a partir de um manifesto de payloads.")
+    parser.add_argument("manifesto", help="Arquivo JSON com array de payloads ou pasta com um payload .json por arquivo.")
+    parser.add_argument("--tribunal", default="", help="Tribunal usado nas entradas sem campo 'tribunal'.")
+    parser.add_argument(
+        "--simultaneo",
+        action="store_true",
+        help="Executa varias peticoes ao mesmo tempo, respeitando os limites PETICIONADOR_EXECUTOR_*.",
+    )
+    args = parser.parse_args()
+
+    os.environ.setdefault("PETICIONADOR_POOL_SESSOES", "1")
+    try:
+        payloads = carregar_manifesto(args.manifesto, texto_limpo(args.tribunal).lower())
+    except (OSError, ValueError) as error:
+        print(json.dumps({"ok": False, "mensagem": f"Manifesto invalido: {texto_limpo(error)}"}, ensure_ascii=True))
+        return
+
+    print(json.dumps(executar_lote(payloads, simultaneo=args.simultaneo), ensure_ascii=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+from typing import Dict, List, Optional
+
+
+def _filhos_por_pai_proc() -> Dict[int, List[int]]:
+    filhos: Dict[int, List[int]] = {}
+    for nome in os.listdir("/proc"):
+        if not nome.isdigit():
+            continue
+        try:
+            with open(f"/proc/{nome}/stat", "r", encoding="utf-8") as arquivo:
+                estado = arquivo.read()
+        except OSError:
+            continue
+        # O nome do processo pode conter espacos; o ppid e o segundo campo apos o ')'.
+        campos = estado.rsplit(")", 1)[-1].split()
+        if len(campos) > 1:
+            filhos.setdefault(int(campos[1]), []).append(int(nome))
+    return filhos
+
+
+def _rss_proc_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as arquivo:
+            for linha in arquivo:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def memoria_arvore_processos_mb(pid: int) -> Optional[float]:
+    if pid <= 0:
+        return None
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+
+    if psutil is not None:
+        try:
+            raiz = psutil.Process(pid)
+            processos = [raiz] + raiz.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for processo in processos:
+            try:
+                total += processo.memory_info().rss
+            except psutil.Error:
+                continue
+        return round(total / (1024 * 1024), 1)
+
+    if not os.path.isdir("/proc"):
+        return None
+    filhos = _filhos_por_pai_proc()
+    pendentes = [pid]
+    total_kb = 0
+    while pendentes:
+        atual = pendentes.pop()
+        total_kb += _rss_proc_kb(atual)
+        pendentes.extend(filhos.get(atual, []))
+    return round(total_kb / 1024, 1) if total_kb else None
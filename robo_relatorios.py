@@ -0,0 +1,260 @@
+import argparse
+import contextlib
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+
+NOME_BANCO_RELATORIOS = "execucoes.sqlite3"
+LIMITE_CONSULTA_PADRAO = 100
+AMOSTRAS_REFERENCIA_REDE = 20
+ESQUEMA_RELATORIOS = """
+CREATE TABLE IF NOT EXISTS execucoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    protocolo TEXT NOT NULL DEFAULT '',
+    tribunal TEXT NOT NULL DEFAULT '',
+    status_execucao TEXT NOT NULL DEFAULT '',
+    modo_execucao TEXT NOT NULL DEFAULT '',
+    ok INTEGER NOT NULL DEFAULT 0,
+    registrado_em TEXT NOT NULL,
+    origem TEXT,
+    conteudo TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_execucoes_tribunal_status
+    ON execucoes (tribunal, status_execucao, registrado_em);
+CREATE INDEX IF NOT EXISTS idx_execucoes_modo ON execucoes (modo_execucao, registrado_em);
+CREATE INDEX IF NOT EXISTS idx_execucoes_registrado ON execucoes (registrado_em);
+CREATE INDEX IF NOT EXISTS idx_execucoes_protocolo ON execucoes (protocolo);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_execucoes_origem ON execucoes (origem) WHERE origem IS NOT NULL;
+"""
+
+
+def _agora_iso_utc() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _campos_indexados(protocolo: str, tribunal: str, conteudo: Dict[str, Any]) -> Dict[str, Any]:
+    resposta = conteudo.get("resposta") if isinstance(conteudo.get("resposta"), dict) else {}
+    return {
+        "protocolo": str(protocolo or resposta.get("protocolo") or ""),
+        "tribunal": str(tribunal or resposta.get("tribunal") or "").upper(),
+        "status_execucao": str(resposta.get("statusExecucao") or ("erro" if conteudo.get("erro") else "")),
+        "modo_execucao": str(conteudo.get("modoExecucao") or resposta.get("modoExecucao") or ""),
+        "ok": 1 if resposta.get("ok") else 0,
+        "registrado_em": str(resposta.get("protocoladoEm") or _agora_iso_utc()),
+    }
+
+
+class ArmazemRelatorios:
+    def __init__(self, arquivo: Path) -> None:
+        self._arquivo = Path(arquivo)
+        self._trava = threading.Lock()
+        self._arquivo.parent.mkdir(parents=True, exist_ok=True)
+        with self._conectar() as conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.executescript(ESQUEMA_RELATORIOS)
+
+    @property
+    def arquivo(self) -> Path:
+        return self._arquivo
+
+    @contextlib.contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        conexao = sqlite3.connect(str(self._arquivo), timeout=30)
+        conexao.row_factory = sqlite3.Row
+        try:
+            with conexao:
+                yield conexao
+        finally:
+            conexao.close()
+
+    def registrar(
+        self,
+        protocolo: str,
+        tribunal: str,
+        conteudo: Dict[str, Any],
+        origem: Optional[str] = None,
+    ) -> int:
+        campos = _campos_indexados(protocolo, tribunal, conteudo)
+        with self._trava, self._conectar() as conexao:
+            cursor = conexao.execute(
+                "INSERT OR IGNORE INTO execucoes "
+                "(protocolo, tribunal, status_execucao, modo_execucao, ok, registrado_em, origem, conteudo) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    campos["protocolo"],
+                    campos["tribunal"],
+                    campos["status_execucao"],
+                    campos["modo_execucao"],
+                    campos["ok"],
+                    campos["registrado_em"],
+                    origem,
+                    json.dumps(conteudo, ensure_ascii=True, separators=(",", ":")),
+                ),
+            )
+            return int(cursor.lastrowid or 0) if cursor.rowcount else 0
+
+    def consultar(
+        self,
+        tribunal: str = "",
+        status_execucao: str = "",
+        modo_execucao: str = "",
+        protocolo: str = "",
+        desde: str = "",
+        ate: str = "",
+        limite: int = LIMITE_CONSULTA_PADRAO,
+        incluir_conteudo: bool = True,
+        execucao_id: int = 0,
+    ) -> List[Dict[str, Any]]:
+        filtros: List[str] = []
+        valores: List[Any] = []
+        if execucao_id:
+            filtros.append("id = ?")
+            valores.append(int(execucao_id))
+        for coluna, valor in (
+            ("tribunal", str(tribunal or "").upper()),
+            ("status_execucao", status_execucao),
+            ("modo_execucao", modo_execucao),
+            ("protocolo", protocolo),
+        ):
+            if valor:
+                filtros.append(f"{coluna} = ?")
+                valores.append(valor)
+        if desde:
+            filtros.append("registrado_em >= ?")
+            valores.append(desde)
+        if ate:
+            filtros.append("registrado_em < ?")
+            valores.append(ate)
+
+        colunas = "id, protocolo, tribunal, status_execucao, modo_execucao, ok, registrado_em"
+        if incluir_conteudo:
+            colunas += ", conteudo"
+        sql = f"SELECT {colunas} FROM execucoes"
+        if filtros:
+            sql += " WHERE " + " AND ".join(filtros)
+        sql += " ORDER BY registrado_em DESC, id DESC LIMIT ?"
+        valores.append(max(1, int(limite)))
+
+        with self._conectar() as conexao:
+            linhas = conexao.execute(sql, valores).fetchall()
+
+        saida: List[Dict[str, Any]] = []
+        for linha in linhas:
+            item = {
+                "id": linha["id"],
+                "protocolo": linha["protocolo"],
+                "tribunal": linha["tribunal"],
+                "statusExecucao": linha["status_execucao"],
+                "modoExecucao": linha["modo_execucao"],
+                "ok": bool(linha["ok"]),
+                "registradoEm": linha["registrado_em"],
+            }
+            if incluir_conteudo:
+                item["conteudo"] = json.loads(linha["conteudo"])
+            saida.append(item)
+        return saida
+
+    def bytes_rede_sem_perfil_enxuto(self, tribunal: str, limite: int = AMOSTRAS_REFERENCIA_REDE) -> int:
+        # Mediana das ultimas execucoes reais sem perfil enxuto: a referencia para medir a economia.
+        with self._conectar() as conexao:
+            linhas = conexao.execute(
+                "SELECT json_extract(conteudo, '$.resposta.detalhesExecucao.rede.bytesRecebidos') AS bytes "
+                "FROM execucoes WHERE tribunal = ? AND modo_execucao = 'real' AND ok = 1 "
+                "AND json_extract(conteudo, '$.resposta.detalhesExecucao.perfilEnxuto') = 0 "
+                "AND bytes > 0 ORDER BY registrado_em DESC, id DESC LIMIT ?",
+                (str(tribunal or "").upper(), max(1, int(limite))),
+            ).fetchall()
+        valores = sorted(int(linha["bytes"]) for linha in linhas)
+        if not valores:
+            return 0
+        meio = len(valores) // 2
+        return valores[meio] if len(valores) % 2 else (valores[meio - 1] + valores[meio]) // 2
+
+    def podar(self, ate: str) -> List[Dict[str, Any]]:
+        # Devolve o conteudo removido para quem guarda os artefatos liberar as referencias.
+        with self._trava, self._conectar() as conexao:
+            linhas = conexao.execute(
+                "SELECT id, conteudo FROM execucoes WHERE registrado_em < ?", (ate,)
+            ).fetchall()
+            conexao.executemany("DELETE FROM execucoes WHERE id = ?", [(linha["id"],) for linha in linhas])
+        return [json.loads(linha["conteudo"]) for linha in linhas]
+
+    def importar_json_legado(self, pasta: Path) -> Dict[str, int]:
+        importados = 0
+        ignorados = 0
+        for arquivo in sorted(Path(pasta).glob("*_execucao.json")):
+            try:
+                conteudo = json.loads(arquivo.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                ignorados += 1
+                continue
+            if not isinstance(conteudo, dict):
+                ignorados += 1
+                continue
+            resposta = conteudo.get("resposta") if isinstance(conteudo.get("resposta"), dict) else {}
+            if not resposta.get("protocoladoEm"):
+                momento = datetime.fromtimestamp(arquivo.stat().st_mtime, timezone.utc)
+                resposta = {**resposta, "protocoladoEm": momento.isoformat().replace("+00:00", "Z")}
+                conteudo = {**conteudo, "resposta": resposta}
+            if self.registrar("", "", conteudo, origem=arquivo.name):
+                importados += 1
+            else:
+                ignorados += 1
+        return {"importados": importados, "ignorados": ignorados}
+
+
+def main() -> None:
+    from robo_tjsp_base import armazem_conteudo, pasta_automacao
+
+    parser = argparse.ArgumentParser(description="Consulta e importacao dos relatorios de execucao dos robos.")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    consulta = subcomandos.add_parser("consultar", help="Lista execucoes registradas (mais recentes primeiro).")
+    consulta.add_argument("--id", type=int, default=0, help="relatorioExecucaoId devolvido na resposta do robo.")
+    consulta.add_argument("--tribunal", default="")
+    consulta.add_argument("--status", default="", help="statusExecucao, ex.: erro, protocolado_comprovado.")
+    consulta.add_argument("--modo", default="", help="modoExecucao: simulado ou real.")
+    consulta.add_argument("--protocolo", default="")
+    consulta.add_argument("--desde", default="", help="Data/hora ISO inicial (inclusiva).")
+    consulta.add_argument("--ate", default="", help="Data/hora ISO final (exclusiva).")
+    consulta.add_argument("--limite", type=int, default=LIMITE_CONSULTA_PADRAO)
+    consulta.add_argument("--completo", action="store_true", help="Inclui o relatorio completo de cada execucao.")
+    poda = subcomandos.add_parser("podar", help="Remove execucoes antigas, libera as capturas so delas e apaga as orfas.")
+    poda.add_argument("--ate", required=True, help="Data/hora ISO final (exclusiva).")
+    importacao = subcomandos.add_parser("importar", help="Importa os antigos *_execucao.json da pasta automacao.")
+    importacao.add_argument("--pasta", default="", help="Pasta com os JSON antigos (padrao: pasta automacao).")
+    args = parser.parse_args()
+
+    pasta = pasta_automacao()
+    armazem = ArmazemRelatorios(pasta / NOME_BANCO_RELATORIOS)
+    if args.comando == "importar":
+        resultado: Any = armazem.importar_json_legado(Path(args.pasta) if args.pasta else pasta)
+    elif args.comando == "podar":
+        removidos = armazem.podar(args.ate)
+        objetos = armazem_conteudo()
+        liberados = sum(objetos.liberar_relatorio(conteudo) for conteudo in removidos) if objetos else 0
+        resultado = {
+            "removidos": len(removidos),
+            "capturasApagadas": liberados,
+            "orfaos": objetos.limpar_orfaos() if objetos else {},
+        }
+    else:
+        resultado = armazem.consultar(
+            tribunal=args.tribunal,
+            status_execucao=args.status,
+            modo_execucao=args.modo,
+            protocolo=args.protocolo,
+            desde=args.desde,
+            ate=args.ate,
+            limite=args.limite,
+            incluir_conteudo=args.completo,
+            execucao_id=args.id,
+        )
+    print(json.dumps(resultado, ensure_ascii=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+NOME_PASTA_RETOMADAS = "retomadas"
+VALIDADE_RETOMADA_MINUTOS_PADRAO = 30
+ETAPAS_FLUXO = ("navegador", "login", "formulario", "upload", "protocolo", "comprovante")
+
+
+def etapa_alcancada(ponto: Dict[str, Any], etapa: str) -> bool:
+    atual = str(ponto.get("etapa") or "")
+    if atual not in ETAPAS_FLUXO:
+        return False
+    return ETAPAS_FLUXO.index(atual) >= ETAPAS_FLUXO.index(etapa)
+
+
+class PontosRetomada:
+    def __init__(self, pasta: Path) -> None:
+        self._pasta = Path(pasta)
+        self._pasta.mkdir(parents=True, exist_ok=True)
+        self._trava = threading.Lock()
+
+    def _arquivo(self, protocolo: str) -> Path:
+        return self._pasta / f"{hashlib.sha256(protocolo.encode('utf-8')).hexdigest()[:32]}.json"
+
+    def carregar(self, protocolo: str, chave: str, validade_segundos: int, certificado: str = "") -> Dict[str, Any]:
+        try:
+            ponto = json.loads(self._arquivo(protocolo).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        # A chave e a identidade da peticao (processo, conteudo do PDF): outra peticao com o mesmo
+        # protocolo nao herda o ponto, mas o mesmo PDF copiado para outra pasta herda.
+        if not isinstance(ponto, dict) or ponto.get("chave") != chave:
+            return {}
+        # Depois do clique em protocolar o ponto serve para recusar um segundo clique: nao vence e
+        # vale para qualquer certificado, ate alguem conferir no portal e libera-lo.
+        if etapa_alcancada(ponto, "protocolo"):
+            return ponto
+        # Antes do protocolo o ponto e retomada de sessao, que so vale para o mesmo certificado.
+        if ponto.get("certificado", "") != certificado:
+            return {}
+        if time.time() - float(ponto.get("salvoEm") or 0) > validade_segundos:
+            return {}
+        return ponto
+
+    def salvar(self, protocolo: str, chave: str, ponto: Dict[str, Any], certificado: str = "") -> None:
+        conteudo = json.dumps(
+            {**ponto, "protocolo": protocolo, "chave": chave, "certificado": certificado, "salvoEm": time.time()},
+            ensure_ascii=True,
+        )
+        arquivo = self._arquivo(protocolo)
+        temporario = arquivo.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with self._trava:
+            with open(temporario, "w", encoding="utf-8") as destino:
+                destino.write(conteudo)
+                destino.flush()
+                os.fsync(destino.fileno())
+            os.replace(temporario, arquivo)
+
+    def descartar(self, protocolo: str) -> None:
+        try:
+            self._arquivo(protocolo).unlink()
+        except OSError:
+            pass
+
+    def pendentes_conferencia(self) -> List[Dict[str, Any]]:
+        pendentes = []
+        for arquivo in sorted(self._pasta.glob("*.json")):
+            try:
+                ponto = json.loads(arquivo.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if isinstance(ponto, dict) and etapa_alcancada(ponto, "protocolo"):
+                pendentes.append(
+                    {
+                        "protocolo": ponto.get("protocolo", ""),
+                        "url": ponto.get("url", ""),
+                        "salvoEm": ponto.get("salvoEm"),
+                    }
+                )
+        return pendentes
+
+
+def main() -> None:
+    from robo_tjsp_base import pasta_automacao
+
+    parser = argparse.ArgumentParser(description="Pontos de retomada que aguardam conferencia no portal.")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    subcomandos.add_parser("listar", help="Lista os protocolos cujo botao de protocolo ja foi acionado.")
+    liberacao = subcomandos.add_parser("liberar", help="Apaga o ponto de um protocolo ja conferido no portal.")
+    liberacao.add_argument("protocolo")
+    args = parser.parse_args()
+
+    pontos = PontosRetomada(pasta_automacao() / NOME_PASTA_RETOMADAS)
+    if args.comando == "listar":
+        resultado: Any = pontos.pendentes_conferencia()
+    else:
+        pontos.descartar(args.protocolo)
+        resultado = {"ok": True, "protocolo": args.protocolo}
+    print(json.dumps(resultado, ensure_ascii=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import base64
+import ctypes
+import sys
+
+
+# Segredos gravados em disco (senha do certificado na fila, cookies de SSO) passam pela DPAPI do
+# Windows: so o mesmo usuario, na mesma maquina, consegue abrir. Fora do Windows nao ha DPAPI e o
+# conteudo fica como esta, protegido apenas pelas permissoes 0600 do arquivo.
+MARCA_DPAPI = b"dpapi1:"
+ENTROPIA_DPAPI = b"peticionador-multitribunal"
+CRYPTPROTECT_UI_FORBIDDEN = 0x01
+
+
+def protecao_disponivel() -> bool:
+    return sys.platform == "win32"
+
+
+def _chamar_dpapi(dados: bytes, cifrar: bool) -> bytes:
+    from ctypes import wintypes
+
+    class Blob(ctypes.Structure):
+        _fields_ = [("cbData", wintypes.DWORD), ("pbData", ctypes.POINTER(ctypes.c_char))]
+
+    def blob(conteudo: bytes) -> Blob:
+        buffer = ctypes.create_string_buffer(conteudo, len(conteudo))
+        return Blob(len(conteudo), ctypes.cast(buffer, ctypes.POINTER(ctypes.c_char)))
+
+    crypt32 = ctypes.WinDLL("crypt32", use_last_error=True)
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    entrada = blob(dados)
+    entropia = blob(ENTROPIA_DPAPI)
+    saida = Blob()
+    funcao = crypt32.CryptProtectData if cifrar else crypt32.CryptUnprotectData
+    if not funcao(
+        ctypes.byref(entrada),
+        None,
+        ctypes.byref(entropia),
+        None,
+        None,
+        CRYPTPROTECT_UI_FORBIDDEN,
+        ctypes.byref(saida),
+    ):
+        raise ctypes.WinError(ctypes.get_last_error())
+    try:
+        return ctypes.string_at(saida.pbData, saida.cbData)
+    finally:
+        kernel32.LocalFree(saida.pbData)
+
+
+def _cifrar_dpapi(dados: bytes) -> bytes:
+    return _chamar_dpapi(dados, cifrar=True)
+
+
+def _decifrar_dpapi(dados: bytes) -> bytes:
+    return _chamar_dpapi(dados, cifrar=False)
+
+
+def proteger(dados: bytes) -> bytes:
+    if not protecao_disponivel():
+        return dados
+    return MARCA_DPAPI + _cifrar_dpapi(dados)
+
+
+def revelar(dados: bytes) -> bytes:
+    # Conteudo sem a marca foi gravado fora do Windows (ou antes da protecao) e volta como esta.
+    if not dados.startswith(MARCA_DPAPI):
+        return dados
+    return _decifrar_dpapi(dados[len(MARCA_DPAPI):])
+
+
+def proteger_texto(texto: str) -> str:
+    if not texto or not protecao_disponivel():
+        return texto
+    cifrado = proteger(texto.encode("utf-8"))[len(MARCA_DPAPI):]
+    return MARCA_DPAPI.decode("ascii") + base64.b64encode(cifrado).decode("ascii")
+
+
+def revelar_texto(texto: str) -> str:
+    marca = MARCA_DPAPI.decode("ascii")
+    if not texto.startswith(marca):
+        return texto
+    return _decifrar_dpapi(base64.b64decode(texto[len(marca):])).decode("utf-8")
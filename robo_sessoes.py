@@ -0,0 +1,75 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from robo_segredos import proteger, revelar
+
+
+NOME_PASTA_SESSOES = "sessoes"
+VALIDADE_SESSAO_HORAS_PADRAO = 8
+CAMPOS_COOKIE = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite")
+
+
+def cookie_para_restaurar(cookie: Dict[str, Any]) -> Dict[str, Any]:
+    # Network.getAllCookies devolve campos que Network.setCookies nao aceita (size, session, priority...).
+    parametro = {campo: cookie[campo] for campo in CAMPOS_COOKIE if cookie.get(campo) not in (None, "")}
+    expira = cookie.get("expires")
+    if not cookie.get("session") and isinstance(expira, (int, float)) and expira > 0:
+        parametro["expires"] = expira
+    return parametro
+
+
+def cookie_do_dominio(cookie: Dict[str, Any], hosts: List[str]) -> bool:
+    dominio = str(cookie.get("domain") or "").lstrip(".").lower()
+    return bool(dominio) and any(host == dominio or host.endswith("." + dominio) for host in hosts)
+
+
+class CofreSessoes:
+    def __init__(self, pasta: Path) -> None:
+        self._pasta = Path(pasta)
+        self._pasta.mkdir(mode=0o700, parents=True, exist_ok=True)
+        try:
+            os.chmod(self._pasta, 0o700)
+        except OSError:
+            pass
+        self._trava = threading.Lock()
+
+    def _arquivo(self, chave: str) -> Path:
+        return self._pasta / f"{chave}.json"
+
+    def carregar(self, chave: str, validade_segundos: int) -> List[Dict[str, Any]]:
+        try:
+            dados = json.loads(revelar(self._arquivo(chave).read_bytes()).decode("utf-8"))
+        except (OSError, ValueError):
+            # Inclui o cofre cifrado por outro usuario do Windows: segue para o login completo.
+            return []
+        if not isinstance(dados, dict) or time.time() - float(dados.get("salvoEm") or 0) > validade_segundos:
+            return []
+        agora = time.time()
+        return [
+            cookie
+            for cookie in dados.get("cookies") or []
+            if isinstance(cookie, dict) and not (cookie.get("expires") and cookie["expires"] < agora)
+        ]
+
+    def salvar(self, chave: str, cookies: List[Dict[str, Any]]) -> None:
+        conteudo = json.dumps({"salvoEm": time.time(), "cookies": cookies}, ensure_ascii=True)
+        # Cookies de SSO valem como credencial: cifrados com a DPAPI no Windows, onde o modo 0600 nao vale.
+        protegido = proteger(conteudo.encode("utf-8"))
+        arquivo = self._arquivo(chave)
+        temporario = arquivo.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with self._trava:
+            # Fora do Windows o arquivo nasce legivel so pelo dono.
+            descritor = os.open(str(temporario), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(descritor, "wb") as destino:
+                destino.write(protegido)
+            os.replace(temporario, arquivo)
+
+    def descartar(self, chave: str) -> None:
+        try:
+            self._arquivo(chave).unlink()
+        except OSError:
+            pass
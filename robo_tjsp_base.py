@@ -1,16 +1,51 @@
+import abc
+import asyncio
+import atexit
 import base64
+import hashlib
 import json
 import os
 import random
 import re
 import subprocess
 import sys
+import threading
 import time
+import unicodedata
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 from urllib.parse import urlparse
 
+from robo_artefatos import (
+    NOME_PASTA_OBJETOS,
+    ArmazemConteudo,
+    execucao_gravacao,
+    gravador_artefatos,
+    gravar_arquivo_duravel,
+)
+from robo_cache_seletores import LIMITE_FALHAS_SEGUIDAS_PADRAO, CacheSeletores
+from robo_certificados import NOME_BANCO_CERTIFICADOS, CacheCertificados, hash_arquivo_pfx
+from robo_driver_cdp import POR_CSS, POR_XPATH, DriverCdp, localizar_executavel_navegador
+from robo_memoria import memoria_arvore_processos_mb
+from robo_relatorios import NOME_BANCO_RELATORIOS, ArmazemRelatorios
+from robo_retomada import (
+    NOME_PASTA_RETOMADAS,
+    VALIDADE_RETOMADA_MINUTOS_PADRAO,
+    PontosRetomada,
+    etapa_alcancada,
+)
+from robo_sessoes import (
+    NOME_PASTA_SESSOES,
+    VALIDADE_SESSAO_HORAS_PADRAO,
+    CofreSessoes,
+    cookie_do_dominio,
+    cookie_para_restaurar,
+)
+from robo_cdp import ConexaoCdp, endereco_debugger, url_websocket_pagina
+
 
 CANAIS_VALIDOS = {"eproc", "esaj"}
 MODOS_VALIDOS = {"simulado", "real", "real_assistido"}
@@ -18,9 +53,59 @@ BROWSERS_VALIDOS = {"edge", "chrome", "auto"}
 
 TIMEOUT_LOGIN_PADRAO_SEGUNDOS = 240
 TIMEOUT_ETAPA_PADRAO_SEGUNDOS = 60
+INTERVALO_ESPERA_CONDICAO_SEGUNDOS = 0.25
+INTERVALO_LOGIN_INICIAL_SEGUNDOS = 0.2
+INTERVALO_LOGIN_MAXIMO_SEGUNDOS = 1.0
+FRACAO_TIMEOUT_ETAPA_POR_ESPERA = {
+    "pos_login": 1.0,
+    "formulario_upload": 0.25,
+    "pos_protocolo": 0.5,
+    "comprovante": 0.25,
+}
+POLITICAS_SCREENSHOT_VALIDAS = {"sempre", "falha", "amostrado"}
+SCREENSHOTS_BUFFER_PADRAO = 3
+SCREENSHOTS_AMOSTRA_PADRAO = 0.1
+TAMANHO_BLOCO_PDF_BYTES = 512 * 1024
+POOL_SESSOES_OCIOSIDADE_PADRAO_SEGUNDOS = 900
+POOL_SESSOES_MAX_POR_CHAVE_PADRAO = 2
+RECICLAR_NAVEGADOR_APOS_PETICOES_PADRAO = 50
+LIMITE_MEMORIA_NAVEGADOR_PADRAO_MB = 1500
 AUTO_SELECT_CERT_ARG = (
     '--auto-select-certificate-for-urls=[{"pattern":"https://*.tjsp.jus.br","filter":{}}]'
 )
+ARGUMENTOS_PERFIL_ENXUTO = [
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-extensions",
+    "--disable-sync",
+    "--no-first-run",
+    "--mute-audio",
+]
+BLOQUEIOS_URL_PADRAO = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*hotjar.com*",
+    "*clarity.ms*",
+    "*fonts.googleapis.com*",
+    "*fonts.gstatic.com*",
+    "*tawk.to*",
+    "*zendesk.com*",
+    "*jivosite.com*",
+]
+# Bloqueio por tipo de recurso, pelo proprio motor de renderizacao: "logo.png.aspx" ou um
+# "?formato=.png" nao escapam nem sao bloqueados por engano, como num padrao de URL.
+ARGUMENTOS_BLOQUEIO_POR_TIPO = {
+    "Image": "--blink-settings=imagesEnabled=false",
+    "Font": "--disable-remote-fonts",
+}
+TIPOS_BLOQUEADOS_PADRAO = ["Font"]
+PERFIS_ENXUTOS_POR_HOST = {
+    "tjsp.jus.br": {"bloquear": [], "tipos": ["Font", "Image"]},
+    "trf3.jus.br": {"bloquear": [], "tipos": ["Font", "Image"]},
+    "trt2.jus.br": {"bloquear": [], "tipos": ["Font", "Image"]},
+}
 PROTOCOLO_REGEXES = [
     r"protocolo(?:\s*(?:n[ou]|n[ou]mero|no|n\.?|:|#|º|°)*)\s*([A-Za-z0-9./-]{6,50})",
     r"n[ou]mero\s+do\s+protocolo\s*[:#-]?\s*([A-Za-z0-9./-]{6,50})",
@@ -43,6 +128,65 @@ SELETORES_DESCRICAO_PADRAO = [
 SELETORES_UPLOAD_PADRAO = [
     "input[type='file']",
 ]
+PAPEIS_CACHE_SELETORES = [
+    "numeroProcesso",
+    "descricao",
+    "upload",
+    "botaoAuxiliar",
+    "botaoProtocolo",
+    "botaoComprovante",
+]
+PAPEIS_CAMPO_HABILITADO = {"numeroProcesso": True, "descricao": True, "upload": False}
+SCRIPT_RESOLVER_CAMPOS = """
+var perfil = arguments[0] || {};
+var exigirHabilitado = arguments[1] || {};
+var saida = {};
+Object.keys(perfil).forEach(function (papel) {
+  saida[papel] = null;
+  var seletores = perfil[papel] || [];
+  for (var i = 0; i < seletores.length && !saida[papel]; i++) {
+    var nos;
+    try { nos = document.querySelectorAll(seletores[i]); } catch (e) { continue; }
+    for (var j = 0; j < nos.length; j++) {
+      if (exigirHabilitado[papel] && nos[j].disabled) { continue; }
+      saida[papel] = {elemento: nos[j], seletor: seletores[i]};
+      break;
+    }
+  }
+});
+return saida;
+"""
+SCRIPT_ESCOLHER_BOTAO = """
+var niveis = arguments[0] || [];
+var excluir = arguments[1] || [];
+function normalizar(texto) {
+  return String(texto || "").normalize("NFD").replace(/[\\u0300-\\u036f]/g, "").toLowerCase().trim();
+}
+var candidatos = document.querySelectorAll(
+  "button, a[role='button'], input[type='submit'], input[type='button']"
+);
+var melhor = null;
+for (var i = 0; i < candidatos.length; i++) {
+  var el = candidatos[i];
+  if (el.disabled || el.getClientRects().length === 0) { continue; }
+  var texto = normalizar(el.innerText || el.value);
+  if (!texto) { continue; }
+  if (excluir.some(function (p) { return texto.indexOf(p) !== -1; })) { continue; }
+  for (var n = 0; n < niveis.length; n++) {
+    if (melhor && n > melhor.nivel) { break; }
+    var posicao = -1;
+    for (var k = 0; k < niveis[n].length; k++) {
+      if (texto.indexOf(niveis[n][k]) !== -1) { posicao = k; break; }
+    }
+    if (posicao === -1) { continue; }
+    if (!melhor || n < melhor.nivel || (n === melhor.nivel && posicao < melhor.posicao)) {
+      melhor = {elemento: el, texto: texto, nivel: n, posicao: posicao};
+    }
+    break;
+  }
+}
+return melhor;
+"""
 SELETORES_POR_MODULO = {
     "petpg": {
         "numeroProcesso": [
@@ -130,6 +274,11 @@ def texto_limpo(valor: Any) -> str:
     return str(valor or "").strip()
 
 
+def normalizar_rotulo(valor: Any) -> str:
+    decomposto = unicodedata.normalize("NFD", texto_limpo(valor))
+    return "".join(ch for ch in decomposto if not unicodedata.combining(ch)).lower()
+
+
 def agora_iso_utc() -> str:
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
@@ -230,7 +379,11 @@ def unir_listas_ordenadas(*listas: List[str]) -> List[str]:
     return saida
 
 
-def perfil_seletores_fluxo(acesso: Dict[str, str], fluxo_tjsp: Dict[str, Any]) -> Dict[str, List[str]]:
+def perfil_seletores_fluxo(
+    acesso: Dict[str, str],
+    fluxo_tjsp: Dict[str, Any],
+    preferidos: Optional[Dict[str, List[str]]] = None,
+) -> Dict[str, List[str]]:
     modulo = texto_limpo(fluxo_tjsp.get("modulo")).lower()
     canal = texto_limpo(acesso.get("canal")).lower()
 
@@ -238,22 +391,62 @@ def perfil_seletores_fluxo(acesso: Dict[str, str], fluxo_tjsp: Dict[str, Any]) -
         modulo = "eproc"
 
     perfil_modulo = SELETORES_POR_MODULO.get(modulo, {})
+    preferidos = preferidos or {}
     return {
         "numeroProcesso": unir_listas_ordenadas(
+            preferidos.get("numeroProcesso", []),
             perfil_modulo.get("numeroProcesso", []),
             SELETORES_NUMERO_PROCESSO_PADRAO,
         ),
         "descricao": unir_listas_ordenadas(
+            preferidos.get("descricao", []),
             perfil_modulo.get("descricao", []),
             SELETORES_DESCRICAO_PADRAO,
         ),
         "upload": unir_listas_ordenadas(
+            preferidos.get("upload", []),
             perfil_modulo.get("upload", []),
             SELETORES_UPLOAD_PADRAO,
         ),
     }
 
 
+_CACHES_SELETORES: Dict[str, CacheSeletores] = {}
+_TRAVA_CACHE_SELETORES = threading.Lock()
+
+
+def cache_seletores() -> Optional[CacheSeletores]:
+    if not bool_padrao(os.environ.get("PETICIONADOR_CACHE_SELETORES", "1"), True):
+        return None
+    arquivo = pasta_automacao() / "seletores_aprendidos.json"
+    with _TRAVA_CACHE_SELETORES:
+        cache = _CACHES_SELETORES.get(str(arquivo))
+        if cache is None:
+            cache = CacheSeletores(
+                arquivo,
+                inteiro_env("PETICIONADOR_CACHE_SELETORES_FALHAS", LIMITE_FALHAS_SEGUIDAS_PADRAO),
+            )
+            _CACHES_SELETORES[str(arquivo)] = cache
+        return cache
+
+
+def chave_cache_fluxo(acesso: Dict[str, str], fluxo_tjsp: Dict[str, Any], papel: str) -> str:
+    url = texto_limpo(acesso.get("portalUrl") or acesso.get("serviceUrl") or acesso.get("entradaUrl"))
+    modulo = texto_limpo(fluxo_tjsp.get("modulo")).lower() or texto_limpo(acesso.get("canal")).lower()
+    return CacheSeletores.chave(texto_limpo(urlparse(url).hostname), modulo, papel)
+
+
+def aprender_resultado(
+    cache: Optional[CacheSeletores],
+    chave: str,
+    preferidos: List[str],
+    vencedor: str,
+) -> None:
+    if cache is None:
+        return
+    cache.registrar_uso(chave, preferidos, vencedor)
+
+
 def executar_powershell(script: str, *args: str, timeout: int = 90) -> subprocess.CompletedProcess:
     comando = ["powershell", "-NoProfile", "-NonInteractive", "-Command", script, *args]
     return subprocess.run(
@@ -313,25 +506,347 @@ def remover_certificado_windows(thumbprint: str) -> None:
     executar_powershell(script, thumb, timeout=60)
 
 
-def criar_driver_selenium(headless: bool) -> Tuple[Any, str]:
+def certificado_presente_windows(thumbprint: str) -> bool:
+    # Consulta direta ao CurrentUser\My pela crypt32, sem abrir um processo PowerShell.
+    if os.name != "nt":
+        return False
     try:
-        from selenium import webdriver
-        from selenium.webdriver.chrome.options import Options as ChromeOptions
-        from selenium.webdriver.edge.options import Options as EdgeOptions
+        hash_sha1 = bytes.fromhex(texto_limpo(thumbprint).replace(" ", ""))
+    except ValueError:
+        return False
+    if len(hash_sha1) != 20:
+        return False
+
+    import ctypes
+    from ctypes import wintypes
+
+    class BlobHash(ctypes.Structure):
+        _fields_ = [("cbData", wintypes.DWORD), ("pbData", ctypes.c_void_p)]
+
+    crypt32 = ctypes.WinDLL("crypt32")
+    crypt32.CertOpenSystemStoreW.restype = ctypes.c_void_p
+    crypt32.CertOpenSystemStoreW.argtypes = [ctypes.c_void_p, wintypes.LPCWSTR]
+    crypt32.CertFindCertificateInStore.restype = ctypes.c_void_p
+    crypt32.CertFindCertificateInStore.argtypes = [
+        ctypes.c_void_p,
+        wintypes.DWORD,
+        wintypes.DWORD,
+        wintypes.DWORD,
+        ctypes.c_void_p,
+        ctypes.c_void_p,
+    ]
+    crypt32.CertFreeCertificateContext.argtypes = [ctypes.c_void_p]
+    crypt32.CertCloseStore.argtypes = [ctypes.c_void_p, wintypes.DWORD]
+
+    repositorio = crypt32.CertOpenSystemStoreW(None, "MY")
+    if not repositorio:
+        return False
+    try:
+        buffer = ctypes.create_string_buffer(hash_sha1, len(hash_sha1))
+        blob = BlobHash(len(hash_sha1), ctypes.cast(buffer, ctypes.c_void_p))
+        # X509_ASN_ENCODING | PKCS_7_ASN_ENCODING, CERT_FIND_SHA1_HASH.
+        contexto = crypt32.CertFindCertificateInStore(
+            repositorio, 0x00010001, 0, 0x00010000, ctypes.byref(blob), None
+        )
+        if not contexto:
+            return False
+        crypt32.CertFreeCertificateContext(contexto)
+        return True
+    finally:
+        crypt32.CertCloseStore(repositorio, 0)
+
+
+class RepositorioCertificados(abc.ABC):
+    nome = ""
+
+    @abc.abstractmethod
+    def importar(self, caminho_arquivo: str, senha: str) -> Dict[str, Any]:
+        ...
+
+    @abc.abstractmethod
+    def presente(self, thumbprint: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def remover(self, thumbprint: str) -> None:
+        # Respeita PETICIONADOR_REMOVER_CERT_A1, como o CurrentUser\My do Windows.
+        ...
+
+
+class RepositorioCertificadosWindows(RepositorioCertificados):
+    nome = "windows"
+
+    def importar(self, caminho_arquivo: str, senha: str) -> Dict[str, Any]:
+        return importar_certificado_a1_windows(caminho_arquivo, senha)
+
+    def presente(self, thumbprint: str) -> bool:
+        return certificado_presente_windows(thumbprint)
+
+    def remover(self, thumbprint: str) -> None:
+        remover_certificado_windows(thumbprint)
+
+
+class RepositorioCertificadosMemoria(RepositorioCertificados):
+    nome = "memoria"
+
+    def __init__(self, atraso_segundos: float = 0.0) -> None:
+        self.atraso_segundos = atraso_segundos
+        self.certificados: Dict[str, str] = {}
+        self.importacoes = 0
+        self._trava = threading.Lock()
+
+    def importar(self, caminho_arquivo: str, senha: str) -> Dict[str, Any]:
+        if self.atraso_segundos > 0:
+            time.sleep(self.atraso_segundos)
+        thumbprint = hashlib.sha1(Path(caminho_arquivo).read_bytes()).hexdigest().upper()
+        with self._trava:
+            self.certificados[thumbprint] = caminho_arquivo
+            self.importacoes += 1
+        return {
+            "importado": True,
+            "thumbprint": thumbprint,
+            "mensagem": "Certificado A1 registrado no repositorio em memoria.",
+        }
+
+    def presente(self, thumbprint: str) -> bool:
+        with self._trava:
+            return texto_limpo(thumbprint).upper() in self.certificados
+
+    def remover(self, thumbprint: str) -> None:
+        if not remover_certificado_sem_uso():
+            return
+        with self._trava:
+            self.certificados.pop(texto_limpo(thumbprint).upper(), None)
+
+
+_REPOSITORIOS_CERTIFICADOS: Dict[str, RepositorioCertificados] = {}
+_TRAVA_REPOSITORIOS_CERTIFICADOS = threading.Lock()
+
+
+def repositorio_certificados() -> RepositorioCertificados:
+    nome = texto_limpo(os.environ.get("PETICIONADOR_REPOSITORIO_CERTIFICADOS", "windows")).lower()
+    with _TRAVA_REPOSITORIOS_CERTIFICADOS:
+        repositorio = _REPOSITORIOS_CERTIFICADOS.get(nome)
+        if repositorio is None:
+            if nome == "memoria":
+                atraso_ms = inteiro_env("PETICIONADOR_REPOSITORIO_CERTIFICADOS_ATRASO_MS", 0)
+                repositorio = RepositorioCertificadosMemoria(atraso_ms / 1000)
+            else:
+                repositorio = RepositorioCertificadosWindows()
+            _REPOSITORIOS_CERTIFICADOS[nome] = repositorio
+        return repositorio
+
+
+_CACHES_CERTIFICADOS: Dict[str, CacheCertificados] = {}
+_TRAVA_CACHES_CERTIFICADOS = threading.Lock()
+
+
+def cache_certificados() -> Optional[CacheCertificados]:
+    if not bool_padrao(os.environ.get("PETICIONADOR_CACHE_CERTIFICADOS", "1"), True):
+        return None
+    arquivo = pasta_automacao() / NOME_BANCO_CERTIFICADOS
+    with _TRAVA_CACHES_CERTIFICADOS:
+        cache = _CACHES_CERTIFICADOS.get(str(arquivo))
+        if cache is None:
+            cache = CacheCertificados(arquivo)
+            _CACHES_CERTIFICADOS[str(arquivo)] = cache
+        return cache
+
+
+# Um executor para o processo todo: importacoes de robos simultaneos nao abrem uma thread nova cada.
+IMPORTACOES_CERTIFICADO_SIMULTANEAS = 4
+_EXECUTOR_IMPORTACAO_CERTIFICADO: Optional[ThreadPoolExecutor] = None
+_TRAVA_EXECUTOR_IMPORTACAO_CERTIFICADO = threading.Lock()
+
+
+def executor_importacao_certificado() -> ThreadPoolExecutor:
+    global _EXECUTOR_IMPORTACAO_CERTIFICADO
+    with _TRAVA_EXECUTOR_IMPORTACAO_CERTIFICADO:
+        if _EXECUTOR_IMPORTACAO_CERTIFICADO is None:
+            _EXECUTOR_IMPORTACAO_CERTIFICADO = ThreadPoolExecutor(
+                max_workers=IMPORTACOES_CERTIFICADO_SIMULTANEAS,
+                thread_name_prefix="importacao-certificado",
+            )
+        return _EXECUTOR_IMPORTACAO_CERTIFICADO
+
+
+def remover_certificado_sem_uso() -> bool:
+    return bool_padrao(os.environ.get("PETICIONADOR_REMOVER_CERT_A1", "0"), False)
+
+
+def iniciar_importacao_certificado(
+    repositorio: RepositorioCertificados,
+    certificado: Dict[str, str],
+    cache: Optional[CacheCertificados] = None,
+) -> Future:
+    def importar() -> Dict[str, Any]:
+        inicio = time.perf_counter()
+        arquivo = texto_limpo(certificado.get("arquivo"))
+        senha = texto_limpo(certificado.get("senha"))
+        if cache is not None:
+            resultado = cache.adquirir(repositorio, arquivo, senha)
+        else:
+            resultado = repositorio.importar(arquivo, senha)
+        return {**resultado, "duracaoMs": round((time.perf_counter() - inicio) * 1000, 1)}
+
+    return executor_importacao_certificado().submit(importar)
+
+
+def resultado_importacao_certificado(futuro: Future) -> Dict[str, Any]:
+    # Para a liberacao no finally: a falha da importacao volta como "erro", sem mascarar a falha do fluxo.
+    try:
+        return futuro.result()
     except Exception as error:
-        raise RuntimeError(
-            "Selenium nao disponivel no Python atual. Instale: pip install selenium."
-        ) from error
+        return {"importado": False, "thumbprint": "", "erro": texto_limpo(error) or type(error).__name__}
 
-    erros: List[str] = []
+
+def liberar_certificado(
+    repositorio: RepositorioCertificados,
+    cache: Optional[CacheCertificados],
+    importacao: Dict[str, Any],
+) -> None:
+    if cache is not None and importacao.get("uso"):
+        # So o ultimo robo que usa o certificado o remove (quando a remocao esta habilitada).
+        cache.liberar(repositorio, int(importacao["uso"]), remover_certificado_sem_uso())
+        return
+    thumbprint = texto_limpo(importacao.get("thumbprint"))
+    if thumbprint:
+        repositorio.remover(thumbprint)
+
+
+def preaquecer_dns(driver: Any, urls: List[str]) -> None:
+    # So DNS: um preconnect TLS antes do certificado importado poderia fixar "sem certificado" no host.
+    origens = unir_listas_ordenadas(
+        [f"{urlparse(url).scheme}://{urlparse(url).netloc}" for url in urls if urlparse(url).netloc]
+    )
+    if not origens:
+        return
+    try:
+        driver.execute_script(
+            "arguments[0].forEach(function (origem) {"
+            "  var link = document.createElement('link');"
+            "  link.rel = 'dns-prefetch'; link.href = origem;"
+            "  (document.head || document.documentElement).appendChild(link);"
+            "});",
+            origens,
+        )
+    except Exception:
+        pass
+
+
+def comprovante_por_rede_ativo() -> bool:
+    # Opt-in: o log de performance registra toda a rede da sessao, nao so o download do comprovante.
+    return bool_padrao(os.environ.get("PETICIONADOR_COMPROVANTE_REDE", "0"), False)
+
+
+def perfil_enxuto_ativo() -> bool:
+    # Opt-in: imagens e fontes bloqueadas mudam o que o portal mostra (e o que as capturas registram).
+    return bool_padrao(os.environ.get("PETICIONADOR_PERFIL_ENXUTO", "0"), False)
+
+
+def perfil_enxuto_host(acesso: Dict[str, str]) -> Dict[str, Any]:
+    host = texto_limpo(urlparse(texto_limpo(acesso.get("entradaUrl"))).hostname).lower()
+    for sufixo, candidato in PERFIS_ENXUTOS_POR_HOST.items():
+        if host == sufixo or host.endswith(f".{sufixo}"):
+            return candidato
+    return {}
+
+
+def tipos_bloqueio_perfil(acesso: Dict[str, str]) -> List[str]:
+    tipos = perfil_enxuto_host(acesso).get("tipos", TIPOS_BLOQUEADOS_PADRAO)
+    return [tipo for tipo in tipos if tipo in ARGUMENTOS_BLOQUEIO_POR_TIPO]
+
+
+def argumentos_perfil_enxuto(acesso: Dict[str, str]) -> List[str]:
+    # O pool de navegadores e por host, entao os argumentos de abertura podem depender do host.
+    return ARGUMENTOS_PERFIL_ENXUTO + [ARGUMENTOS_BLOQUEIO_POR_TIPO[tipo] for tipo in tipos_bloqueio_perfil(acesso)]
+
+
+def padroes_bloqueio_url(acesso: Dict[str, str]) -> List[str]:
+    extras = texto_limpo(os.environ.get("PETICIONADOR_BLOQUEAR_URLS")).split(",")
+    return unir_listas_ordenadas(BLOQUEIOS_URL_PADRAO, perfil_enxuto_host(acesso).get("bloquear", []), extras)
+
+
+def aplicar_bloqueios_url(driver: Any, padroes: List[str]) -> bool:
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": padroes})
+        return True
+    except Exception:
+        return False
+
+
+def ordem_navegadores() -> List[str]:
     preferido = normalizar_browser_preferido()
     ordem = ["edge", "chrome"] if preferido == "auto" else [preferido]
     if preferido == "edge":
         ordem.append("chrome")
     elif preferido == "chrome":
         ordem.append("edge")
+    return ordem
 
+
+def driver_cdp_ativo() -> bool:
+    # Experimental ate rodar contra o Chrome/Edge dos escritorios: so com as duas variaveis.
+    if texto_limpo(os.environ.get("PETICIONADOR_DRIVER", "selenium")).lower() != "cdp":
+        return False
+    return bool_padrao(os.environ.get("PETICIONADOR_DRIVER_CDP_EXPERIMENTAL", "0"), False)
+
+
+def criar_driver_cdp(headless: bool, enxuto: Optional[List[str]] = None) -> Tuple[Any, str]:
+    argumentos = ["--disable-gpu", "--window-size=1600,1100", "--disable-dev-shm-usage", AUTO_SELECT_CERT_ARG]
+    if headless:
+        argumentos.append("--headless=new")
+    argumentos.extend(enxuto or [])
+
+    executavel_fixo = texto_limpo(os.environ.get("PETICIONADOR_NAVEGADOR_EXECUTAVEL"))
+    if executavel_fixo:
+        ordem = ["edge" if "edge" in os.path.basename(executavel_fixo).lower() else "chrome"]
+    else:
+        ordem = ordem_navegadores()
+
+    erros: List[str] = []
     for browser in ordem:
+        executavel = executavel_fixo or localizar_executavel_navegador(browser)
+        if not executavel:
+            erros.append(f"{browser}: executavel nao encontrado")
+            continue
+        try:
+            driver = DriverCdp.iniciar(
+                executavel,
+                argumentos,
+                browser,
+                registrar_rede=bool(enxuto) or comprovante_por_rede_ativo(),
+            )
+            return driver, browser
+        except Exception as error:
+            erros.append(f"{browser}: {error}")
+
+    raise RuntimeError(
+        "Nao foi possivel inicializar navegador pelo DevTools (Edge/Chrome). "
+        f"Detalhes: {' | '.join(erros)}"
+    )
+
+
+def criar_driver_selenium(headless: bool, enxuto: Optional[List[str]] = None) -> Tuple[Any, str]:
+    erros: List[str] = []
+    if driver_cdp_ativo():
+        try:
+            return criar_driver_cdp(headless, enxuto)
+        except Exception as error:
+            erros.append(f"cdp: {error}")
+
+    try:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options as ChromeOptions
+        from selenium.webdriver.edge.options import Options as EdgeOptions
+    except Exception as error:
+        raise RuntimeError(
+            "Selenium nao disponivel no Python atual. Instale: pip install selenium."
+            + (f" Detalhes: {' | '.join(erros)}" if erros else "")
+        ) from error
+
+    for browser in ordem_navegadores():
         if browser == "edge":
             try:
                 edge_opts = EdgeOptions()
@@ -341,6 +856,10 @@ def criar_driver_selenium(headless: bool) -> Tuple[Any, str]:
                 edge_opts.add_argument(AUTO_SELECT_CERT_ARG)
                 if headless:
                     edge_opts.add_argument("--headless=new")
+                for argumento in enxuto or []:
+                    edge_opts.add_argument(argumento)
+                if enxuto or comprovante_por_rede_ativo():
+                    edge_opts.set_capability("ms:loggingPrefs", {"performance": "ALL"})
                 driver = webdriver.Edge(options=edge_opts)
                 return driver, "edge"
             except Exception as error:
@@ -356,6 +875,10 @@ def criar_driver_selenium(headless: bool) -> Tuple[Any, str]:
                 chrome_opts.add_argument(AUTO_SELECT_CERT_ARG)
                 if headless:
                     chrome_opts.add_argument("--headless=new")
+                for argumento in enxuto or []:
+                    chrome_opts.add_argument(argumento)
+                if enxuto or comprovante_por_rede_ativo():
+                    chrome_opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
                 driver = webdriver.Chrome(options=chrome_opts)
                 return driver, "chrome"
             except Exception as error:
@@ -368,160 +891,955 @@ def criar_driver_selenium(headless: bool) -> Tuple[Any, str]:
     )
 
 
-def login_concluido(url_atual: str, acesso: Dict[str, str]) -> bool:
-    atual = texto_limpo(url_atual)
-    if not atual:
-        return False
+def anexar_driver_selenium(navegador: str, endereco: str, enxuto: Optional[List[str]] = None) -> Any:
+    if driver_cdp_ativo():
+        return DriverCdp.anexar(endereco, navegador, registrar_rede=bool(enxuto) or comprovante_por_rede_ativo())
+    try:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options as ChromeOptions
+        from selenium.webdriver.edge.options import Options as EdgeOptions
+    except Exception as error:
+        raise RuntimeError(
+            "Selenium nao disponivel no Python atual. Instale: pip install selenium."
+        ) from error
 
-    parsed = urlparse(atual)
-    host = texto_limpo(parsed.hostname).lower()
-    path = texto_limpo(parsed.path).lower()
-    canal = acesso.get("canal")
+    opcoes = EdgeOptions() if navegador == "edge" else ChromeOptions()
+    opcoes.debugger_address = endereco
+    if enxuto or comprovante_por_rede_ativo():
+        chave_log = "ms:loggingPrefs" if navegador == "edge" else "goog:loggingPrefs"
+        opcoes.set_capability(chave_log, {"performance": "ALL"})
+    if navegador == "edge":
+        return webdriver.Edge(options=opcoes)
+    return webdriver.Chrome(options=opcoes)
 
-    if canal == "esaj":
-        return "/sajcas/login" not in path
-    return host != "sso.tjsp.jus.br"
 
+def fechar_driver(driver: Any) -> None:
+    try:
+        driver.quit()
+    except Exception:
+        pass
 
-def aguardar_login(driver: Any, acesso: Dict[str, str], timeout_segundos: int) -> str:
-    limite = time.time() + timeout_segundos
-    ultimo_url = ""
-    while time.time() < limite:
-        try:
-            ultimo_url = texto_limpo(driver.current_url)
-        except Exception:
-            ultimo_url = ""
-        if login_concluido(ultimo_url, acesso):
-            return ultimo_url
-        time.sleep(1)
 
-    raise RuntimeError(
-        "Timeout aguardando conclusao do login com certificado digital no portal."
-    )
+SESSOES_NAVEGADOR: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+# Sessao de uma tentativa que falhou antes do protocolo, guardada para a proxima tentativa do mesmo protocolo.
+SESSOES_RETOMADA: Dict[str, Dict[str, Any]] = {}
+_TRAVA_SESSOES = threading.Lock()
 
 
-def tentar_preencher_texto(driver: Any, seletores: List[str], valor: str) -> bool:
-    if not valor:
-        return False
+def pool_sessoes_ativo() -> bool:
+    return bool_padrao(os.environ.get("PETICIONADOR_POOL_SESSOES", "0"), False)
 
-    try:
-        from selenium.webdriver.common.by import By
-    except Exception:
-        return False
 
-    for seletor in seletores:
-        elementos = driver.find_elements(By.CSS_SELECTOR, seletor)
-        for elemento in elementos:
-            try:
-                if not elemento.is_enabled():
-                    continue
-                elemento.clear()
-                elemento.send_keys(valor)
-                return True
-            except Exception:
-                continue
-    return False
+def chave_sessao_navegador(acesso: Dict[str, str], certificado: Dict[str, str]) -> Tuple[str, str, str]:
+    host = texto_limpo(urlparse(texto_limpo(acesso.get("entradaUrl"))).hostname).lower()
+    arquivo_cert = texto_limpo(certificado.get("arquivo"))
+    if arquivo_cert:
+        arquivo_cert = os.path.normcase(os.path.abspath(arquivo_cert))
+    return (texto_limpo(acesso.get("canal")).lower(), host, arquivo_cert)
 
 
-def _texto_botao(elemento: Any) -> str:
+def sessao_navegador_saudavel(sessao: Dict[str, Any], acesso: Dict[str, str]) -> bool:
+    ociosidade = inteiro_env(
+        "PETICIONADOR_POOL_SESSOES_OCIOSIDADE_SEGUNDOS",
+        POOL_SESSOES_OCIOSIDADE_PADRAO_SEGUNDOS,
+    )
+    if time.time() - sessao.get("ultimoUso", 0) > ociosidade:
+        return False
     try:
-        return texto_limpo(elemento.text or elemento.get_attribute("value")).lower()
+        return login_concluido(texto_limpo(sessao["driver"].current_url), acesso)
     except Exception:
-        return ""
+        return False
 
 
-def _elementos_clicaveis(driver: Any) -> List[Any]:
-    try:
-        from selenium.webdriver.common.by import By
-    except Exception:
-        return []
+def obter_sessao_navegador(chave: Tuple[str, str, str], acesso: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    if not pool_sessoes_ativo():
+        return None
+    while True:
+        with _TRAVA_SESSOES:
+            livres = SESSOES_NAVEGADOR.get(chave) or []
+            if not livres:
+                return None
+            sessao = livres.pop()
+        if sessao_navegador_saudavel(sessao, acesso):
+            return sessao
+        fechar_driver(sessao["driver"])
+
+
+def limpar_abas_sessao(driver: Any) -> bool:
     try:
-        return driver.find_elements(
-            By.XPATH, "//button | //a[@role='button'] | //input[@type='submit' or @type='button']"
-        )
+        abas = list(driver.window_handles)
+        for aba in abas[1:]:
+            driver.switch_to.window(aba)
+            driver.close()
+        driver.switch_to.window(abas[0])
+        return True
     except Exception:
-        return []
+        return False
 
 
-def clicar_botao_por_texto(
-    driver: Any,
-    palavras_incluir: List[str],
-    palavras_excluir: List[str],
-) -> Tuple[bool, str]:
-    for elemento in _elementos_clicaveis(driver):
-        try:
-            if not elemento.is_enabled():
-                continue
-            texto = _texto_botao(elemento)
-            if not texto:
-                continue
-            if palavras_excluir and any(p in texto for p in palavras_excluir):
-                continue
-            if any(p in texto for p in palavras_incluir):
-                elemento.click()
-                return True, texto
-        except Exception:
-            continue
-    return False, ""
+def devolver_sessao_navegador(chave: Tuple[str, str, str], sessao: Dict[str, Any]) -> None:
+    driver = sessao["driver"]
+    if sessao.get("reciclar") or not pool_sessoes_ativo() or not limpar_abas_sessao(driver):
+        fechar_driver(driver)
+        return
 
+    sessao["ultimoUso"] = time.time()
+    sessao["usos"] = int(sessao.get("usos", 0)) + 1
+    limite = max(1, inteiro_env("PETICIONADOR_POOL_SESSOES_MAX", POOL_SESSOES_MAX_POR_CHAVE_PADRAO))
+    with _TRAVA_SESSOES:
+        livres = SESSOES_NAVEGADOR.setdefault(chave, [])
+        if len(livres) < limite:
+            livres.append(sessao)
+            return
+    fechar_driver(driver)
 
-def preparar_formulario_para_upload(driver: Any, fluxo_tjsp: Dict[str, Any]) -> Tuple[bool, str]:
-    tipo_fluxo = texto_limpo(fluxo_tjsp.get("tipo")).lower()
-    prioridade = [
-        ["incluir documento", "adicionar documento", "juntar documento"],
-        ["incluir arquivo", "adicionar arquivo", "anexar arquivo"],
-        ["incluir peticao", "adicionar peticao", "anexar peticao"],
-        ["adicionar", "anexar", "incluir"],
-    ]
-    if tipo_fluxo == "intermediaria":
-        prioridade.insert(0, ["peticao intermediaria", "intermediaria"])
-    if tipo_fluxo == "inicial":
-        prioridade.insert(0, ["peticao inicial", "inicial"])
 
-    for palavras in prioridade:
-        clicou, texto = clicar_botao_por_texto(
-            driver,
-            palavras_incluir=palavras,
-            palavras_excluir=["cancelar", "voltar", "sair", "excluir", "remover"],
-        )
-        if clicou:
-            time.sleep(1)
-            return True, texto
-    return False, ""
+def validade_retomada_segundos() -> int:
+    return inteiro_env("PETICIONADOR_RETOMADA_VALIDADE_MINUTOS", VALIDADE_RETOMADA_MINUTOS_PADRAO) * 60
 
 
-def anexar_arquivo(driver: Any, caminho_arquivo: str, seletores_upload: List[str]) -> bool:
-    try:
-        from selenium.webdriver.common.by import By
-    except Exception:
+def reter_sessao_retomada(protocolo: str, chave: Tuple[str, str, str], sessao: Dict[str, Any]) -> bool:
+    # So um processo longo (pool ativo) vive ate a proxima tentativa do mesmo protocolo.
+    if not pool_sessoes_ativo() or sessao.get("reciclar") or not limpar_abas_sessao(sessao["driver"]):
         return False
+    with _TRAVA_SESSOES:
+        anterior = SESSOES_RETOMADA.pop(protocolo, None)
+        SESSOES_RETOMADA[protocolo] = {**sessao, "chave": chave, "retidaEm": time.time()}
+    if anterior is not None:
+        fechar_driver(anterior["driver"])
+    return True
 
-    destino = str(Path(caminho_arquivo).resolve())
-    for seletor in seletores_upload:
-        elementos = driver.find_elements(By.CSS_SELECTOR, seletor)
-        for elemento in elementos:
-            try:
-                elemento.send_keys(destino)
-                return True
-            except Exception:
-                try:
-                    driver.execute_script(
-                        "arguments[0].style.display='block';"
-                        "arguments[0].style.visibility='visible';"
-                        "arguments[0].removeAttribute('hidden');",
-                        elemento,
-                    )
-                    elemento.send_keys(destino)
-                    return True
-                except Exception:
-                    continue
-    return False
 
+def retomar_sessao_retida(
+    protocolo: str,
+    chave: Tuple[str, str, str],
+    acesso: Dict[str, str],
+) -> Optional[Dict[str, Any]]:
+    with _TRAVA_SESSOES:
+        sessao = SESSOES_RETOMADA.pop(protocolo, None)
+    if sessao is None:
+        return None
+    if (
+        sessao.get("chave") == chave
+        and time.time() - sessao.get("retidaEm", 0) <= validade_retomada_segundos()
+        and sessao_navegador_saudavel({**sessao, "ultimoUso": time.time()}, acesso)
+    ):
+        return sessao
+    fechar_driver(sessao["driver"])
+    return None
 
-def clicar_botao_protocolar(driver: Any, fluxo_tjsp: Dict[str, Any]) -> Tuple[bool, str]:
-    validos = [
-        "protocolar",
-        "peticionar",
+
+def encerrar_sessoes_navegador() -> None:
+    with _TRAVA_SESSOES:
+        sessoes = [sessao for livres in SESSOES_NAVEGADOR.values() for sessao in livres]
+        sessoes.extend(SESSOES_RETOMADA.values())
+        SESSOES_NAVEGADOR.clear()
+        SESSOES_RETOMADA.clear()
+    for sessao in sessoes:
+        fechar_driver(sessao["driver"])
+
+
+atexit.register(encerrar_sessoes_navegador)
+
+
+NAVEGADORES_COMPARTILHADOS: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+CONTEXTOS_POR_DRIVER: Dict[int, str] = {}
+_TRAVA_NAVEGADORES_COMPARTILHADOS = threading.Lock()
+
+
+def contextos_isolados_ativos() -> bool:
+    return bool_padrao(os.environ.get("PETICIONADOR_CONTEXTOS_ISOLADOS", "0"), False)
+
+
+def _reservar_navegador_compartilhado(
+    chave: Tuple[str, str, str],
+    headless: bool,
+    enxuto: List[str],
+) -> Dict[str, Any]:
+    # Abrir o navegador leva segundos: a trava global so protege o dicionario, para nao segurar as
+    # outras chaves. Quem chega primeiro publica uma entrada "abrindo"; os demais da mesma chave
+    # esperam por ela em vez de abrir um segundo navegador.
+    while True:
+        with _TRAVA_NAVEGADORES_COMPARTILHADOS:
+            compartilhado = NAVEGADORES_COMPARTILHADOS.get(chave)
+            abrir = compartilhado is None
+            if abrir:
+                compartilhado = {
+                    "chave": chave,
+                    "driver": None,
+                    "navegador": "",
+                    "endereco": "",
+                    "trava": threading.Lock(),
+                    "pronto": threading.Event(),
+                    "falhou": False,
+                    "contextos": 0,
+                    "usos": 0,
+                    "reciclar": False,
+                }
+                NAVEGADORES_COMPARTILHADOS[chave] = compartilhado
+            compartilhado["contextos"] += 1
+        if abrir:
+            return _abrir_navegador_compartilhado(compartilhado, headless, enxuto)
+        compartilhado["pronto"].wait()
+        if not compartilhado["falhou"]:
+            return compartilhado
+        # A abertura falhou em outra thread: a entrada ja saiu do dicionario, tenta de novo.
+        with _TRAVA_NAVEGADORES_COMPARTILHADOS:
+            compartilhado["contextos"] -= 1
+
+
+def _abrir_navegador_compartilhado(compartilhado: Dict[str, Any], headless: bool, enxuto: List[str]) -> Dict[str, Any]:
+    try:
+        driver, navegador = criar_driver_selenium(headless=headless, enxuto=enxuto)
+        endereco = endereco_debugger(driver)
+        if not endereco:
+            fechar_driver(driver)
+            raise RuntimeError("Navegador sem endereco DevTools: contextos isolados indisponiveis.")
+    except BaseException:
+        with _TRAVA_NAVEGADORES_COMPARTILHADOS:
+            compartilhado["falhou"] = True
+            if NAVEGADORES_COMPARTILHADOS.get(compartilhado["chave"]) is compartilhado:
+                NAVEGADORES_COMPARTILHADOS.pop(compartilhado["chave"], None)
+        compartilhado["pronto"].set()
+        raise
+    with _TRAVA_NAVEGADORES_COMPARTILHADOS:
+        compartilhado.update({"driver": driver, "navegador": navegador, "endereco": endereco})
+    compartilhado["pronto"].set()
+    return compartilhado
+
+
+def _liberar_navegador_compartilhado(
+    compartilhado: Dict[str, Any],
+    contexto: str,
+    reciclar: bool = False,
+    contar_uso: bool = False,
+) -> None:
+    with _TRAVA_NAVEGADORES_COMPARTILHADOS:
+        if contar_uso:
+            compartilhado["usos"] += 1
+        compartilhado["contextos"] = max(0, compartilhado["contextos"] - 1)
+        if reciclar:
+            # Novos contextos ja vao para outro navegador; este fecha quando o ultimo sair.
+            compartilhado["reciclar"] = True
+            if NAVEGADORES_COMPARTILHADOS.get(compartilhado["chave"]) is compartilhado:
+                NAVEGADORES_COMPARTILHADOS.pop(compartilhado["chave"], None)
+        fechar = compartilhado["reciclar"] and compartilhado["contextos"] == 0
+    if contexto and not fechar:
+        try:
+            with compartilhado["trava"]:
+                compartilhado["driver"].execute_cdp_cmd(
+                    "Target.disposeBrowserContext", {"browserContextId": contexto}
+                )
+        except Exception:
+            pass
+    if fechar:
+        fechar_driver(compartilhado["driver"])
+
+
+def abrir_contexto_isolado(chave: Tuple[str, str, str], headless: bool, enxuto: List[str]) -> Dict[str, Any]:
+    compartilhado = _reservar_navegador_compartilhado(chave, headless, enxuto)
+    principal = compartilhado["driver"]
+    contexto = ""
+    driver = None
+    try:
+        with compartilhado["trava"]:
+            contexto = texto_limpo(
+                principal.execute_cdp_cmd("Target.createBrowserContext", {"disposeOnDetach": False}).get(
+                    "browserContextId"
+                )
+            )
+            alvo = texto_limpo(
+                principal.execute_cdp_cmd(
+                    "Target.createTarget", {"url": "about:blank", "browserContextId": contexto}
+                ).get("targetId")
+            )
+        # Cada contexto ganha sua propria sessao WebDriver, anexada ao mesmo navegador.
+        driver = anexar_driver_selenium(compartilhado["navegador"], compartilhado["endereco"], enxuto)
+        driver.switch_to.window(alvo)
+    except Exception:
+        if driver is not None:
+            fechar_driver(driver)
+        _liberar_navegador_compartilhado(compartilhado, contexto, reciclar=not contexto)
+        raise
+
+    CONTEXTOS_POR_DRIVER[id(driver)] = contexto
+    return {
+        "driver": driver,
+        "navegador": compartilhado["navegador"],
+        "contexto": contexto,
+        "compartilhado": compartilhado,
+        "criadaEm": time.time(),
+        "usos": 0,
+    }
+
+
+def fechar_contexto_isolado(sessao: Dict[str, Any]) -> None:
+    driver = sessao["driver"]
+    CONTEXTOS_POR_DRIVER.pop(id(driver), None)
+    # Sessao anexada: quit encerra so o chromedriver/msedgedriver, o navegador segue vivo.
+    fechar_driver(driver)
+    _liberar_navegador_compartilhado(
+        sessao["compartilhado"], sessao["contexto"], bool(sessao.get("reciclar")), contar_uso=True
+    )
+
+
+def _pid_driver(driver: Any) -> int:
+    try:
+        return int(driver.service.process.pid)
+    except Exception:
+        return 0
+
+
+def amostrar_memoria_navegador(sessao: Dict[str, Any], etapa: str) -> Dict[str, Any]:
+    # Em contexto isolado o navegador pertence a sessao principal, nao ao driver anexado.
+    dono = sessao.get("compartilhado") or sessao
+    return {
+        "etapa": etapa,
+        "rssMb": memoria_arvore_processos_mb(_pid_driver(dono["driver"])),
+        "amostradoEm": agora_iso_utc(),
+    }
+
+
+def motivo_reciclagem_navegador(sessao: Dict[str, Any], rss_mb: Optional[float]) -> str:
+    dono = sessao.get("compartilhado") or sessao
+    limite_peticoes = inteiro_env(
+        "PETICIONADOR_RECICLAR_APOS_PETICOES",
+        RECICLAR_NAVEGADOR_APOS_PETICOES_PADRAO,
+    )
+    limite_mb = inteiro_env("PETICIONADOR_LIMITE_MEMORIA_NAVEGADOR_MB", LIMITE_MEMORIA_NAVEGADOR_PADRAO_MB)
+    if limite_peticoes > 0 and int(dono.get("usos", 0)) + 1 >= limite_peticoes:
+        return "peticoes"
+    if limite_mb > 0 and rss_mb is not None and rss_mb > limite_mb:
+        return "memoria"
+    return ""
+
+
+def encerrar_navegadores_compartilhados() -> None:
+    with _TRAVA_NAVEGADORES_COMPARTILHADOS:
+        compartilhados = list(NAVEGADORES_COMPARTILHADOS.values())
+        NAVEGADORES_COMPARTILHADOS.clear()
+    for compartilhado in compartilhados:
+        fechar_driver(compartilhado["driver"])
+
+
+atexit.register(encerrar_navegadores_compartilhados)
+
+
+def liberar_navegadores_ociosos(manter: int, preservar: Optional[Tuple[str, str, str]] = None) -> int:
+    # Fecha os navegadores parados (pool, retidos para retomada, compartilhados sem contexto), do uso
+    # mais antigo para o mais recente, ate sobrarem "manter". Uma sessao livre da chave "preservar"
+    # nao conta: a proxima peticao vai usa-la em vez de abrir outro navegador. Devolve quantos fechou.
+    with _TRAVA_SESSOES:
+        ociosos = [
+            (float(sessao.get("ultimoUso", 0)), "pool", chave, sessao)
+            for chave, livres in SESSOES_NAVEGADOR.items()
+            for sessao in livres
+        ]
+        ociosos.extend(
+            (float(sessao.get("retidaEm", 0)), "retomada", protocolo, sessao)
+            for protocolo, sessao in SESSOES_RETOMADA.items()
+        )
+    with _TRAVA_NAVEGADORES_COMPARTILHADOS:
+        ociosos.extend(
+            (0.0, "compartilhado", chave, compartilhado)
+            for chave, compartilhado in NAVEGADORES_COMPARTILHADOS.items()
+            if not compartilhado["contextos"]
+        )
+    ociosos.sort(key=lambda item: item[0])
+    if preservar is not None:
+        for posicao in range(len(ociosos) - 1, -1, -1):
+            if ociosos[posicao][1] == "pool" and ociosos[posicao][2] == preservar:
+                del ociosos[posicao]
+                break
+
+    fechados = 0
+    for _, tipo, chave, sessao in ociosos[: max(0, len(ociosos) - max(0, manter))]:
+        # Retira da estrutura antes de fechar: se outra thread ja pegou a sessao, ela segue viva.
+        if tipo == "pool":
+            with _TRAVA_SESSOES:
+                livres = SESSOES_NAVEGADOR.get(chave) or []
+                if not any(item is sessao for item in livres):
+                    continue
+                livres[:] = [item for item in livres if item is not sessao]
+        elif tipo == "retomada":
+            with _TRAVA_SESSOES:
+                if SESSOES_RETOMADA.get(chave) is not sessao:
+                    continue
+                SESSOES_RETOMADA.pop(chave)
+        else:
+            with _TRAVA_NAVEGADORES_COMPARTILHADOS:
+                if NAVEGADORES_COMPARTILHADOS.get(chave) is not sessao or sessao["contextos"]:
+                    continue
+                NAVEGADORES_COMPARTILHADOS.pop(chave)
+        fechar_driver(sessao["driver"])
+        fechados += 1
+    return fechados
+
+
+def _id_alvo(aba: str) -> str:
+    return texto_limpo(aba).upper().replace("CDWINDOW-", "")
+
+
+def abas_da_sessao(driver: Any) -> List[str]:
+    abas = list(driver.window_handles)
+    contexto = CONTEXTOS_POR_DRIVER.get(id(driver))
+    if not contexto:
+        return abas
+    try:
+        alvos = driver.execute_cdp_cmd("Target.getTargets", {}).get("targetInfos") or []
+    except Exception:
+        return abas
+    proprios = {_id_alvo(alvo.get("targetId")) for alvo in alvos if alvo.get("browserContextId") == contexto}
+    return [aba for aba in abas if _id_alvo(aba) in proprios]
+
+
+def login_concluido(url_atual: str, acesso: Dict[str, str]) -> bool:
+    atual = texto_limpo(url_atual)
+    if not atual:
+        return False
+
+    parsed = urlparse(atual)
+    host = texto_limpo(parsed.hostname).lower()
+    path = texto_limpo(parsed.path).lower()
+    canal = acesso.get("canal")
+
+    if canal == "esaj":
+        return "/sajcas/login" not in path
+    return host != "sso.tjsp.jus.br"
+
+
+async def _aguardar_navegacao_login(ws_url: str, acesso: Dict[str, str], limite: float) -> str:
+    conexao = await ConexaoCdp.conectar(ws_url)
+    try:
+        await conexao.enviar("Page.enable")
+        atual = await conexao.enviar(
+            "Runtime.evaluate",
+            {"expression": "location.href", "returnByValue": True},
+        )
+        url_atual = texto_limpo((atual.get("result") or {}).get("value"))
+        if login_concluido(url_atual, acesso):
+            return url_atual
+
+        while time.time() < limite:
+            evento = await conexao.proximo_evento(limite - time.time())
+            if evento is None:
+                return ""
+            metodo = evento.get("method")
+            params = evento.get("params") or {}
+            if metodo == "Page.frameNavigated":
+                frame = params.get("frame") or {}
+                if frame.get("parentId"):
+                    continue
+                url_atual = texto_limpo(frame.get("url"))
+            elif metodo == "Page.navigatedWithinDocument":
+                url_atual = texto_limpo(params.get("url"))
+            else:
+                continue
+            if login_concluido(url_atual, acesso):
+                return url_atual
+        return ""
+    finally:
+        await conexao.fechar()
+
+
+def aguardar_login_por_eventos(driver: Any, acesso: Dict[str, str], limite: float) -> str:
+    endereco = endereco_debugger(driver)
+    if not endereco:
+        return ""
+    try:
+        ws_url = url_websocket_pagina(endereco, texto_limpo(driver.current_window_handle))
+        if not ws_url:
+            return ""
+        return asyncio.run(_aguardar_navegacao_login(ws_url, acesso, limite))
+    except Exception:
+        return ""
+
+
+def aguardar_login(driver: Any, acesso: Dict[str, str], timeout_segundos: int) -> str:
+    limite = time.time() + timeout_segundos
+    ultimo_url = ""
+    try:
+        ultimo_url = texto_limpo(driver.current_url)
+    except Exception:
+        ultimo_url = ""
+    if login_concluido(ultimo_url, acesso):
+        return ultimo_url
+
+    if bool_padrao(os.environ.get("PETICIONADOR_LOGIN_POR_EVENTOS", "1"), True):
+        url_evento = aguardar_login_por_eventos(driver, acesso, limite)
+        if url_evento:
+            return url_evento
+
+    # Sem DevTools (ou conexao perdida): polling que comeca curto e cresce ate 1 s.
+    intervalo = INTERVALO_LOGIN_INICIAL_SEGUNDOS
+    while time.time() < limite:
+        try:
+            ultimo_url = texto_limpo(driver.current_url)
+        except Exception:
+            ultimo_url = ""
+        if login_concluido(ultimo_url, acesso):
+            return ultimo_url
+        time.sleep(min(intervalo, max(0.0, limite - time.time())))
+        intervalo = min(intervalo * 1.5, INTERVALO_LOGIN_MAXIMO_SEGUNDOS)
+
+    raise RuntimeError(
+        "Timeout aguardando conclusao do login com certificado digital no portal."
+    )
+
+
+_COFRES_SESSOES: Dict[str, CofreSessoes] = {}
+_TRAVA_COFRES_SESSOES = threading.Lock()
+
+
+def cofre_sessoes() -> Optional[CofreSessoes]:
+    if not bool_padrao(os.environ.get("PETICIONADOR_SESSOES_PERSISTENTES", "1"), True):
+        return None
+    pasta = pasta_automacao() / NOME_PASTA_SESSOES
+    with _TRAVA_COFRES_SESSOES:
+        cofre = _COFRES_SESSOES.get(str(pasta))
+        if cofre is None:
+            cofre = CofreSessoes(pasta)
+            _COFRES_SESSOES[str(pasta)] = cofre
+        return cofre
+
+
+def chave_cofre_sessao(acesso: Dict[str, str], certificado: Dict[str, str]) -> str:
+    try:
+        digest = hash_arquivo_pfx(texto_limpo(certificado.get("arquivo")))
+    except OSError:
+        return ""
+    canal = re.sub(r"[^a-z0-9]+", "-", texto_limpo(acesso.get("canal")).lower()) or "portal"
+    return f"{canal}_{digest[:32]}"
+
+
+def hosts_sessao(acesso: Dict[str, str]) -> List[str]:
+    urls = [acesso.get("entradaUrl"), acesso.get("loginUrl"), acesso.get("serviceUrl"), acesso.get("portalUrl")]
+    return unir_listas_ordenadas(
+        [texto_limpo(urlparse(texto_limpo(url)).hostname).lower() for url in urls if texto_limpo(url)]
+    )
+
+
+def restaurar_sessao_salva(driver: Any, cofre: CofreSessoes, chave: str) -> int:
+    validade = inteiro_env("PETICIONADOR_SESSOES_VALIDADE_HORAS", VALIDADE_SESSAO_HORAS_PADRAO) * 3600
+    cookies = cofre.carregar(chave, validade)
+    if not cookies:
+        return 0
+    try:
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+    except Exception:
+        return 0
+    return len(cookies)
+
+
+def guardar_sessao_navegador(driver: Any, cofre: CofreSessoes, chave: str, acesso: Dict[str, str]) -> int:
+    try:
+        cookies = driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies") or []
+    except Exception:
+        return 0
+    hosts = hosts_sessao(acesso)
+    proprios = [cookie_para_restaurar(cookie) for cookie in cookies if cookie_do_dominio(cookie, hosts)]
+    if not proprios:
+        return 0
+    try:
+        cofre.salvar(chave, proprios)
+    except OSError:
+        return 0
+    return len(proprios)
+
+
+_PONTOS_RETOMADA: Dict[str, PontosRetomada] = {}
+_TRAVA_PONTOS_RETOMADA = threading.Lock()
+
+
+def pontos_retomada() -> Optional[PontosRetomada]:
+    if not bool_padrao(os.environ.get("PETICIONADOR_RETOMADA", "1"), True):
+        return None
+    pasta = pasta_automacao() / NOME_PASTA_RETOMADAS
+    with _TRAVA_PONTOS_RETOMADA:
+        pontos = _PONTOS_RETOMADA.get(str(pasta))
+        if pontos is None:
+            pontos = PontosRetomada(pasta)
+            _PONTOS_RETOMADA[str(pasta)] = pontos
+        return pontos
+
+
+def chave_ponto_retomada(payload: Dict[str, Any], acesso: Dict[str, str], fluxo_tjsp: Dict[str, Any]) -> str:
+    # Identidade da peticao, nao dos caminhos: o mesmo PDF movido ou renomeado continua sendo a mesma peticao.
+    try:
+        conteudo = hashlib.sha256(Path(texto_limpo(payload.get("arquivo"))).read_bytes()).hexdigest()
+    except OSError:
+        conteudo = ""
+    partes = [
+        texto_limpo(acesso.get("canal")).lower(),
+        texto_limpo(payload.get("numeroProcesso")),
+        texto_limpo(fluxo_tjsp.get("modulo")).lower(),
+        conteudo,
+    ]
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()[:32]
+
+
+def certificado_ponto_retomada(certificado: Dict[str, str]) -> str:
+    arquivo = texto_limpo(certificado.get("arquivo"))
+    try:
+        return hash_arquivo_pfx(arquivo)[:32]
+    except OSError:
+        return os.path.normcase(os.path.abspath(arquivo))
+
+
+Condicao = Callable[[Any], bool]
+
+
+def condicao_documento_pronto() -> Condicao:
+    def avaliar(driver: Any) -> bool:
+        return driver.execute_script("return document.readyState;") == "complete"
+
+    return avaliar
+
+
+def condicao_url_mudou(url_anterior: str) -> Condicao:
+    def avaliar(driver: Any) -> bool:
+        return texto_limpo(driver.current_url) != texto_limpo(url_anterior)
+
+    return avaliar
+
+
+def condicao_seletor_presente(seletores: List[str]) -> Condicao:
+    def avaliar(driver: Any) -> bool:
+        if not seletores:
+            return False
+        encontrado = driver.execute_script(
+            "return arguments[0].some(function (s) {"
+            "  try { return document.querySelector(s) !== null; } catch (e) { return false; }"
+            "});",
+            seletores,
+        )
+        return bool(encontrado)
+
+    return avaliar
+
+
+def texto_pagina_normalizado(driver: Any) -> str:
+    try:
+        return texto_limpo(driver.execute_script("return document.body ? document.body.innerText : '';")).lower()
+    except Exception:
+        return ""
+
+
+def condicao_texto_novo(termos: List[str], texto_anterior: str) -> Condicao:
+    # So conta o termo que apareceu depois da acao: o proprio formulario ja pode citar "comprovante".
+    def avaliar(driver: Any) -> bool:
+        texto = texto_pagina_normalizado(driver)
+        return any(texto.count(termo) > texto_anterior.count(termo) for termo in termos)
+
+    return avaliar
+
+
+def marcar_documento(driver: Any) -> str:
+    # A marca some quando o portal carrega outro documento, mesmo que a URL (ex.: POST) nao mude.
+    marca = f"{os.getpid()}-{threading.get_ident()}-{time.time_ns()}"
+    try:
+        driver.execute_script("window.__peticionadorMarca = arguments[0];", marca)
+    except Exception:
+        return ""
+    return marca
+
+
+def condicao_documento_trocado(marca: str) -> Condicao:
+    def avaliar(driver: Any) -> bool:
+        if not marca:
+            return False
+        return bool(driver.execute_script("return window.__peticionadorMarca !== arguments[0];", marca))
+
+    return avaliar
+
+
+def condicao_nova_aba(total_abas_antes: int) -> Condicao:
+    def avaliar(driver: Any) -> bool:
+        return len(abas_da_sessao(driver)) > total_abas_antes
+
+    return avaliar
+
+
+def condicao_qualquer(*condicoes: Condicao) -> Condicao:
+    def avaliar(driver: Any) -> bool:
+        for condicao in condicoes:
+            try:
+                if condicao(driver):
+                    return True
+            except Exception:
+                continue
+        return False
+
+    return avaliar
+
+
+def condicao_todas(*condicoes: Condicao) -> Condicao:
+    def avaliar(driver: Any) -> bool:
+        return all(condicao(driver) for condicao in condicoes)
+
+    return avaliar
+
+
+def limite_espera_etapa(nome: str, timeout_etapa: int) -> float:
+    fracao = FRACAO_TIMEOUT_ETAPA_POR_ESPERA.get(nome, 1.0)
+    return max(1.0, timeout_etapa * fracao)
+
+
+def aguardar_condicao(driver: Any, nome: str, condicao: Condicao, timeout_segundos: float) -> Dict[str, Any]:
+    inicio = time.perf_counter()
+    limite = inicio + timeout_segundos
+    atendida = False
+    while True:
+        try:
+            atendida = bool(condicao(driver))
+        except Exception:
+            atendida = False
+        if atendida or time.perf_counter() >= limite:
+            break
+        time.sleep(INTERVALO_ESPERA_CONDICAO_SEGUNDOS)
+
+    return {
+        "etapa": nome,
+        "atendida": atendida,
+        "duracaoMs": round((time.perf_counter() - inicio) * 1000, 1),
+        "limiteSegundos": timeout_segundos,
+    }
+
+
+def resolver_campos_formulario(
+    driver: Any,
+    seletores_por_papel: Dict[str, List[str]],
+) -> Optional[Dict[str, Dict[str, Any]]]:
+    papeis = {papel: list(seletores) for papel, seletores in seletores_por_papel.items()}
+    try:
+        bruto = driver.execute_script(SCRIPT_RESOLVER_CAMPOS, papeis, PAPEIS_CAMPO_HABILITADO)
+    except Exception:
+        return None
+    if not isinstance(bruto, dict):
+        return None
+
+    campos: Dict[str, Dict[str, Any]] = {}
+    for papel, item in bruto.items():
+        if isinstance(item, dict) and item.get("elemento") is not None:
+            campos[papel] = {"elemento": item["elemento"], "seletor": texto_limpo(item.get("seletor"))}
+    return campos
+
+
+def campo_resolvido(
+    campos: Optional[Dict[str, Dict[str, Any]]],
+    seletores_por_papel: Dict[str, List[str]],
+    papel: str,
+) -> Tuple[Any, List[str]]:
+    seletores = seletores_por_papel.get(papel, [])
+    if campos is None:
+        return None, seletores
+    item = campos.get(papel)
+    if not item:
+        return None, []
+    # A lista comeca pelo seletor do elemento resolvido: e ele que vale se o elemento aceitar o valor.
+    seletor = item["seletor"]
+    if seletor in seletores:
+        return item["elemento"], seletores[seletores.index(seletor):]
+    return item["elemento"], [seletor] + seletores
+
+
+def _preencher_elemento(elemento: Any, valor: str) -> bool:
+    try:
+        elemento.clear()
+        elemento.send_keys(valor)
+        return True
+    except Exception:
+        return False
+
+
+def tentar_preencher_texto(
+    driver: Any,
+    seletores: List[str],
+    valor: str,
+    elemento: Any = None,
+) -> Tuple[bool, str]:
+    # Devolve tambem o seletor que preencheu de fato, para o cache aprender o que funcionou.
+    if not valor:
+        return False, ""
+    if elemento is not None and seletores and _preencher_elemento(elemento, valor):
+        return True, seletores[0]
+
+    for seletor in seletores:
+        elementos = driver.find_elements(POR_CSS, seletor)
+        for candidato in elementos:
+            try:
+                if not candidato.is_enabled():
+                    continue
+            except Exception:
+                continue
+            if _preencher_elemento(candidato, valor):
+                return True, seletor
+    return False, ""
+
+
+def _texto_botao(elemento: Any) -> str:
+    try:
+        return normalizar_rotulo(elemento.text or elemento.get_attribute("value"))
+    except Exception:
+        return ""
+
+
+def _elementos_clicaveis(driver: Any) -> List[Any]:
+    try:
+        return driver.find_elements(
+            POR_XPATH, "//button | //a[@role='button'] | //input[@type='submit' or @type='button']"
+        )
+    except Exception:
+        return []
+
+
+class CliqueIncerto(RuntimeError):
+    # O clique foi enviado, mas .click() falhou (ex.: timeout de carga durante o envio):
+    # o portal pode ter recebido a acao.
+    def __init__(self, texto: str, erro: Exception) -> None:
+        super().__init__(f"Clique em '{texto}' sem confirmacao: {texto_limpo(erro)}")
+        self.texto = texto
+
+
+def _clicar_elemento(elemento: Any, texto: str, tolerar_falha_clique: bool) -> bool:
+    try:
+        elemento.click()
+        return True
+    except Exception as error:
+        if tolerar_falha_clique:
+            return False
+        raise CliqueIncerto(texto, error) from error
+
+
+def _clicar_botao_por_varredura(
+    driver: Any,
+    palavras_incluir: List[str],
+    palavras_excluir: List[str],
+    tolerar_falha_clique: bool = True,
+) -> Tuple[bool, str]:
+    for elemento in _elementos_clicaveis(driver):
+        try:
+            if not elemento.is_enabled():
+                continue
+            texto = _texto_botao(elemento)
+            if not texto:
+                continue
+            if palavras_excluir and any(p in texto for p in palavras_excluir):
+                continue
+            if not any(p in texto for p in palavras_incluir):
+                continue
+        except Exception:
+            continue
+        if _clicar_elemento(elemento, texto, tolerar_falha_clique):
+            return True, texto
+    return False, ""
+
+
+def clicar_botao_por_prioridade(
+    driver: Any,
+    niveis_incluir: List[List[str]],
+    palavras_excluir: List[str],
+    tolerar_falha_clique: bool = True,
+) -> Tuple[bool, str]:
+    # (False, "") significa nenhum botao encontrado; com tolerar_falha_clique=False um clique
+    # enviado que falhou levanta CliqueIncerto em vez de se confundir com "nao encontrado".
+    niveis = [[normalizar_rotulo(p) for p in nivel if texto_limpo(p)] for nivel in niveis_incluir]
+    excluir = [normalizar_rotulo(p) for p in palavras_excluir if texto_limpo(p)]
+    try:
+        escolhido = driver.execute_script(SCRIPT_ESCOLHER_BOTAO, niveis, excluir)
+    except Exception:
+        for nivel in niveis:
+            clicou, texto = _clicar_botao_por_varredura(driver, nivel, excluir, tolerar_falha_clique)
+            if clicou:
+                return True, texto
+        return False, ""
+
+    if not isinstance(escolhido, dict) or escolhido.get("elemento") is None:
+        return False, ""
+    texto = texto_limpo(escolhido.get("texto"))
+    if not _clicar_elemento(escolhido["elemento"], texto, tolerar_falha_clique):
+        return False, ""
+    return True, texto
+
+
+def clicar_botao_por_texto(
+    driver: Any,
+    palavras_incluir: List[str],
+    palavras_excluir: List[str],
+) -> Tuple[bool, str]:
+    return clicar_botao_por_prioridade(driver, [palavras_incluir], palavras_excluir)
+
+
+def preparar_formulario_para_upload(
+    driver: Any,
+    fluxo_tjsp: Dict[str, Any],
+    rotulos_preferidos: Optional[List[str]] = None,
+) -> Tuple[bool, str]:
+    tipo_fluxo = texto_limpo(fluxo_tjsp.get("tipo")).lower()
+    prioridade = [
+        ["incluir documento", "adicionar documento", "juntar documento"],
+        ["incluir arquivo", "adicionar arquivo", "anexar arquivo"],
+        ["incluir peticao", "adicionar peticao", "anexar peticao"],
+        ["adicionar", "anexar", "incluir"],
+    ]
+    if tipo_fluxo == "intermediaria":
+        prioridade.insert(0, ["peticao intermediaria", "intermediaria"])
+    if tipo_fluxo == "inicial":
+        prioridade.insert(0, ["peticao inicial", "inicial"])
+    if rotulos_preferidos:
+        prioridade.insert(0, rotulos_preferidos)
+
+    return clicar_botao_por_prioridade(
+        driver,
+        niveis_incluir=prioridade,
+        palavras_excluir=["cancelar", "voltar", "sair", "excluir", "remover"],
+    )
+
+
+def _enviar_arquivo_elemento(driver: Any, elemento: Any, destino: str) -> bool:
+    try:
+        elemento.send_keys(destino)
+        return True
+    except Exception:
+        try:
+            driver.execute_script(
+                "arguments[0].style.display='block';"
+                "arguments[0].style.visibility='visible';"
+                "arguments[0].removeAttribute('hidden');",
+                elemento,
+            )
+            elemento.send_keys(destino)
+            return True
+        except Exception:
+            return False
+
+
+def anexar_arquivo(
+    driver: Any,
+    caminho_arquivo: str,
+    seletores_upload: List[str],
+    elemento: Any = None,
+) -> Tuple[bool, str]:
+    destino = str(Path(caminho_arquivo).resolve())
+    if elemento is not None and seletores_upload and _enviar_arquivo_elemento(driver, elemento, destino):
+        return True, seletores_upload[0]
+
+    for seletor in seletores_upload:
+        elementos = driver.find_elements(POR_CSS, seletor)
+        for candidato in elementos:
+            if _enviar_arquivo_elemento(driver, candidato, destino):
+                return True, seletor
+    return False, ""
+
+
+def clicar_botao_protocolar(
+    driver: Any,
+    fluxo_tjsp: Dict[str, Any],
+    rotulos_preferidos: Optional[List[str]] = None,
+) -> Tuple[bool, str]:
+    validos = [
+        "protocolar",
+        "peticionar",
         "enviar",
         "confirmar",
         "assinar",
@@ -534,14 +1852,15 @@ def clicar_botao_protocolar(driver: Any, fluxo_tjsp: Dict[str, Any]) -> Tuple[bo
     if tipo_fluxo == "intermediaria":
         validos = ["protocolar intermediaria", "peticao intermediaria", "protocolar"] + validos
 
-    return clicar_botao_por_texto(
+    return clicar_botao_por_prioridade(
         driver,
-        palavras_incluir=validos,
+        niveis_incluir=[rotulos_preferidos or [], validos],
         palavras_excluir=["cancelar", "voltar", "fechar", "limpar", "sair", "excluir", "remover"],
+        tolerar_falha_clique=False,
     )
 
 
-def abrir_comprovante(driver: Any) -> Tuple[bool, str]:
+def abrir_comprovante(driver: Any, rotulos_preferidos: Optional[List[str]] = None) -> Tuple[bool, str]:
     palavras = [
         "comprovante",
         "recibo",
@@ -550,16 +1869,16 @@ def abrir_comprovante(driver: Any) -> Tuple[bool, str]:
         "visualizar pdf",
         "baixar pdf",
     ]
-    return clicar_botao_por_texto(
+    return clicar_botao_por_prioridade(
         driver,
-        palavras_incluir=palavras,
+        niveis_incluir=[rotulos_preferidos or [], palavras],
         palavras_excluir=["cancelar", "voltar", "sair", "fechar"],
     )
 
 
 def trocar_para_ultima_aba(driver: Any) -> bool:
     try:
-        abas = list(driver.window_handles)
+        abas = abas_da_sessao(driver)
         if not abas:
             return False
         driver.switch_to.window(abas[-1])
@@ -569,14 +1888,9 @@ def trocar_para_ultima_aba(driver: Any) -> bool:
 
 
 def extrair_referencia_tela(driver: Any) -> str:
-    try:
-        from selenium.webdriver.common.by import By
-    except Exception:
-        return ""
-
     try:
         elementos = driver.find_elements(
-            By.XPATH,
+            POR_XPATH,
             "//*[contains(translate(normalize-space(.), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'protocolo')]",
         )
     except Exception:
@@ -595,16 +1909,92 @@ def extrair_referencia_tela(driver: Any) -> str:
     return ""
 
 
-def data_dir_local() -> Path:
+def _data_dir_configurado() -> Path:
     valor = texto_limpo(os.environ.get("PETICIONADOR_DATA_DIR"))
     if valor:
-        base = Path(valor)
-    else:
-        base = Path.cwd() / "data"
+        return Path(valor)
+    return Path.cwd() / "data"
+
+
+def data_dir_local() -> Path:
+    base = _data_dir_configurado()
     base.mkdir(parents=True, exist_ok=True)
     return base
 
 
+_PASTAS_AUTOMACAO_PRONTAS: Set[str] = set()
+
+
+def pasta_automacao() -> Path:
+    pasta = _data_dir_configurado() / "automacao"
+    if str(pasta) not in _PASTAS_AUTOMACAO_PRONTAS:
+        pasta.mkdir(parents=True, exist_ok=True)
+        _PASTAS_AUTOMACAO_PRONTAS.add(str(pasta))
+    return pasta
+
+
+def gravar_artefato(arquivo: Path, dados: Any, ao_gravar: Optional[Callable[[], None]] = None) -> str:
+    if bool_padrao(os.environ.get("PETICIONADOR_GRAVACAO_ASSINCRONA", "1"), True):
+        return gravador_artefatos().gravar(arquivo, dados, ao_gravar)
+    try:
+        gravar_arquivo_duravel(arquivo, dados)
+        if ao_gravar is not None:
+            ao_gravar()
+        return str(arquivo)
+    except Exception:
+        return ""
+
+
+_ARMAZENS_CONTEUDO: Dict[str, ArmazemConteudo] = {}
+_TRAVA_ARMAZENS_CONTEUDO = threading.Lock()
+
+
+def armazem_conteudo() -> Optional[ArmazemConteudo]:
+    if not bool_padrao(os.environ.get("PETICIONADOR_ARTEFATOS_DEDUP", "1"), True):
+        return None
+    pasta = pasta_automacao() / NOME_PASTA_OBJETOS
+    with _TRAVA_ARMAZENS_CONTEUDO:
+        armazem = _ARMAZENS_CONTEUDO.get(str(pasta))
+        if armazem is None:
+            armazem = ArmazemConteudo(pasta)
+            _ARMAZENS_CONTEUDO[str(pasta)] = armazem
+        return armazem
+
+
+def guardar_captura(
+    protocolo: str,
+    etapa: str,
+    extensao: str,
+    dados: Any,
+    artefatos: Optional[List[Dict[str, Any]]] = None,
+) -> str:
+    try:
+        armazem = armazem_conteudo()
+        if armazem is None:
+            arquivo = pasta_automacao() / f"{nome_seguro(protocolo)}_{nome_seguro(etapa)}.{extensao}"
+            return gravar_artefato(arquivo, dados)
+        comprimir = extensao == "html" and bool_padrao(
+            os.environ.get("PETICIONADOR_ARTEFATOS_COMPRIMIR_HTML", "0"), False
+        )
+        objeto = armazem.guardar(dados, extensao, comprimir, gravar_artefato)
+    except Exception:
+        return ""
+    if not objeto:
+        return ""
+    if artefatos is not None:
+        artefatos.append(
+            {
+                "etapa": etapa,
+                "tipo": extensao,
+                "hash": objeto["hash"],
+                "caminho": objeto["caminho"],
+                "tamanho": objeto["tamanho"],
+                "reaproveitado": not objeto["novo"],
+            }
+        )
+    return objeto["caminho"]
+
+
 def nome_seguro(nome: str) -> str:
     permitido = []
     for ch in texto_limpo(nome):
@@ -616,35 +2006,155 @@ def nome_seguro(nome: str) -> str:
     return valor or "arquivo"
 
 
-def salvar_screenshot(driver: Any, protocolo: str, etapa: str) -> str:
-    pasta = data_dir_local() / "automacao"
-    pasta.mkdir(parents=True, exist_ok=True)
-    arquivo = pasta / f"{nome_seguro(protocolo)}_{nome_seguro(etapa)}.png"
+def salvar_screenshot(
+    driver: Any,
+    protocolo: str,
+    etapa: str,
+    artefatos: Optional[List[Dict[str, Any]]] = None,
+) -> str:
     try:
-        driver.save_screenshot(str(arquivo))
-        return str(arquivo)
+        png = driver.get_screenshot_as_png()
     except Exception:
         return ""
+    if not png:
+        return ""
+    return guardar_captura(protocolo, etapa, "png", png, artefatos)
+
+
+def normalizar_politica_screenshot() -> str:
+    politica = texto_limpo(os.environ.get("PETICIONADOR_SCREENSHOTS", "sempre")).lower()
+    if politica not in POLITICAS_SCREENSHOT_VALIDAS:
+        return "sempre"
+    if politica == "amostrado":
+        try:
+            taxa = float(os.environ.get("PETICIONADOR_SCREENSHOTS_AMOSTRA", "").strip() or SCREENSHOTS_AMOSTRA_PADRAO)
+        except ValueError:
+            taxa = SCREENSHOTS_AMOSTRA_PADRAO
+        return "sempre" if random.random() < taxa else "falha"
+    return politica
+
+
+class CapturasExecucao:
+    def __init__(self, protocolo: str, politica: str, tamanho_buffer: int) -> None:
+        self.protocolo = protocolo
+        self.politica = politica
+        self.salvos: List[str] = []
+        self.artefatos: List[Dict[str, Any]] = []
+        self._buffer: deque = deque(maxlen=max(1, tamanho_buffer))
+
+    def capturar(self, driver: Any, etapa: str) -> None:
+        if self.politica == "sempre":
+            img = salvar_screenshot(driver, self.protocolo, etapa, self.artefatos)
+            if img:
+                self.salvos.append(img)
+            return
+        try:
+            png = driver.get_screenshot_as_png()
+        except Exception:
+            return
+        if png:
+            self._buffer.append((etapa, png))
+
+    def registrar_falha(self, driver: Any) -> List[str]:
+        self.capturar(driver, "99_falha")
+        while self._buffer:
+            etapa, png = self._buffer.popleft()
+            img = guardar_captura(self.protocolo, etapa, "png", png, self.artefatos)
+            if img:
+                self.salvos.append(img)
+        return self.salvos
+
+
+class ErroFluxoReal(RuntimeError):
+    def __init__(
+        self,
+        mensagem: str,
+        screenshots: List[str],
+        etapa: str = "",
+        artefatos: Optional[List[Dict[str, Any]]] = None,
+        erro_certificado: str = "",
+    ) -> None:
+        super().__init__(mensagem)
+        self.screenshots = screenshots
+        self.etapa = etapa
+        self.artefatos = artefatos or []
+        self.erro_certificado = erro_certificado
+
 
+class ProtocoloJaAcionado(RuntimeError):
+    pass
 
-def salvar_html_pagina(driver: Any, protocolo: str, etapa: str) -> str:
-    pasta = data_dir_local() / "automacao"
-    pasta.mkdir(parents=True, exist_ok=True)
-    arquivo = pasta / f"{nome_seguro(protocolo)}_{nome_seguro(etapa)}.html"
+
+def salvar_html_pagina(
+    driver: Any,
+    protocolo: str,
+    etapa: str,
+    artefatos: Optional[List[Dict[str, Any]]] = None,
+) -> str:
     try:
         html = texto_limpo(driver.page_source)
-        if not html:
-            return ""
-        arquivo.write_text(html, encoding="utf-8")
-        return str(arquivo)
     except Exception:
         return ""
+    if not html:
+        return ""
+    return guardar_captura(protocolo, etapa, "html", html, artefatos)
+
+
+def _gravar_pdf_por_stream(driver: Any, arquivo: Path) -> int:
+    payload = driver.execute_cdp_cmd(
+        "Page.printToPDF",
+        {"printBackground": True, "preferCSSPageSize": True, "transferMode": "ReturnAsStream"},
+    )
+    handle = texto_limpo(payload.get("stream"))
+    if not handle:
+        raise RuntimeError("Navegador nao devolveu stream para o PDF.")
+
+    temporario = Path(f"{arquivo}.{os.getpid()}.tmp")
+    total = 0
+    try:
+        with open(temporario, "wb") as destino:
+            while True:
+                bloco = driver.execute_cdp_cmd("IO.read", {"handle": handle, "size": TAMANHO_BLOCO_PDF_BYTES})
+                dados = bloco.get("data") or ""
+                if dados:
+                    conteudo = base64.b64decode(dados) if bloco.get("base64Encoded") else dados.encode("latin-1")
+                    destino.write(conteudo)
+                    total += len(conteudo)
+                if bloco.get("eof"):
+                    break
+            destino.flush()
+            os.fsync(destino.fileno())
+        if not total:
+            raise RuntimeError("PDF vazio no stream do navegador.")
+        os.replace(temporario, arquivo)
+    finally:
+        try:
+            driver.execute_cdp_cmd("IO.close", {"handle": handle})
+        except Exception:
+            pass
+        if temporario.exists():
+            temporario.unlink()
+    return total
+
 
+def salvar_pdf_pagina(
+    driver: Any,
+    protocolo: str,
+    etapa: str,
+    metricas: Optional[Dict[str, Any]] = None,
+) -> str:
+    arquivo = pasta_automacao() / f"{nome_seguro(protocolo)}_{nome_seguro(etapa)}.pdf"
+    inicio = time.perf_counter()
+    metricas = metricas if metricas is not None else {}
+    try:
+        metricas["bytes"] = _gravar_pdf_por_stream(driver, arquivo)
+        metricas["modo"] = "stream"
+        metricas["duracaoMs"] = round((time.perf_counter() - inicio) * 1000, 1)
+        return str(arquivo)
+    except Exception:
+        pass
 
-def salvar_pdf_pagina(driver: Any, protocolo: str, etapa: str) -> str:
-    pasta = data_dir_local() / "automacao"
-    pasta.mkdir(parents=True, exist_ok=True)
-    arquivo = pasta / f"{nome_seguro(protocolo)}_{nome_seguro(etapa)}.pdf"
+    # Drivers sem IO.read (ou transferMode) recebem o documento inteiro em base64.
     try:
         payload = driver.execute_cdp_cmd(
             "Page.printToPDF",
@@ -653,10 +2163,130 @@ def salvar_pdf_pagina(driver: Any, protocolo: str, etapa: str) -> str:
         raw = payload.get("data")
         if not raw:
             return ""
-        arquivo.write_bytes(base64.b64decode(raw))
-        return str(arquivo)
+        conteudo = base64.b64decode(raw)
+        metricas["bytes"] = len(conteudo)
+        metricas["modo"] = "base64"
+        caminho = gravar_artefato(arquivo, conteudo)
+        metricas["duracaoMs"] = round((time.perf_counter() - inicio) * 1000, 1)
+        return caminho
+    except Exception:
+        return ""
+
+
+def nova_estatistica_rede() -> Dict[str, Any]:
+    return {"requisicoes": 0, "bytesRecebidos": 0, "requisicoesBloqueadas": 0, "bloqueiosPorTipo": {}}
+
+
+def _contabilizar_rede(estatisticas: Dict[str, Any], mensagem: Dict[str, Any]) -> None:
+    metodo = mensagem.get("method")
+    params = mensagem.get("params") or {}
+    if metodo == "Network.requestWillBeSent":
+        estatisticas["requisicoes"] += 1
+    elif metodo == "Network.loadingFinished":
+        estatisticas["bytesRecebidos"] += int(params.get("encodedDataLength") or 0)
+    elif metodo == "Network.loadingFailed" and params.get("blockedReason"):
+        estatisticas["requisicoesBloqueadas"] += 1
+        tipo = texto_limpo(params.get("type")) or "Other"
+        estatisticas["bloqueiosPorTipo"][tipo] = estatisticas["bloqueiosPorTipo"].get(tipo, 0) + 1
+
+
+def ler_log_rede(driver: Any, estatisticas: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    try:
+        entradas = driver.get_log("performance")
+    except Exception:
+        return []
+    mensagens: List[Dict[str, Any]] = []
+    for entrada in entradas:
+        try:
+            mensagem = json.loads(entrada.get("message") or "{}").get("message") or {}
+        except (AttributeError, TypeError, ValueError):
+            continue
+        if estatisticas is not None:
+            _contabilizar_rede(estatisticas, mensagem)
+        mensagens.append(mensagem)
+    return mensagens
+
+
+def descartar_log_rede(driver: Any, estatisticas: Optional[Dict[str, Any]] = None) -> None:
+    ler_log_rede(driver, estatisticas)
+
+
+def _atualizar_respostas_pdf(
+    driver: Any,
+    respostas: Dict[str, Dict[str, Any]],
+    estatisticas: Optional[Dict[str, Any]] = None,
+) -> None:
+    for mensagem in ler_log_rede(driver, estatisticas):
+        metodo = mensagem.get("method")
+        params = mensagem.get("params") or {}
+        requisicao = texto_limpo(params.get("requestId"))
+        if metodo == "Network.responseReceived":
+            resposta = params.get("response") or {}
+            if "application/pdf" in texto_limpo(resposta.get("mimeType")).lower():
+                respostas[requisicao] = {"url": texto_limpo(resposta.get("url")), "concluida": False}
+        elif metodo in {"Network.loadingFinished", "Network.loadingFailed"} and requisicao in respostas:
+            respostas[requisicao]["concluida"] = metodo == "Network.loadingFinished"
+            respostas[requisicao]["falhou"] = metodo == "Network.loadingFailed"
+
+
+def _corpo_resposta_rede(driver: Any, requisicao: str) -> bytes:
+    atual = driver.current_window_handle
+    abas = [atual] + [aba for aba in abas_da_sessao(driver) if aba != atual]
+    try:
+        for aba in abas:
+            try:
+                if aba != driver.current_window_handle:
+                    driver.switch_to.window(aba)
+                corpo = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": requisicao})
+            except Exception:
+                continue
+            dados = corpo.get("body") or ""
+            if dados:
+                return base64.b64decode(dados) if corpo.get("base64Encoded") else dados.encode("latin-1")
+        return b""
+    finally:
+        if driver.current_window_handle != atual:
+            driver.switch_to.window(atual)
+
+
+def salvar_pdf_da_rede(
+    driver: Any,
+    protocolo: str,
+    etapa: str,
+    timeout_segundos: float,
+    metricas: Optional[Dict[str, Any]] = None,
+    estatisticas: Optional[Dict[str, Any]] = None,
+) -> str:
+    inicio = time.perf_counter()
+    limite = inicio + timeout_segundos
+    metricas = metricas if metricas is not None else {}
+    respostas: Dict[str, Dict[str, Any]] = {}
+    try:
+        _atualizar_respostas_pdf(driver, respostas, estatisticas)
+        # Sem resposta PDF ate o comprovante carregar, o portal entregou HTML: nao ha o que esperar.
+        while respostas and time.perf_counter() < limite:
+            if any(info.get("concluida") or info.get("falhou") for info in respostas.values()):
+                break
+            time.sleep(INTERVALO_ESPERA_CONDICAO_SEGUNDOS)
+            _atualizar_respostas_pdf(driver, respostas, estatisticas)
+
+        for requisicao, info in reversed(list(respostas.items())):
+            if not info.get("concluida"):
+                continue
+            conteudo = _corpo_resposta_rede(driver, requisicao)
+            if not conteudo.startswith(b"%PDF"):
+                continue
+            arquivo = pasta_automacao() / f"{nome_seguro(protocolo)}_{nome_seguro(etapa)}.pdf"
+            caminho = gravar_artefato(arquivo, conteudo)
+            if caminho:
+                metricas["bytes"] = len(conteudo)
+                metricas["modo"] = "rede"
+                metricas["url"] = info.get("url", "")
+                metricas["duracaoMs"] = round((time.perf_counter() - inicio) * 1000, 1)
+            return caminho
     except Exception:
         return ""
+    return ""
 
 
 def extrair_texto_pagina(driver: Any) -> str:
@@ -705,19 +2335,493 @@ def sanitizar_payload_para_log(payload: Dict[str, Any]) -> Dict[str, Any]:
     return copia
 
 
+_ARMAZENS_RELATORIOS: Dict[str, ArmazemRelatorios] = {}
+_TRAVA_ARMAZENS_RELATORIOS = threading.Lock()
+
+
+def armazem_relatorios() -> ArmazemRelatorios:
+    arquivo = pasta_automacao() / NOME_BANCO_RELATORIOS
+    with _TRAVA_ARMAZENS_RELATORIOS:
+        armazem = _ARMAZENS_RELATORIOS.get(str(arquivo))
+        if armazem is None:
+            armazem = ArmazemRelatorios(arquivo)
+            _ARMAZENS_RELATORIOS[str(arquivo)] = armazem
+        return armazem
+
+
 def salvar_relatorio_execucao(
     protocolo: str,
     tribunal: str,
     conteudo: Dict[str, Any],
-) -> str:
-    pasta = data_dir_local() / "automacao"
-    pasta.mkdir(parents=True, exist_ok=True)
-    arquivo = pasta / f"{nome_seguro(protocolo)}_{nome_seguro(tribunal)}_execucao.json"
+) -> int:
     try:
-        arquivo.write_text(json.dumps(conteudo, ensure_ascii=True, indent=2), encoding="utf-8")
-        return str(arquivo)
+        return armazem_relatorios().registrar(protocolo, tribunal, conteudo)
     except Exception:
-        return ""
+        return 0
+
+
+def economia_perfil_enxuto(tribunal: str, rede: Dict[str, Any]) -> Dict[str, Any]:
+    # Bloqueio por tipo nem chega a virar requisicao: a economia so aparece contra execucoes sem o perfil.
+    try:
+        referencia = armazem_relatorios().bytes_rede_sem_perfil_enxuto(tribunal)
+    except Exception:
+        referencia = 0
+    if not referencia:
+        return {"bytesReferenciaSemPerfil": None, "bytesEconomizados": None}
+    return {
+        "bytesReferenciaSemPerfil": referencia,
+        "bytesEconomizados": max(0, referencia - int(rede.get("bytesRecebidos") or 0)),
+    }
+
+
+def anexar_relatorio_execucao(
+    resposta: Dict[str, Any],
+    protocolo: str,
+    tribunal: str,
+    conteudo: Dict[str, Any],
+) -> None:
+    # O relatorio nao e mais um arquivo por execucao: o antigo "arquivoLogExecucao" saiu da resposta
+    # de proposito, e o id abaixo e o que identifica a execucao no banco (robo_relatorios.py consultar --id).
+    relatorio_id = salvar_relatorio_execucao(protocolo, tribunal, conteudo)
+    if relatorio_id:
+        resposta["relatorioExecucaoId"] = relatorio_id
+
+
+class ExecucaoFluxo:
+    # Estado compartilhado pelas etapas do fluxo real; o finally de executar_fluxo_real libera
+    # o que estiver aqui, mesmo que a etapa que o obteve nao tenha terminado.
+    def __init__(
+        self,
+        payload: Dict[str, Any],
+        acesso: Dict[str, str],
+        certificado: Dict[str, str],
+        fluxo_tjsp: Dict[str, Any],
+        arquivo_peticao: str,
+        ao_passo: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.payload = payload
+        self.acesso = acesso
+        self.certificado = certificado
+        self.fluxo_tjsp = fluxo_tjsp
+        self.arquivo_peticao = arquivo_peticao
+        self._ao_passo = ao_passo
+        self.protocolo = texto_limpo(payload.get("protocolo")) or f"PROTOCOLO-{int(time.time())}"
+        self.timeout_login = inteiro_env("PETICIONADOR_TIMEOUT_LOGIN_SEGUNDOS", TIMEOUT_LOGIN_PADRAO_SEGUNDOS)
+        self.timeout_etapa = inteiro_env("PETICIONADOR_TIMEOUT_ETAPA_SEGUNDOS", TIMEOUT_ETAPA_PADRAO_SEGUNDOS)
+        self.headless = bool_padrao(os.environ.get("PETICIONADOR_HEADLESS", "0"), False)
+        self.enxuto = argumentos_perfil_enxuto(acesso) if perfil_enxuto_ativo() else []
+        self.confirmar_protocolo = bool_padrao(payload.get("confirmarProtocolo"), True)
+        self.abrir_comp_apos = bool_padrao(os.environ.get("PETICIONADOR_ABRIR_COMPROVANTE", "1"), True)
+
+        self.pontos = pontos_retomada()
+        self.chave_retomada = chave_ponto_retomada(payload, acesso, fluxo_tjsp) if self.pontos else ""
+        self.certificado_retomada = certificado_ponto_retomada(certificado) if self.pontos else ""
+        self.ponto: Dict[str, Any] = (
+            self.pontos.carregar(
+                self.protocolo, self.chave_retomada, validade_retomada_segundos(), self.certificado_retomada
+            )
+            if self.pontos
+            else {}
+        )
+        self.ponto_atual: Dict[str, Any] = dict(self.ponto)
+
+        self.repositorio = repositorio_certificados()
+        self.cache_cert: Optional[CacheCertificados] = None
+        self.importacao_futura: Optional[Future] = None
+        self.importacao: Dict[str, Any] = {}
+        self.preparo: Dict[str, Any] = {"repositorioCertificados": self.repositorio.nome}
+        self.capturas = CapturasExecucao(
+            self.protocolo,
+            normalizar_politica_screenshot(),
+            inteiro_env("PETICIONADOR_SCREENSHOTS_BUFFER", SCREENSHOTS_BUFFER_PADRAO),
+        )
+        self.passos: List[str] = []
+        self.esperas: List[Dict[str, Any]] = []
+
+        self.driver: Any = None
+        self.navegador = ""
+        self.sessao: Optional[Dict[str, Any]] = None
+        self.chave_sessao = chave_sessao_navegador(acesso, certificado)
+        self.contexto_isolado = contextos_isolados_ativos()
+        self.sessao_retomada = False
+        self.sessao_reaproveitavel = False
+        self.reter_sessao = False
+        self.memoria: List[Dict[str, Any]] = []
+        self.rede: Dict[str, Any] = {}
+        self.urls_bloqueadas: List[str] = []
+        self.cofre: Optional[CofreSessoes] = None
+        self.chave_cofre = ""
+
+        self.cache: Optional[CacheSeletores] = None
+        self.chaves_cache: Dict[str, str] = {}
+        self.preferidos: Dict[str, List[str]] = {}
+        self.perfil_seletores: Dict[str, List[str]] = {}
+        self.seletores_usados: Dict[str, str] = {}
+
+    def marcar_passo(self, passo: str) -> None:
+        self.passos.append(passo)
+        if self._ao_passo is not None:
+            # Uma falha ao registrar o passo interrompe o fluxo antes da proxima acao no portal.
+            self._ao_passo(passo)
+
+    def salvar_ponto(self, etapa: str, **dados: Any) -> None:
+        if self.pontos is None:
+            return
+        self.ponto_atual.update(dados, etapa=etapa, url=texto_limpo(self.driver.current_url))
+        try:
+            self.pontos.salvar(self.protocolo, self.chave_retomada, self.ponto_atual, self.certificado_retomada)
+        except OSError:
+            # O ponto do protocolo e o que impede um segundo clique: sem ele nao se clica.
+            if etapa == "protocolo":
+                raise
+
+    def aprender(self, papel: str, seletor: str) -> None:
+        aprender_resultado(self.cache, self.chaves_cache[papel], self.preferidos[papel], seletor)
+
+    def aguardar(self, etapa: str, condicao: Condicao, limite: str = "") -> None:
+        self.esperas.append(
+            aguardar_condicao(
+                self.driver,
+                etapa,
+                condicao,
+                limite_espera_etapa(limite or etapa, self.timeout_etapa),
+            )
+        )
+
+
+def _preparar_navegador(execucao: ExecucaoFluxo) -> None:
+    acesso = execucao.acesso
+    # A importacao do PFX (PowerShell) corre em paralelo com a subida do navegador;
+    # so o primeiro acesso ao portal precisa do certificado ja instalado.
+    execucao.cache_cert = cache_certificados()
+    inicio_preparo = time.perf_counter()
+    execucao.importacao_futura = iniciar_importacao_certificado(
+        execucao.repositorio, execucao.certificado, execucao.cache_cert
+    )
+    execucao.cache = cache = cache_seletores()
+    execucao.chaves_cache = {
+        papel: chave_cache_fluxo(acesso, execucao.fluxo_tjsp, papel) for papel in PAPEIS_CACHE_SELETORES
+    }
+    execucao.preferidos = {
+        papel: cache.preferidos(chave) if cache else [] for papel, chave in execucao.chaves_cache.items()
+    }
+    cofre = cofre_sessoes()
+    chave_cofre = chave_cofre_sessao(acesso, execucao.certificado) if cofre else ""
+    execucao.cofre, execucao.chave_cofre = cofre, chave_cofre
+    if execucao.ponto and not execucao.contexto_isolado:
+        execucao.sessao = retomar_sessao_retida(execucao.protocolo, execucao.chave_sessao, acesso)
+    execucao.sessao_retomada = execucao.sessao is not None
+    if execucao.sessao is None and not execucao.contexto_isolado:
+        execucao.sessao = obter_sessao_navegador(execucao.chave_sessao, acesso)
+
+    sessao = execucao.sessao
+    if execucao.contexto_isolado:
+        execucao.sessao = sessao = abrir_contexto_isolado(execucao.chave_sessao, execucao.headless, execucao.enxuto)
+        execucao.driver, execucao.navegador = sessao["driver"], sessao["navegador"]
+        execucao.marcar_passo(f"navegador:{execucao.navegador}")
+        execucao.marcar_passo("contexto_isolado")
+    elif execucao.sessao_retomada:
+        execucao.driver, execucao.navegador = sessao["driver"], sessao["navegador"]
+        execucao.marcar_passo(f"navegador:{execucao.navegador}")
+        execucao.marcar_passo("sessao_retomada")
+    elif sessao:
+        execucao.driver, execucao.navegador = sessao["driver"], sessao["navegador"]
+        execucao.marcar_passo(f"navegador:{execucao.navegador}")
+        execucao.marcar_passo("sessao_reutilizada")
+    else:
+        execucao.driver, execucao.navegador = criar_driver_selenium(
+            headless=execucao.headless, enxuto=execucao.enxuto
+        )
+        execucao.sessao = sessao = {
+            "driver": execucao.driver,
+            "navegador": execucao.navegador,
+            "criadaEm": time.time(),
+            "usos": 0,
+        }
+        execucao.marcar_passo(f"navegador:{execucao.navegador}")
+    driver = execucao.driver
+    execucao.preparo["navegadorProntoMs"] = round((time.perf_counter() - inicio_preparo) * 1000, 1)
+    execucao.memoria.append(amostrar_memoria_navegador(sessao, "inicio"))
+    driver.set_page_load_timeout(execucao.timeout_etapa)
+    execucao.rede = nova_estatistica_rede()
+    descartar_log_rede(driver)
+    execucao.urls_bloqueadas = padroes_bloqueio_url(acesso) if execucao.enxuto else []
+    if execucao.urls_bloqueadas and aplicar_bloqueios_url(driver, execucao.urls_bloqueadas):
+        execucao.marcar_passo("perfil_enxuto")
+    if chave_cofre and not execucao.sessao_retomada and "sessao_reutilizada" not in execucao.passos:
+        execucao.preparo["cookiesRestaurados"] = restaurar_sessao_salva(driver, cofre, chave_cofre)
+    if not execucao.importacao_futura.done():
+        preaquecer_dns(driver, [acesso["entradaUrl"], acesso["loginUrl"], acesso["serviceUrl"]])
+    execucao.importacao = importacao = execucao.importacao_futura.result()
+    execucao.preparo["certificadoProntoMs"] = round((time.perf_counter() - inicio_preparo) * 1000, 1)
+    execucao.preparo["importacaoCertificadoMs"] = importacao.get("duracaoMs")
+    execucao.preparo["certificadoReaproveitado"] = bool(importacao.get("reaproveitado"))
+
+
+def _etapa_login(execucao: ExecucaoFluxo) -> str:
+    # Devolve a etapa retomada ("" quando o login foi feito agora).
+    driver, acesso, ponto, preparo = execucao.driver, execucao.acesso, execucao.ponto, execucao.preparo
+    # Retomada: a aba retida ainda na pagina do ultimo ponto dispensa tudo ate ele;
+    # sem ela, uma sessao ainda valida (cookies restaurados) volta direto ao formulario.
+    retomada = ""
+    url_formulario = texto_limpo(ponto.get("urlFormulario"))
+    if execucao.sessao_retomada and texto_limpo(driver.current_url) == texto_limpo(ponto.get("url")):
+        retomada = texto_limpo(ponto.get("etapa"))
+    elif url_formulario and etapa_alcancada(ponto, "login"):
+        driver.get(url_formulario)
+        if login_concluido(texto_limpo(driver.current_url), acesso):
+            retomada = "login"
+            # Formulario recarregado: o que a tentativa anterior preencheu ou anexou se perdeu.
+            execucao.salvar_ponto("login")
+    if retomada:
+        execucao.marcar_passo(f"retomada:{retomada}")
+        preparo["retomadaDe"] = retomada
+        preparo["loginDispensado"] = True
+        return retomada
+
+    if execucao.ponto_atual:
+        execucao.ponto_atual.clear()
+        execucao.pontos.descartar(execucao.protocolo)
+    driver.get(acesso["entradaUrl"])
+    execucao.marcar_passo("entrada_aberta")
+    execucao.capturas.capturar(driver, "01_entrada")
+
+    # Com a sessao restaurada o portal ja redireciona para o servico; senao segue o login completo.
+    preparo["loginDispensado"] = login_concluido(texto_limpo(driver.current_url), acesso)
+    url_pos_login = aguardar_login(driver, acesso, execucao.timeout_login)
+    execucao.marcar_passo("login_concluido")
+    if execucao.chave_cofre:
+        guardar_sessao_navegador(driver, execucao.cofre, execucao.chave_cofre, acesso)
+    destino = texto_limpo(acesso.get("portalUrl") or acesso.get("serviceUrl"))
+    if destino and not url_pos_login.startswith(destino):
+        driver.get(destino)
+        execucao.marcar_passo("destino_aberto")
+    execucao.salvar_ponto("login", urlFormulario=texto_limpo(driver.current_url))
+    return ""
+
+
+def _etapa_formulario(execucao: ExecucaoFluxo, retomada: str) -> Tuple[Dict[str, Any], Any]:
+    # Devolve os campos do resultado e os campos resolvidos para o upload.
+    driver, ponto = execucao.driver, execucao.ponto
+    perfil_seletores = execucao.perfil_seletores = perfil_seletores_fluxo(
+        execucao.acesso, execucao.fluxo_tjsp, execucao.preferidos
+    )
+    execucao.aguardar(
+        "pos_login",
+        condicao_todas(
+            condicao_documento_pronto(),
+            condicao_seletor_presente(
+                perfil_seletores["numeroProcesso"] + perfil_seletores["upload"] + ["button", "input[type='submit']"]
+            ),
+        ),
+    )
+    execucao.capturas.capturar(driver, "02_pos_login")
+
+    campos = resolver_campos_formulario(driver, perfil_seletores)
+    if retomada in ("formulario", "upload"):
+        # Campos ja preenchidos e botao auxiliar ja acionado na tentativa anterior, na mesma aba.
+        return (
+            {
+                "preencheuNumeroProcesso": bool(ponto.get("numeroPreenchido")),
+                "preencheuDescricao": bool(ponto.get("descricaoPreenchida")),
+                "botaoAuxiliarUpload": texto_limpo(ponto.get("botaoAuxiliar")),
+            },
+            campos,
+        )
+
+    preenchidos: Dict[str, bool] = {}
+    for papel, passo in (("numeroProcesso", "numero_preenchido"), ("descricao", "descricao_preenchida")):
+        valor = texto_limpo(execucao.payload.get(papel))
+        elemento, seletores = campo_resolvido(campos, perfil_seletores, papel)
+        preenchidos[papel], execucao.seletores_usados[papel] = tentar_preencher_texto(
+            driver,
+            seletores,
+            valor,
+            elemento,
+        )
+        if preenchidos[papel]:
+            execucao.marcar_passo(passo)
+        if valor:
+            execucao.aprender(papel, execucao.seletores_usados[papel])
+
+    campos_upload = campos
+    acionou_auxiliar, botao_auxiliar = preparar_formulario_para_upload(
+        driver, execucao.fluxo_tjsp, execucao.preferidos["botaoAuxiliar"]
+    )
+    execucao.aprender("botaoAuxiliar", botao_auxiliar)
+    if acionou_auxiliar:
+        execucao.marcar_passo(f"botao_auxiliar:{botao_auxiliar}")
+        execucao.aguardar("formulario_upload", condicao_seletor_presente(perfil_seletores["upload"]))
+        campos_upload = resolver_campos_formulario(driver, {"upload": perfil_seletores["upload"]})
+    execucao.salvar_ponto(
+        "formulario",
+        numeroPreenchido=preenchidos["numeroProcesso"],
+        descricaoPreenchida=preenchidos["descricao"],
+        botaoAuxiliar=botao_auxiliar,
+    )
+    return (
+        {
+            "preencheuNumeroProcesso": preenchidos["numeroProcesso"],
+            "preencheuDescricao": preenchidos["descricao"],
+            "botaoAuxiliarUpload": botao_auxiliar,
+        },
+        campos_upload,
+    )
+
+
+def _etapa_upload(execucao: ExecucaoFluxo, retomada: str, campos_upload: Any) -> None:
+    driver = execucao.driver
+    if retomada == "upload":
+        # Reanexar criaria um segundo anexo nos portais que listam os arquivos enviados.
+        upload_ok = True
+    else:
+        elemento_upload, seletores_upload = campo_resolvido(campos_upload, execucao.perfil_seletores, "upload")
+        upload_ok, execucao.seletores_usados["upload"] = anexar_arquivo(
+            driver, execucao.arquivo_peticao, seletores_upload, elemento_upload
+        )
+        if upload_ok:
+            execucao.marcar_passo("arquivo_anexado")
+            execucao.salvar_ponto("upload")
+        execucao.aprender("upload", execucao.seletores_usados["upload"])
+    execucao.capturas.capturar(driver, "03_formulario")
+
+    if not upload_ok:
+        raise RuntimeError("Nao foi possivel localizar campo de upload para anexar o PDF.")
+
+
+def _etapa_protocolo(execucao: ExecucaoFluxo) -> str:
+    # Devolve o botao acionado; sem botao encontrado sobe RuntimeError.
+    driver = execucao.driver
+    url_antes_protocolo = texto_limpo(driver.current_url)
+    texto_antes_protocolo = texto_pagina_normalizado(driver)
+    marca_antes_protocolo = marcar_documento(driver)
+    # Registrado antes do clique: se o processo morrer aqui, o protocolo conta como possivelmente feito.
+    execucao.salvar_ponto("protocolo")
+    execucao.marcar_passo("protocolo_em_andamento")
+    # CliqueIncerto sobe com o ponto "protocolo" intacto: a proxima tentativa recusa clicar de novo.
+    clique_ok, botao = clicar_botao_protocolar(driver, execucao.fluxo_tjsp, execucao.preferidos["botaoProtocolo"])
+    execucao.aprender("botaoProtocolo", botao)
+    if not clique_ok:
+        # Nenhum botao encontrado, nada enviado: a proxima tentativa pode retomar do anexo.
+        execucao.salvar_ponto("upload")
+        raise RuntimeError(
+            "Nao foi possivel localizar botao de protocolo automaticamente."
+        )
+    execucao.marcar_passo(f"botao_protocolo:{botao}")
+    execucao.aguardar(
+        "pos_protocolo",
+        condicao_todas(
+            condicao_qualquer(
+                condicao_url_mudou(url_antes_protocolo),
+                condicao_documento_trocado(marca_antes_protocolo),
+                condicao_texto_novo(["protocolado", "recibo", "comprovante"], texto_antes_protocolo),
+            ),
+            condicao_documento_pronto(),
+        ),
+    )
+    execucao.capturas.capturar(driver, "04_pos_protocolo")
+    return botao
+
+
+def _abrir_comprovante_portal(execucao: ExecucaoFluxo) -> Tuple[bool, str]:
+    driver = execucao.driver
+    url_antes_comprovante = texto_limpo(driver.current_url)
+    total_abas_antes = len(abas_da_sessao(driver))
+    if comprovante_por_rede_ativo():
+        descartar_log_rede(driver, execucao.rede)
+    clicou_comp, botao_comprovante = abrir_comprovante(driver, execucao.preferidos["botaoComprovante"])
+    execucao.aprender("botaoComprovante", botao_comprovante)
+    if clicou_comp:
+        execucao.marcar_passo(f"botao_comprovante:{botao_comprovante}")
+        execucao.aguardar(
+            "comprovante",
+            condicao_qualquer(
+                condicao_nova_aba(total_abas_antes),
+                condicao_url_mudou(url_antes_comprovante),
+            ),
+        )
+        if trocar_para_ultima_aba(driver):
+            execucao.marcar_passo("aba_comprovante_ativa")
+            execucao.aguardar("comprovante_carregado", condicao_documento_pronto(), "comprovante")
+        execucao.capturas.capturar(driver, "05_comprovante")
+    return clicou_comp, botao_comprovante
+
+
+def _etapa_comprovante(execucao: ExecucaoFluxo) -> Dict[str, Any]:
+    driver, protocolo = execucao.driver, execucao.protocolo
+    clicou_comp = False
+    botao_comprovante = ""
+    if execucao.confirmar_protocolo and execucao.abrir_comp_apos:
+        clicou_comp, botao_comprovante = _abrir_comprovante_portal(execucao)
+
+    referencia_tela = extrair_referencia_tela(driver)
+    if referencia_tela:
+        execucao.marcar_passo("referencia_identificada")
+
+    comprovantes: List[str] = []
+    etapa_final = "05_comprovante" if execucao.confirmar_protocolo else "04_estado_final"
+    html_final = salvar_html_pagina(driver, protocolo, etapa_final, execucao.capturas.artefatos)
+    if html_final:
+        comprovantes.append(html_final)
+        execucao.marcar_passo("html_comprovante_salvo")
+
+    metricas_pdf: Dict[str, Any] = {}
+    pdf_final = ""
+    if clicou_comp and comprovante_por_rede_ativo():
+        pdf_final = salvar_pdf_da_rede(
+            driver,
+            protocolo,
+            etapa_final,
+            limite_espera_etapa("comprovante", execucao.timeout_etapa),
+            metricas_pdf,
+            execucao.rede,
+        )
+        if pdf_final:
+            execucao.marcar_passo("pdf_comprovante_rede")
+    if not pdf_final:
+        pdf_final = salvar_pdf_pagina(driver, protocolo, etapa_final, metricas_pdf)
+    if pdf_final:
+        comprovantes.append(pdf_final)
+        execucao.marcar_passo("pdf_comprovante_salvo")
+
+    descartar_log_rede(driver, execucao.rede)
+    protocolo_oficial = extrair_protocolo_oficial(extrair_texto_pagina(driver))
+    if protocolo_oficial:
+        execucao.marcar_passo("protocolo_oficial_identificado")
+    return {
+        "botaoComprovanteAcionado": botao_comprovante,
+        "referenciaTela": referencia_tela,
+        "protocoloOficial": protocolo_oficial,
+        "comprovantes": comprovantes,
+        "htmlComprovante": html_final,
+        "pdfComprovante": pdf_final,
+        "pdfComprovanteMetricas": metricas_pdf,
+    }
+
+
+def _liberar_recursos_fluxo(execucao: ExecucaoFluxo) -> None:
+    sessao = execucao.sessao
+    try:
+        if execucao.driver is None and sessao is not None and not execucao.contexto_isolado:
+            execucao.driver = sessao["driver"]
+        if execucao.driver is not None:
+            if execucao.contexto_isolado:
+                fechar_contexto_isolado(sessao)
+            elif execucao.sessao_reaproveitavel:
+                devolver_sessao_navegador(execucao.chave_sessao, sessao)
+            elif not (
+                execucao.reter_sessao
+                and reter_sessao_retomada(execucao.protocolo, execucao.chave_sessao, sessao)
+            ):
+                fechar_driver(execucao.driver)
+    finally:
+        if execucao.cache is not None:
+            execucao.cache.salvar()
+        if execucao.importacao_futura is not None:
+            execucao.importacao = execucao.importacao or resultado_importacao_certificado(
+                execucao.importacao_futura
+            )
+            liberar_certificado(execucao.repositorio, execucao.cache_cert, execucao.importacao)
 
 
 def executar_fluxo_real(
@@ -725,6 +2829,7 @@ def executar_fluxo_real(
     acesso: Dict[str, str],
     certificado: Dict[str, str],
     fluxo_tjsp: Dict[str, Any],
+    ao_passo: Optional[Callable[[str], None]] = None,
 ) -> Dict[str, Any]:
     arquivo_peticao = texto_limpo(payload.get("arquivo"))
     if not arquivo_peticao:
@@ -732,154 +2837,89 @@ def executar_fluxo_real(
     if not os.path.exists(arquivo_peticao):
         raise RuntimeError("Arquivo da peticao nao encontrado no disco local.")
 
-    protocolo = texto_limpo(payload.get("protocolo")) or f"PROTOCOLO-{int(time.time())}"
-    timeout_login = inteiro_env("PETICIONADOR_TIMEOUT_LOGIN_SEGUNDOS", TIMEOUT_LOGIN_PADRAO_SEGUNDOS)
-    timeout_etapa = inteiro_env("PETICIONADOR_TIMEOUT_ETAPA_SEGUNDOS", TIMEOUT_ETAPA_PADRAO_SEGUNDOS)
-    headless = bool_padrao(os.environ.get("PETICIONADOR_HEADLESS", "0"), False)
-    confirmar_protocolo = bool_padrao(payload.get("confirmarProtocolo"), True)
-    abrir_comp_apos = bool_padrao(os.environ.get("PETICIONADOR_ABRIR_COMPROVANTE", "1"), True)
-
-    importacao = importar_certificado_a1_windows(
-        texto_limpo(certificado.get("arquivo")),
-        texto_limpo(certificado.get("senha")),
-    )
-    thumbprint = texto_limpo(importacao.get("thumbprint"))
-
-    driver = None
-    navegador = ""
-    screenshots: List[str] = []
-    comprovantes: List[str] = []
-    passos: List[str] = []
-    try:
-        driver, navegador = criar_driver_selenium(headless=headless)
-        passos.append(f"navegador:{navegador}")
-        driver.set_page_load_timeout(timeout_etapa)
-        driver.get(acesso["entradaUrl"])
-        passos.append("entrada_aberta")
-        img = salvar_screenshot(driver, protocolo, "01_entrada")
-        if img:
-            screenshots.append(img)
-
-        url_pos_login = aguardar_login(driver, acesso, timeout_login)
-        passos.append("login_concluido")
-        destino = texto_limpo(acesso.get("portalUrl") or acesso.get("serviceUrl"))
-        if destino and not url_pos_login.startswith(destino):
-            driver.get(destino)
-            passos.append("destino_aberto")
-        time.sleep(2)
-        img = salvar_screenshot(driver, protocolo, "02_pos_login")
-        if img:
-            screenshots.append(img)
-
-        perfil_seletores = perfil_seletores_fluxo(acesso, fluxo_tjsp)
-
-        preencher_processo = tentar_preencher_texto(
-            driver,
-            perfil_seletores["numeroProcesso"],
-            texto_limpo(payload.get("numeroProcesso")),
-        )
-        if preencher_processo:
-            passos.append("numero_preenchido")
-
-        preencher_descricao = tentar_preencher_texto(
-            driver,
-            perfil_seletores["descricao"],
-            texto_limpo(payload.get("descricao")),
+    execucao = ExecucaoFluxo(payload, acesso, certificado, fluxo_tjsp, arquivo_peticao, ao_passo)
+    if etapa_alcancada(execucao.ponto, "protocolo"):
+        # Mesmo que a tentativa anterior tenha morrido depois do clique, o portal pode ter aceitado.
+        raise ProtocoloJaAcionado(
+            "O botao de protocolo ja foi acionado numa tentativa anterior deste protocolo; "
+            "confira no portal antes de repetir."
         )
-        if preencher_descricao:
-            passos.append("descricao_preenchida")
-
-        acionou_auxiliar, botao_auxiliar = preparar_formulario_para_upload(driver, fluxo_tjsp)
-        if acionou_auxiliar:
-            passos.append(f"botao_auxiliar:{botao_auxiliar}")
-
-        upload_ok = anexar_arquivo(driver, arquivo_peticao, perfil_seletores["upload"])
-        if upload_ok:
-            passos.append("arquivo_anexado")
-        img = salvar_screenshot(driver, protocolo, "03_formulario")
-        if img:
-            screenshots.append(img)
-
-        if not upload_ok:
-            raise RuntimeError("Nao foi possivel localizar campo de upload para anexar o PDF.")
-
-        clique_ok = False
-        botao = ""
-        botao_comprovante = ""
-        if confirmar_protocolo:
-            clique_ok, botao = clicar_botao_protocolar(driver, fluxo_tjsp)
-            if not clique_ok:
-                raise RuntimeError(
-                    "Nao foi possivel localizar botao de protocolo automaticamente."
-                )
-            passos.append(f"botao_protocolo:{botao}")
-            time.sleep(3)
-            img = salvar_screenshot(driver, protocolo, "04_pos_protocolo")
-            if img:
-                screenshots.append(img)
-
-            if abrir_comp_apos:
-                clicou_comp, botao_comprovante = abrir_comprovante(driver)
-                if clicou_comp:
-                    passos.append(f"botao_comprovante:{botao_comprovante}")
-                    time.sleep(2)
-                    if trocar_para_ultima_aba(driver):
-                        passos.append("aba_comprovante_ativa")
-                    img = salvar_screenshot(driver, protocolo, "05_comprovante")
-                    if img:
-                        screenshots.append(img)
-
-        referencia_tela = extrair_referencia_tela(driver)
-        if referencia_tela:
-            passos.append("referencia_identificada")
-
-        etapa_final = "05_comprovante" if confirmar_protocolo else "04_estado_final"
-        html_final = salvar_html_pagina(driver, protocolo, etapa_final)
-        if html_final:
-            comprovantes.append(html_final)
-            passos.append("html_comprovante_salvo")
-
-        pdf_final = salvar_pdf_pagina(driver, protocolo, etapa_final)
-        if pdf_final:
-            comprovantes.append(pdf_final)
-            passos.append("pdf_comprovante_salvo")
 
-        texto_pagina = extrair_texto_pagina(driver)
-        protocolo_oficial = extrair_protocolo_oficial(texto_pagina)
-        if protocolo_oficial:
-            passos.append("protocolo_oficial_identificado")
-        return {
-            "navegador": navegador,
+    # Tudo que reserva algo (uso do certificado, sessao do pool, navegador) e obtido dentro do try:
+    # o finally libera o que tiver sido obtido, mesmo se a falha for no preparo.
+    try:
+        _preparar_navegador(execucao)
+        retomada = _etapa_login(execucao)
+        formulario, campos_upload = _etapa_formulario(execucao, retomada)
+        _etapa_upload(execucao, retomada, campos_upload)
+        botao = _etapa_protocolo(execucao) if execucao.confirmar_protocolo else ""
+        comprovante = _etapa_comprovante(execucao)
+
+        driver, sessao, perfil_seletores = execucao.driver, execucao.sessao, execucao.perfil_seletores
+        execucao.memoria.append(amostrar_memoria_navegador(sessao, "fim"))
+        sessao["reciclar"] = motivo_reciclagem_navegador(sessao, execucao.memoria[-1]["rssMb"])
+        resultado = {
+            "navegador": execucao.navegador,
+            "sessaoReutilizada": bool(sessao.get("usos")),
+            "contextoIsolado": texto_limpo(sessao.get("contexto")),
             "urlFinal": texto_limpo(driver.current_url),
-            "preencheuNumeroProcesso": preencher_processo,
-            "preencheuDescricao": preencher_descricao,
-            "arquivoAnexado": upload_ok,
-            "confirmarProtocolo": confirmar_protocolo,
-            "cliqueProtocoloEfetuado": clique_ok,
+            **formulario,
+            "arquivoAnexado": True,
+            "confirmarProtocolo": execucao.confirmar_protocolo,
+            "cliqueProtocoloEfetuado": execucao.confirmar_protocolo,
             "botaoAcionado": botao,
-            "botaoComprovanteAcionado": botao_comprovante,
-            "botaoAuxiliarUpload": botao_auxiliar,
-            "referenciaTela": referencia_tela,
-            "protocoloOficial": protocolo_oficial,
+            **comprovante,
             "fluxoTjsp": fluxo_tjsp,
             "perfilSeletores": {
                 "numeroProcesso": perfil_seletores["numeroProcesso"][:10],
                 "descricao": perfil_seletores["descricao"][:10],
                 "upload": perfil_seletores["upload"][:10],
             },
-            "passos": passos,
-            "certificadoImportado": bool(importacao.get("importado")),
-            "screenshots": screenshots,
-            "comprovantes": comprovantes,
-            "htmlComprovante": html_final,
-            "pdfComprovante": pdf_final,
+            "seletoresResolvidos": {
+                papel: seletor for papel, seletor in execucao.seletores_usados.items() if seletor
+            },
+            "passos": execucao.passos,
+            "esperas": execucao.esperas,
+            "cacheSeletores": {papel: valores[:3] for papel, valores in execucao.preferidos.items() if valores},
+            "certificadoImportado": bool(execucao.importacao.get("importado")),
+            "preparo": execucao.preparo,
+            "politicaScreenshots": execucao.capturas.politica,
+            "screenshots": execucao.capturas.salvos,
+            "artefatos": execucao.capturas.artefatos,
+            "perfilEnxuto": bool(execucao.enxuto),
+            "urlsBloqueadas": execucao.urls_bloqueadas,
+            "tiposBloqueados": tipos_bloqueio_perfil(acesso) if execucao.enxuto else [],
+            "rede": execucao.rede,
+            "memoriaNavegador": {"amostras": execucao.memoria, "reciclagem": sessao["reciclar"]},
         }
+        execucao.sessao_reaproveitavel = True
+        if execucao.pontos is not None:
+            execucao.pontos.descartar(execucao.protocolo)
+        return resultado
+    except Exception as error:
+        capturas, ponto_atual = execucao.capturas, execucao.ponto_atual
+        screenshots = capturas.registrar_falha(execucao.driver) if execucao.driver is not None else capturas.salvos
+        execucao.reter_sessao = etapa_alcancada(ponto_atual, "login") and not etapa_alcancada(ponto_atual, "protocolo")
+        if execucao.importacao_futura is not None:
+            # O navegador pode ter falhado antes de a importacao terminar; o erro dela tambem vai no retorno.
+            execucao.importacao = execucao.importacao or resultado_importacao_certificado(execucao.importacao_futura)
+        raise ErroFluxoReal(
+            texto_limpo(error),
+            screenshots,
+            texto_limpo(ponto_atual.get("etapa")),
+            capturas.artefatos,
+            texto_limpo(execucao.importacao.get("erro")),
+        ) from error
     finally:
-        try:
-            if driver is not None:
-                driver.quit()
-        finally:
-            remover_certificado_windows(thumbprint)
+        _liberar_recursos_fluxo(execucao)
+
+
+def status_erro_fluxo_real(error: Exception) -> str:
+    if isinstance(error, ProtocoloJaAcionado):
+        return "protocolo_ja_acionado"
+    if isinstance(error.__cause__, CliqueIncerto):
+        return "clique_incerto"
+    return "erro"
 
 
 def resposta_base(payload: Dict[str, Any], tribunal: str) -> Dict[str, Any]:
@@ -890,7 +2930,27 @@ def resposta_base(payload: Dict[str, Any], tribunal: str) -> Dict[str, Any]:
     }
 
 
-def executar_robo(payload: Dict[str, Any], tribunal: str) -> Dict[str, Any]:
+def executar_robo(
+    payload: Dict[str, Any],
+    tribunal: str,
+    ao_passo: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    with execucao_gravacao() as gravacao:
+        try:
+            resposta = _executar_robo(payload, tribunal, ao_passo)
+        finally:
+            # Screenshots, HTML, PDF e relatorio desta peticao precisam estar no disco antes da resposta sair.
+            falhas_gravacao = gravacao.descarregar()
+    if falhas_gravacao:
+        resposta["artefatosNaoGravados"] = falhas_gravacao
+    return resposta
+
+
+def _executar_robo(
+    payload: Dict[str, Any],
+    tribunal: str,
+    ao_passo: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
     certificado = payload.get("certificado", {})
     if not certificado.get("arquivo") or not certificado.get("senha"):
         return {
@@ -928,7 +2988,8 @@ def executar_robo(payload: Dict[str, Any], tribunal: str) -> Dict[str, Any]:
             "certificadoUsado": os.path.basename(texto_limpo(certificado.get("arquivo"))),
             "protocoladoEm": agora_iso_utc(),
         }
-        caminho_log = salvar_relatorio_execucao(
+        anexar_relatorio_execucao(
+            resposta,
             texto_limpo(payload.get("protocolo")) or "simulado",
             tribunal,
             {
@@ -937,12 +2998,12 @@ def executar_robo(payload: Dict[str, Any], tribunal: str) -> Dict[str, Any]:
                 "resposta": resposta,
             },
         )
-        if caminho_log:
-            resposta["arquivoLogExecucao"] = caminho_log
         return resposta
 
     try:
-        detalhes_execucao = executar_fluxo_real(payload, acesso, certificado, fluxo_tjsp)
+        detalhes_execucao = executar_fluxo_real(payload, acesso, certificado, fluxo_tjsp, ao_passo)
+        if detalhes_execucao.get("perfilEnxuto") and detalhes_execucao["rede"].get("bytesRecebidos"):
+            detalhes_execucao["rede"].update(economia_perfil_enxuto(tribunal, detalhes_execucao["rede"]))
         confirmou = bool(detalhes_execucao.get("confirmarProtocolo"))
         protocolado = bool(detalhes_execucao.get("cliqueProtocoloEfetuado"))
         protocolo_oficial = texto_limpo(detalhes_execucao.get("protocoloOficial"))
@@ -983,7 +3044,8 @@ def executar_robo(payload: Dict[str, Any], tribunal: str) -> Dict[str, Any]:
             "certificadoUsado": os.path.basename(texto_limpo(certificado.get("arquivo"))),
             "protocoladoEm": agora_iso_utc(),
         }
-        caminho_log = salvar_relatorio_execucao(
+        anexar_relatorio_execucao(
+            resposta,
             texto_limpo(payload.get("protocolo")) or "real",
             tribunal,
             {
@@ -992,8 +3054,6 @@ def executar_robo(payload: Dict[str, Any], tribunal: str) -> Dict[str, Any]:
                 "resposta": resposta,
             },
         )
-        if caminho_log:
-            resposta["arquivoLogExecucao"] = caminho_log
         return resposta
     except Exception as error:
         resposta = {
@@ -1004,14 +3064,20 @@ def executar_robo(payload: Dict[str, Any], tribunal: str) -> Dict[str, Any]:
             "canalPeticionamento": canal,
             "acessoUtilizado": acesso,
             "fluxoTjsp": fluxo_tjsp,
-            "statusExecucao": "erro",
+            # Recusa por clique anterior ou clique sem confirmacao nao e falha transiente: nao repetir.
+            "statusExecucao": status_erro_fluxo_real(error),
+            "etapaConcluida": getattr(error, "etapa", "") or None,
+            "erroImportacaoCertificado": getattr(error, "erro_certificado", "") or None,
             "protocoloOficial": None,
             "comprovantes": [],
+            "screenshots": getattr(error, "screenshots", []),
+            "artefatos": getattr(error, "artefatos", []),
             "referencia": f"{tribunal}-{random.randint(100000, 999999)}",
             "certificadoUsado": os.path.basename(texto_limpo(certificado.get("arquivo"))),
             "protocoladoEm": agora_iso_utc(),
         }
-        caminho_log = salvar_relatorio_execucao(
+        anexar_relatorio_execucao(
+            resposta,
             texto_limpo(payload.get("protocolo")) or "erro",
             tribunal,
             {
@@ -1021,6 +3087,4 @@ def executar_robo(payload: Dict[str, Any], tribunal: str) -> Dict[str, Any]:
                 "resposta": resposta,
             },
         )
-        if caminho_log:
-            resposta["arquivoLogExecucao"] = caminho_log
         return resposta
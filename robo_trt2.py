@@ -23,23 +23,20 @@ def carregar_payload() -> dict:
         return {}
 
 
-def main() -> None:
-    payload = carregar_payload()
+def executar(payload: dict) -> dict:
     certificado = payload.get("certificado", {})
 
     if not certificado.get("arquivo") or not certificado.get("senha"):
-        resposta = {
+        return {
             "ok": False,
             "tribunal": TRIBUNAL,
             "mensagem": "Certificado A1 nao informado no payload.",
         }
-        print(json.dumps(resposta, ensure_ascii=True))
-        sys.exit(0)
 
     time.sleep(0.25)
     referencia = f"{TRIBUNAL}-{random.randint(100000, 999999)}"
 
-    resposta = {
+    return {
         "ok": True,
         "tribunal": TRIBUNAL,
         "protocolo": payload.get("protocolo"),
@@ -49,6 +46,11 @@ def main() -> None:
         "certificadoUsado": os.path.basename(certificado.get("arquivo", "")),
         "protocoladoEm": datetime.utcnow().isoformat() + "Z",
     }
+
+
+def main() -> None:
+    payload = carregar_payload()
+    resposta = executar(payload)
     print(json.dumps(resposta, ensure_ascii=True))
 
 
@@ -0,0 +1,113 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, IO, Optional
+
+import robo_tjsp
+import robo_tjsp2
+import robo_trf3
+import robo_trt2
+from robo_tjsp_base import SESSOES_NAVEGADOR, agora_iso_utc, executar_robo, texto_limpo
+
+
+AoPasso = Optional[Callable[[str], None]]
+ROBOS_POR_TRIBUNAL: Dict[str, Callable[[Dict[str, Any], AoPasso], Dict[str, Any]]] = {
+    "tjsp": lambda payload, ao_passo=None: executar_robo(payload, robo_tjsp.TRIBUNAL, ao_passo),
+    "tjsp2": lambda payload, ao_passo=None: executar_robo(payload, robo_tjsp2.TRIBUNAL, ao_passo),
+    # TRF3 e TRT2 so simulam: nao ha passos de portal para registrar.
+    "trf3": lambda payload, ao_passo=None: robo_trf3.executar(payload),
+    "trt2": lambda payload, ao_passo=None: robo_trt2.executar(payload),
+}
+ESTADO_WORKER: Dict[str, Any] = {
+    "iniciadoEm": agora_iso_utc(),
+    "requisicoesAtendidas": 0,
+}
+
+
+def executar_payload(
+    payload: Dict[str, Any],
+    redirecionar_saida: bool = True,
+    ao_passo: AoPasso = None,
+) -> Dict[str, Any]:
+    tribunal = texto_limpo(payload.get("tribunal")).lower()
+    robo = ROBOS_POR_TRIBUNAL.get(tribunal)
+    if robo is None:
+        return {
+            "ok": False,
+            "tribunal": payload.get("tribunal"),
+            "protocolo": payload.get("protocolo"),
+            "mensagem": "Tribunal invalido no payload do worker. Use: tjsp, tjsp2, trf3 ou trt2.",
+        }
+
+    try:
+        # Qualquer print acidental dos robos iria corromper o protocolo JSON-lines.
+        # Quem executa em varias threads redireciona uma vez so (redirect_stdout nao e por thread).
+        if not redirecionar_saida:
+            return robo(payload, ao_passo)
+        with contextlib.redirect_stdout(sys.stderr):
+            return robo(payload, ao_passo)
+    except Exception as error:
+        return {
+            "ok": False,
+            "tribunal": payload.get("tribunal"),
+            "protocolo": payload.get("protocolo"),
+            "mensagem": f"Falha inesperada no worker do robo: {texto_limpo(error)}",
+        }
+
+
+def processar_linha(linha: str) -> Optional[Dict[str, Any]]:
+    try:
+        mensagem = json.loads(linha)
+    except json.JSONDecodeError:
+        return {"ok": False, "mensagem": "Linha recebida nao e um JSON valido."}
+    if not isinstance(mensagem, dict):
+        return {"ok": False, "mensagem": "Linha recebida nao e um objeto JSON."}
+
+    requisicao_id = mensagem.pop("requisicaoId", None)
+    comando = texto_limpo(mensagem.get("comando")).lower()
+    if comando == "encerrar":
+        return None
+    if comando == "ping":
+        resposta = {
+            "ok": True,
+            "pong": True,
+            **ESTADO_WORKER,
+            "sessoesNavegador": sum(len(livres) for livres in SESSOES_NAVEGADOR.values()),
+        }
+    else:
+        inicio = time.perf_counter()
+        resposta = executar_payload(mensagem)
+        ESTADO_WORKER["requisicoesAtendidas"] += 1
+        resposta["duracaoWorkerMs"] = round((time.perf_counter() - inicio) * 1000, 1)
+
+    if requisicao_id is not None:
+        resposta["requisicaoId"] = requisicao_id
+    return resposta
+
+
+def atender_fluxo(entrada: IO[str], saida: IO[str]) -> None:
+    for linha in entrada:
+        linha = linha.strip()
+        if not linha:
+            continue
+        resposta = processar_linha(linha)
+        if resposta is None:
+            return
+        saida.write(json.dumps(resposta, ensure_ascii=True) + "\n")
+        saida.flush()
+
+
+def main() -> None:
+    # So stdin/stdout: os payloads trazem a senha do certificado e disparam protocolos reais,
+    # entao nenhum outro processo da maquina pode falar com o worker.
+    argparse.ArgumentParser(description="Worker persistente dos robos (JSON-lines em stdin/stdout).").parse_args()
+    # Processo longo: vale manter navegadores autenticados entre as peticoes.
+    os.environ.setdefault("PETICIONADOR_POOL_SESSOES", "1")
+    atender_fluxo(sys.stdin, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+
+# Os robos sao modulos soltos na raiz do projeto, sem pacote instalavel.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,29 @@
+const assert = require("node:assert");
+const test = require("node:test");
+
+const { deveRepetirFalha, falhaPeticaoInterrompida } = require("../enviar_multitribunal");
+
+const payload = { tribunal: "tjsp", protocolo: "P1" };
+
+test("falha transiente do robo pode ser repetida", () => {
+  assert.strictEqual(deveRepetirFalha({ ok: false, statusExecucao: "erro", mensagem: "timeout" }), true);
+});
+
+test("worker interrompido com a peticao despachada nao repete", () => {
+  const resposta = falhaPeticaoInterrompida(payload, new Error("Timeout ao executar: robo_worker.py"));
+  assert.strictEqual(resposta.statusExecucao, "conferir");
+  assert.strictEqual(deveRepetirFalha(resposta), false);
+});
+
+test("clique no protocolo ja feito ou incerto nao repete", () => {
+  for (const statusExecucao of ["protocolo_ja_acionado", "clique_incerto", "CONFERIR"]) {
+    assert.strictEqual(deveRepetirFalha({ ok: false, statusExecucao, mensagem: "qualquer" }), false);
+  }
+});
+
+test("falha definitiva pela mensagem continua sem repeticao", () => {
+  assert.strictEqual(
+    deveRepetirFalha({ ok: false, statusExecucao: "erro", mensagem: "Arquivo da peticao nao encontrado." }),
+    false
+  );
+});
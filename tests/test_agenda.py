@@ -0,0 +1,88 @@
+import unittest
+from typing import Any, Dict
+
+from robo_agenda import SEM_PRAZO, duracao_restante, estimar_duracoes, prever_conclusoes
+
+AGORA = 1_800_000_000.0
+
+
+def pendente(trabalho_id: int, prazo: float = SEM_PRAZO, disponivel_em: float = 0.0) -> Dict[str, Any]:
+    return {"id": trabalho_id, "prazo": prazo, "disponivelEm": disponivel_em, "chave": "tjsp|real"}
+
+
+class EstimarDuracoesTest(unittest.TestCase):
+    def test_mediana_por_chave_e_por_passo(self) -> None:
+        estimativas = estimar_duracoes(
+            [("tjsp|real", 100.0), ("tjsp|real", 300.0), ("tjsp|real", 3600.0), ("trf3|real", 50.0)],
+            [("tjsp|real", "login_concluido", 30.0), ("tjsp|real", "botao_protocolo:Protocolar", 200.0)],
+        )
+        # Um login travado ate o timeout (3600 s) nao arrasta a previsao.
+        self.assertEqual(estimativas["total"], {"tjsp|real": 300.0, "trf3|real": 50.0})
+        self.assertEqual(estimativas["passos"][("tjsp|real", "botao_protocolo")], 200.0)
+
+
+class DuracaoRestanteTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.estimativas = {"total": {"tjsp|real": 300.0}, "passos": {("tjsp|real", "login_concluido"): 60.0}}
+
+    def test_pelo_passo_alcancado_e_nao_pelo_relogio(self) -> None:
+        self.assertEqual(duracao_restante(self.estimativas, "tjsp|real", "login_concluido", 250.0), 240.0)
+        self.assertEqual(duracao_restante(self.estimativas, "tjsp|real", "", 250.0), 300.0)
+
+    def test_passo_sem_historico_usa_o_tempo_decorrido(self) -> None:
+        self.assertEqual(duracao_restante(self.estimativas, "tjsp|real", "arquivo_anexado", 100.0), 200.0)
+        self.assertEqual(duracao_restante(self.estimativas, "tjsp|real", "arquivo_anexado", 900.0), 0.0)
+
+    def test_chave_sem_historico_usa_a_duracao_padrao(self) -> None:
+        self.assertEqual(duracao_restante(self.estimativas, "trf3|real", "", 0.0), 240.0)
+        self.assertEqual(duracao_restante(self.estimativas, "trf3|simulado", "", 0.0), 1.0)
+
+
+class PreverConclusoesTest(unittest.TestCase):
+    estimativas = {"total": {"tjsp|real": 100.0}, "passos": {}}
+
+    def test_termino_previsto_em_fila_edf(self) -> None:
+        pendentes = [pendente(1), pendente(2, AGORA + 1000), pendente(3, AGORA + 500)]
+
+        previsoes = prever_conclusoes([], pendentes, self.estimativas, paralelo=1, agora=AGORA)
+
+        self.assertEqual([item["id"] for item in previsoes], [3, 2, 1])
+        self.assertEqual(
+            [(item["inicioPrevisto"], item["terminoPrevisto"]) for item in previsoes],
+            [(AGORA, AGORA + 100), (AGORA + 100, AGORA + 200), (AGORA + 200, AGORA + 300)],
+        )
+        self.assertEqual([item["folgaSegundos"] for item in previsoes], [400.0, 800.0, None])
+        self.assertFalse(any(item["emRisco"] for item in previsoes))
+
+    def test_aponta_quem_perde_o_prazo(self) -> None:
+        pendentes = [pendente(1, AGORA + 150), pendente(2, AGORA + 150), pendente(3, AGORA + 150)]
+
+        previsoes = prever_conclusoes([], pendentes, self.estimativas, paralelo=1, agora=AGORA)
+
+        self.assertEqual([item["emRisco"] for item in previsoes], [False, True, True])
+        self.assertEqual([item["folgaSegundos"] for item in previsoes], [50.0, -50.0, -150.0])
+
+        # Com dois robos, o segundo ja cabe no prazo.
+        previsoes = prever_conclusoes([], pendentes, self.estimativas, paralelo=2, agora=AGORA)
+        self.assertEqual([item["emRisco"] for item in previsoes], [False, False, True])
+
+    def test_trabalhos_em_execucao_ocupam_os_robos(self) -> None:
+        previsoes = prever_conclusoes(
+            [{"restante": 30.0}, {"restante": 80.0}],
+            [pendente(1), pendente(2)],
+            self.estimativas,
+            paralelo=2,
+            agora=AGORA,
+        )
+        self.assertEqual([item["terminoPrevisto"] for item in previsoes], [AGORA + 130, AGORA + 180])
+
+    def test_espera_de_repeticao_atrasa_o_inicio(self) -> None:
+        previsoes = prever_conclusoes(
+            [], [pendente(1, AGORA + 200, disponivel_em=AGORA + 150)], self.estimativas, paralelo=1, agora=AGORA
+        )
+        self.assertEqual(previsoes[0]["inicioPrevisto"], AGORA + 150)
+        self.assertTrue(previsoes[0]["emRisco"])
+
+
+if __name__ == "__main__":
+    unittest.main()
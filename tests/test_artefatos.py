@@ -0,0 +1,175 @@
+import gzip
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from unittest import mock
+
+import robo_artefatos
+from robo_artefatos import ArmazemConteudo, GravadorArtefatos, execucao_gravacao
+
+
+def relatorio_com(*guardados: Dict[str, Any]) -> Dict[str, Any]:
+    artefatos = [{"etapa": "captura", "hash": item["hash"], "caminho": item["caminho"]} for item in guardados]
+    return {"resposta": {"detalhesExecucao": {"artefatos": artefatos}}}
+
+
+class ArmazemConteudoTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+        self.armazem = ArmazemConteudo(self.pasta)
+
+    def test_conteudo_igual_e_gravado_uma_vez(self) -> None:
+        primeiro = self.armazem.guardar(b"tela-sso", "png")
+        segundo = self.armazem.guardar(b"tela-sso", "png")
+        outro = self.armazem.guardar(b"formulario", "png")
+
+        self.assertTrue(primeiro["novo"])
+        self.assertFalse(segundo["novo"])
+        self.assertEqual(primeiro["caminho"], segundo["caminho"])
+        self.assertNotEqual(primeiro["hash"], outro["hash"])
+        self.assertEqual(len(list(self.pasta.glob("??/*"))), 2)
+        self.assertEqual(self.armazem.abrir(primeiro["hash"]), b"tela-sso")
+
+    def test_comprimido_volta_descomprimido(self) -> None:
+        guardado = self.armazem.guardar("<html>recibo</html>", "html", comprimir=True)
+        self.assertTrue(guardado["caminho"].endswith(".html.gz"))
+        self.assertEqual(gzip.decompress(Path(guardado["caminho"]).read_bytes()), b"<html>recibo</html>")
+        self.assertEqual(self.armazem.abrir(guardado["hash"]), b"<html>recibo</html>")
+
+    def test_liberar_relatorio_so_apaga_sem_outras_referencias(self) -> None:
+        compartilhada = self.armazem.guardar(b"tela-sso", "png")
+        self.armazem.guardar(b"tela-sso", "png")
+        exclusiva = self.armazem.guardar(b"comprovante", "png")
+
+        self.assertEqual(self.armazem.liberar_relatorio(relatorio_com(compartilhada, exclusiva)), 1)
+        self.assertTrue(Path(compartilhada["caminho"]).exists())
+        self.assertFalse(Path(exclusiva["caminho"]).exists())
+        with self.assertRaises(KeyError):
+            self.armazem.abrir(exclusiva["hash"])
+
+        self.assertEqual(self.armazem.liberar_relatorio(relatorio_com(compartilhada)), 1)
+        self.assertFalse(Path(compartilhada["caminho"]).exists())
+        self.assertFalse(self.armazem.liberar(compartilhada["hash"]))
+
+    def test_referencia_so_conta_depois_da_gravacao(self) -> None:
+        adiados: List[Callable[[], None]] = []
+
+        def gravar(arquivo: Path, dados: bytes, ao_gravar: Callable[[], None]) -> str:
+            arquivo.write_bytes(dados)
+            adiados.append(ao_gravar)
+            return str(arquivo)
+
+        guardado = self.armazem.guardar(b"tela", "png", gravar=gravar)
+        with self.assertRaises(KeyError):
+            self.armazem.abrir(guardado["hash"])
+        adiados.pop()()
+        self.assertEqual(self.armazem.abrir(guardado["hash"]), b"tela")
+
+    def test_limpar_orfaos(self) -> None:
+        registrado = self.armazem.guardar(b"registrado", "png")
+        sumido = self.armazem.guardar(b"sumido", "png")
+        Path(sumido["caminho"]).unlink()
+        orfao = self.pasta / "ab" / "orfao.png"
+        orfao.parent.mkdir(exist_ok=True)
+        orfao.write_bytes(b"orfao")
+        antigo = time.time() - 7200
+        os.utime(orfao, (antigo, antigo))
+        recente = self.pasta / "ab" / "gravando.png.tmp"
+        recente.write_bytes(b"em andamento")
+
+        self.assertEqual(self.armazem.limpar_orfaos(), {"arquivosApagados": 1, "registrosSemArquivo": 1})
+
+        self.assertFalse(orfao.exists())
+        self.assertTrue(recente.exists())
+        self.assertTrue(Path(registrado["caminho"]).exists())
+        with self.assertRaises(KeyError):
+            self.armazem.abrir(sumido["hash"])
+        self.assertTrue(self.armazem.guardar(b"sumido", "png")["novo"])
+
+
+class GravadorArtefatosTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+        self.gravador = GravadorArtefatos(threads=2, max_pendentes=4)
+        self.addCleanup(self.gravador.encerrar)
+
+    def test_descarregar_espera_so_a_propria_execucao(self) -> None:
+        liberar_lenta = threading.Event()
+        gravar_original = robo_artefatos.gravar_arquivo_duravel
+
+        def gravar(arquivo: Path, dados: Any) -> None:
+            if arquivo.name == "lenta.png":
+                liberar_lenta.wait(5)
+            gravar_original(arquivo, dados)
+
+        resultado: Dict[str, Any] = {}
+
+        def execucao_lenta() -> None:
+            with execucao_gravacao() as gravacao:
+                self.gravador.gravar(self.pasta / "lenta.png", b"lenta")
+                resultado["lenta"] = gravacao.descarregar()
+
+        with mock.patch("robo_artefatos.gravar_arquivo_duravel", side_effect=gravar):
+            outra = threading.Thread(target=execucao_lenta)
+            outra.start()
+            with execucao_gravacao() as gravacao:
+                self.gravador.gravar(self.pasta / "rapida.png", b"rapida")
+                self.assertEqual(gravacao.descarregar(), [])
+            # A execucao rapida terminou com a gravacao da outra ainda presa.
+            self.assertTrue((self.pasta / "rapida.png").exists())
+            self.assertFalse((self.pasta / "lenta.png").exists())
+            liberar_lenta.set()
+            outra.join(5)
+
+        self.assertEqual(resultado["lenta"], [])
+        self.assertTrue((self.pasta / "lenta.png").exists())
+
+    def test_falha_volta_so_para_a_execucao_que_gravou(self) -> None:
+        registrados: List[str] = []
+        with execucao_gravacao() as gravacao:
+            self.gravador.gravar(self.pasta / "sem-pasta" / "falha.png", b"x")
+            self.gravador.gravar(self.pasta / "ok.png", b"x", lambda: registrados.append("ok"))
+            self.gravador.gravar(self.pasta / "ok2.png", b"x", lambda: 1 / 0)
+            falhas = gravacao.descarregar()
+            self.assertEqual(gravacao.descarregar(), [])
+        with execucao_gravacao() as outra:
+            self.assertEqual(outra.descarregar(), [])
+
+        self.assertEqual(sorted(Path(falha).name for falha in falhas), ["falha.png", "ok2.png"])
+        self.assertEqual(registrados, ["ok"])
+
+    def test_fila_cheia_bloqueia_o_fluxo(self) -> None:
+        gravador = GravadorArtefatos(threads=1, max_pendentes=1)
+        self.addCleanup(gravador.encerrar)
+        liberar = threading.Event()
+        gravar_original = robo_artefatos.gravar_arquivo_duravel
+
+        def gravar(arquivo: Path, dados: Any) -> None:
+            liberar.wait(5)
+            gravar_original(arquivo, dados)
+
+        segunda = threading.Event()
+        with mock.patch("robo_artefatos.gravar_arquivo_duravel", side_effect=gravar):
+            gravador.gravar(self.pasta / "a.png", b"a")
+            thread = threading.Thread(
+                target=lambda: (gravador.gravar(self.pasta / "b.png", b"b"), segunda.set())
+            )
+            thread.start()
+            self.assertFalse(segunda.wait(0.2))
+            liberar.set()
+            self.assertTrue(segunda.wait(5))
+            thread.join(5)
+            gravador.encerrar()
+        self.assertTrue((self.pasta / "b.png").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+import hashlib
+import multiprocessing
+import tempfile
+import time
+import unittest
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict
+from unittest import mock
+
+import robo_certificados
+from robo_certificados import CacheCertificados
+from robo_tjsp_base import (
+    RepositorioCertificados,
+    executor_importacao_certificado,
+    iniciar_importacao_certificado,
+    resultado_importacao_certificado,
+)
+
+
+class RepositorioArquivos(RepositorioCertificados):
+    # Como o CurrentUser\My, o que um processo importa os outros enxergam.
+    nome = "arquivos"
+
+    def __init__(self, pasta: Path) -> None:
+        self.pasta = Path(pasta)
+        self.importacoes = 0
+        self.remocoes = 0
+
+    def importar(self, caminho_arquivo: str, senha: str) -> Dict[str, Any]:
+        thumbprint = hashlib.sha1(Path(caminho_arquivo).read_bytes()).hexdigest().upper()
+        (self.pasta / thumbprint).write_text(caminho_arquivo, encoding="utf-8")
+        self.importacoes += 1
+        return {"importado": True, "thumbprint": thumbprint}
+
+    def presente(self, thumbprint: str) -> bool:
+        return (self.pasta / thumbprint).exists()
+
+    def remover(self, thumbprint: str) -> None:
+        (self.pasta / thumbprint).unlink(missing_ok=True)
+        self.remocoes += 1
+
+
+class RepositorioRecusa(RepositorioArquivos):
+    def importar(self, caminho_arquivo: str, senha: str) -> Dict[str, Any]:
+        raise RuntimeError("senha incorreta")
+
+
+def _adquirir_em_outro_processo(banco: str, repositorio: str, pfx: str) -> None:
+    # Robo de outro processo que morre sem liberar o uso.
+    CacheCertificados(Path(banco)).adquirir(RepositorioArquivos(Path(repositorio)), pfx, "senha")
+
+
+class CacheCertificadosTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+        (self.pasta / "repositorio").mkdir()
+        self.banco = self.pasta / "certificados.sqlite3"
+        self.pfx = self.pasta / "certificado.pfx"
+        self.pfx.write_bytes(b"conteudo do pfx")
+        self.repositorio = RepositorioArquivos(self.pasta / "repositorio")
+
+    def test_reaproveita_certificado_ja_importado(self) -> None:
+        cache = CacheCertificados(self.banco)
+        primeiro = cache.adquirir(self.repositorio, str(self.pfx), "senha")
+        segundo = cache.adquirir(self.repositorio, str(self.pfx), "senha")
+
+        self.assertFalse(primeiro["reaproveitado"])
+        self.assertTrue(segundo["reaproveitado"])
+        self.assertEqual(segundo["thumbprint"], primeiro["thumbprint"])
+        self.assertEqual(self.repositorio.importacoes, 1)
+        self.assertEqual(cache.usos_ativos(str(self.pfx)), 2)
+
+    def test_reimporta_quando_o_certificado_sumiu_do_repositorio(self) -> None:
+        cache = CacheCertificados(self.banco)
+        primeiro = cache.adquirir(self.repositorio, str(self.pfx), "senha")
+        self.repositorio.remover(primeiro["thumbprint"])
+
+        segundo = cache.adquirir(self.repositorio, str(self.pfx), "senha")
+
+        self.assertFalse(segundo["reaproveitado"])
+        self.assertEqual(self.repositorio.importacoes, 2)
+
+    def test_so_o_ultimo_uso_remove(self) -> None:
+        cache = CacheCertificados(self.banco)
+        primeiro = cache.adquirir(self.repositorio, str(self.pfx), "senha")
+        segundo = cache.adquirir(self.repositorio, str(self.pfx), "senha")
+
+        self.assertFalse(cache.liberar(self.repositorio, primeiro["uso"], True))
+        self.assertTrue(self.repositorio.presente(primeiro["thumbprint"]))
+        self.assertTrue(cache.liberar(self.repositorio, segundo["uso"], True))
+        self.assertFalse(self.repositorio.presente(primeiro["thumbprint"]))
+        self.assertFalse(cache.liberar(self.repositorio, segundo["uso"], True))
+
+    def test_sem_remocao_habilitada_mantem_o_certificado(self) -> None:
+        cache = CacheCertificados(self.banco)
+        uso = cache.adquirir(self.repositorio, str(self.pfx), "senha")
+
+        self.assertFalse(cache.liberar(self.repositorio, uso["uso"], False))
+        self.assertEqual(self.repositorio.remocoes, 0)
+        self.assertEqual(cache.usos_ativos(str(self.pfx)), 0)
+
+    def test_falha_na_importacao_nao_registra_uso(self) -> None:
+        cache = CacheCertificados(self.banco)
+        repositorio = RepositorioRecusa(self.pasta / "repositorio")
+
+        with self.assertRaisesRegex(RuntimeError, "senha incorreta"):
+            cache.adquirir(repositorio, str(self.pfx), "senha")
+        self.assertEqual(cache.usos_ativos(str(self.pfx)), 0)
+
+    def test_uso_de_outro_processo_impede_remocao(self) -> None:
+        contexto = multiprocessing.get_context("spawn")
+        processo = contexto.Process(
+            target=_adquirir_em_outro_processo,
+            args=(str(self.banco), str(self.pasta / "repositorio"), str(self.pfx)),
+        )
+        processo.start()
+        processo.join(60)
+        self.assertEqual(processo.exitcode, 0)
+
+        cache = CacheCertificados(self.banco)
+        uso = cache.adquirir(self.repositorio, str(self.pfx), "senha")
+        self.assertTrue(uso["reaproveitado"])
+        self.assertEqual(self.repositorio.importacoes, 0)
+
+        self.assertFalse(cache.liberar(self.repositorio, uso["uso"], True))
+        self.assertTrue(self.repositorio.presente(uso["thumbprint"]))
+
+    def test_uso_vencido_de_robo_morto_e_descartado(self) -> None:
+        cache = CacheCertificados(self.banco, validade_uso_segundos=60)
+        esquecido = cache.adquirir(self.repositorio, str(self.pfx), "senha")
+
+        agora = time.time()
+        with mock.patch.object(robo_certificados.time, "time", return_value=agora + 61):
+            uso = cache.adquirir(self.repositorio, str(self.pfx), "senha")
+            self.assertEqual(cache.usos_ativos(str(self.pfx)), 1)
+            self.assertTrue(cache.liberar(self.repositorio, uso["uso"], True))
+
+        self.assertFalse(self.repositorio.presente(esquecido["thumbprint"]))
+        self.assertFalse(cache.liberar(self.repositorio, esquecido["uso"], True))
+
+
+class ImportacaoCertificadoTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+        self.pfx = self.pasta / "certificado.pfx"
+        self.pfx.write_bytes(b"conteudo do pfx")
+
+    def test_importacoes_usam_o_mesmo_executor(self) -> None:
+        self.assertIs(executor_importacao_certificado(), executor_importacao_certificado())
+        repositorio = RepositorioArquivos(self.pasta)
+        certificado = {"arquivo": str(self.pfx), "senha": "senha"}
+
+        resultados = [iniciar_importacao_certificado(repositorio, certificado).result(5) for _ in range(3)]
+
+        self.assertTrue(all(resultado["importado"] for resultado in resultados))
+        self.assertEqual(repositorio.importacoes, 3)
+
+    def test_falha_da_importacao_volta_como_erro(self) -> None:
+        futuro = iniciar_importacao_certificado(
+            RepositorioRecusa(self.pasta), {"arquivo": str(self.pfx), "senha": "x"}
+        )
+
+        with self.assertRaisesRegex(RuntimeError, "senha incorreta"):
+            futuro.result(5)
+        resultado = resultado_importacao_certificado(futuro)
+        self.assertFalse(resultado["importado"])
+        self.assertEqual(resultado["erro"], "senha incorreta")
+
+    def test_resultado_sem_falha_passa_direto(self) -> None:
+        futuro: Future = Future()
+        futuro.set_result({"importado": True, "thumbprint": "AB"})
+
+        self.assertEqual(resultado_importacao_certificado(futuro), {"importado": True, "thumbprint": "AB"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import robo_tjsp_base
+from robo_cache_seletores import CacheSeletores
+from robo_tjsp_base import campo_resolvido, tentar_preencher_texto
+
+
+class ElementoFalso:
+    def __init__(self, aceita: bool = True) -> None:
+        self.aceita = aceita
+        self.valor = ""
+
+    def is_enabled(self) -> bool:
+        return True
+
+    def clear(self) -> None:
+        if not self.aceita:
+            raise RuntimeError("elemento obsoleto")
+
+    def send_keys(self, valor: str) -> None:
+        self.valor = valor
+
+
+class CacheSeletoresTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+        self.arquivo = self.pasta / "seletores_aprendidos.json"
+
+    def test_uso_penaliza_preferidos_que_falharam_antes_do_vencedor(self) -> None:
+        cache = CacheSeletores(self.arquivo, limite_falhas_seguidas=1)
+        chave = CacheSeletores.chave("esaj.tjsp.jus.br", "esaj", "descricao")
+        cache.registrar(chave, "#antigo", True)
+        cache.registrar(chave, "#novo", True)
+
+        cache.registrar_uso(chave, ["#antigo", "#novo"], "#novo")
+
+        self.assertEqual(cache.preferidos(chave), ["#novo"])
+
+    def test_salvar_em_paralelo_junta_o_que_cada_instancia_aprendeu(self) -> None:
+        caches = [CacheSeletores(self.arquivo) for _ in range(8)]
+        erros = []
+
+        def salvar(indice: int, cache: CacheSeletores) -> None:
+            try:
+                for _ in range(20):
+                    cache.registrar("host||upload", f"#campo{indice}", True)
+                    cache.salvar()
+            except Exception as error:
+                erros.append(error)
+
+        threads = [threading.Thread(target=salvar, args=item) for item in enumerate(caches)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(erros, [])
+        self.assertEqual(list(self.pasta.glob("*.tmp")), [])
+        gravado = json.loads(self.arquivo.read_text(encoding="utf-8"))["host||upload"]
+        self.assertEqual(
+            {valor: info["acertos"] for valor, info in gravado.items()},
+            {f"#campo{indice}": 20 for indice in range(8)},
+        )
+        self.assertEqual(len(CacheSeletores(self.arquivo).preferidos("host||upload")), 8)
+
+    def test_salvar_nao_apaga_o_que_outro_worker_gravou(self) -> None:
+        chave = CacheSeletores.chave("eproc1g.tjsp.jus.br", "eproc", "upload")
+        primeiro = CacheSeletores(self.arquivo, limite_falhas_seguidas=1)
+        segundo = CacheSeletores(self.arquivo, limite_falhas_seguidas=1)
+        primeiro.registrar(chave, "#arquivo", True)
+        segundo.registrar(chave, "#anexo", True)
+        segundo.registrar(chave, "#arquivo", False)
+
+        primeiro.salvar()
+        segundo.salvar()
+
+        gravado = json.loads(self.arquivo.read_text(encoding="utf-8"))[chave]
+        self.assertEqual(gravado["#arquivo"]["acertos"], 1)
+        self.assertEqual(gravado["#arquivo"]["falhas"], 1)
+        self.assertEqual(gravado["#anexo"]["acertos"], 1)
+        # Depois de salvar, o segundo ve o aprendizado do primeiro (e a falha que ele mesmo viu).
+        self.assertEqual(segundo.preferidos(chave), ["#anexo"])
+        primeiro.salvar()
+        self.assertEqual(json.loads(self.arquivo.read_text(encoding="utf-8"))[chave], gravado)
+
+    def test_falha_ao_gravar_guarda_o_aprendizado_para_a_proxima(self) -> None:
+        cache = CacheSeletores(self.arquivo)
+        cache.registrar("host||upload", "#campo", True)
+        with mock.patch("robo_cache_seletores.os.replace", side_effect=OSError("disco cheio")):
+            cache.salvar()
+        self.assertFalse(self.arquivo.exists())
+        cache.registrar("host||upload", "#campo", True)
+        cache.salvar()
+        self.assertEqual(json.loads(self.arquivo.read_text(encoding="utf-8"))["host||upload"]["#campo"]["acertos"], 2)
+
+
+class CacheSeletoresPorPastaTest(unittest.TestCase):
+    def test_um_cache_por_pasta_de_dados(self) -> None:
+        caches = []
+        for _ in range(2):
+            pasta = tempfile.TemporaryDirectory()
+            self.addCleanup(pasta.cleanup)
+            with mock.patch.dict("os.environ", {"PETICIONADOR_DATA_DIR": pasta.name}):
+                caches.append(robo_tjsp_base.cache_seletores())
+                self.assertIs(robo_tjsp_base.cache_seletores(), caches[-1])
+        self.assertIsNot(caches[0], caches[1])
+
+
+class SeletorUsadoTest(unittest.TestCase):
+    def test_lista_comeca_pelo_seletor_resolvido(self) -> None:
+        elemento = ElementoFalso()
+        campos = {"descricao": {"elemento": elemento, "seletor": "#b"}}
+
+        self.assertEqual(
+            campo_resolvido(campos, {"descricao": ["#a", "#b", "#c"]}, "descricao"), (elemento, ["#b", "#c"])
+        )
+        self.assertEqual(campo_resolvido(campos, {"descricao": ["#a"]}, "descricao"), (elemento, ["#b", "#a"]))
+        self.assertEqual(campo_resolvido(None, {"descricao": ["#a"]}, "descricao"), (None, ["#a"]))
+
+    def test_preenchimento_devolve_o_seletor_que_funcionou(self) -> None:
+        elemento = ElementoFalso()
+
+        self.assertEqual(tentar_preencher_texto(None, ["#b", "#c"], "texto", elemento), (True, "#b"))
+        self.assertEqual(elemento.valor, "texto")
+        self.assertEqual(tentar_preencher_texto(None, ["#b"], "", elemento), (False, ""))
+
+    def test_varredura_devolve_o_seletor_alternativo(self) -> None:
+        alternativo = ElementoFalso()
+
+        class Driver:
+            def find_elements(self, por: str, seletor: str) -> list:
+                self.por = por
+                return [alternativo] if seletor == "#c" else []
+
+        driver = Driver()
+        resultado = tentar_preencher_texto(driver, ["#b", "#c"], "texto", ElementoFalso(aceita=False))
+
+        self.assertEqual(resultado, (True, "#c"))
+        self.assertEqual(driver.por, "css selector")
+
+
+if __name__ == "__main__":
+    unittest.main()
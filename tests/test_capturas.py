@@ -0,0 +1,94 @@
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+from unittest import mock
+
+from robo_tjsp_base import CapturasExecucao, normalizar_politica_screenshot
+
+
+class DriverTelas:
+    def __init__(self) -> None:
+        self.telas = 0
+
+    def get_screenshot_as_png(self) -> bytes:
+        self.telas += 1
+        return f"png-{self.telas}".encode("ascii")
+
+
+class PoliticaScreenshotTest(unittest.TestCase):
+    def politica(self, **ambiente: str) -> str:
+        with mock.patch.dict("os.environ", ambiente):
+            return normalizar_politica_screenshot()
+
+    def test_valores_validos_e_padrao(self) -> None:
+        self.assertEqual(self.politica(PETICIONADOR_SCREENSHOTS="falha"), "falha")
+        self.assertEqual(self.politica(PETICIONADOR_SCREENSHOTS=" SEMPRE "), "sempre")
+        self.assertEqual(self.politica(PETICIONADOR_SCREENSHOTS="nunca"), "sempre")
+
+    def test_amostrado_sorteia_entre_sempre_e_falha(self) -> None:
+        with mock.patch("robo_tjsp_base.random.random", return_value=0.05):
+            self.assertEqual(self.politica(PETICIONADOR_SCREENSHOTS="amostrado"), "sempre")
+            self.assertEqual(
+                self.politica(PETICIONADOR_SCREENSHOTS="amostrado", PETICIONADOR_SCREENSHOTS_AMOSTRA="0.01"), "falha"
+            )
+        with mock.patch("robo_tjsp_base.random.random", return_value=0.5):
+            self.assertEqual(
+                self.politica(PETICIONADOR_SCREENSHOTS="amostrado", PETICIONADOR_SCREENSHOTS_AMOSTRA="x"), "falha"
+            )
+
+
+class CapturasExecucaoTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        ambiente = mock.patch.dict(
+            "os.environ",
+            {
+                "PETICIONADOR_DATA_DIR": pasta.name,
+                "PETICIONADOR_GRAVACAO_ASSINCRONA": "0",
+                "PETICIONADOR_ARTEFATOS_DEDUP": "1",
+            },
+        )
+        ambiente.start()
+        self.addCleanup(ambiente.stop)
+        self.driver = DriverTelas()
+
+    def conteudos(self, caminhos: List[str]) -> List[bytes]:
+        return [Path(caminho).read_bytes() for caminho in caminhos]
+
+    def test_sempre_grava_cada_etapa(self) -> None:
+        capturas = CapturasExecucao("P1", "sempre", 2)
+        for etapa in ("01_entrada", "02_login", "03_formulario"):
+            capturas.capturar(self.driver, etapa)
+
+        self.assertEqual(self.conteudos(capturas.salvos), [b"png-1", b"png-2", b"png-3"])
+        self.assertEqual([item["etapa"] for item in capturas.artefatos], ["01_entrada", "02_login", "03_formulario"])
+
+    def test_falha_so_grava_as_ultimas_se_falhar(self) -> None:
+        capturas = CapturasExecucao("P1", "falha", 2)
+        for etapa in ("01_entrada", "02_login", "03_formulario"):
+            capturas.capturar(self.driver, etapa)
+        self.assertEqual(capturas.salvos, [])
+
+        salvos = capturas.registrar_falha(self.driver)
+
+        # Buffer de 2: a primeira etapa saiu quando a captura 99_falha entrou.
+        self.assertEqual(self.conteudos(salvos), [b"png-3", b"png-4"])
+        self.assertEqual([item["etapa"] for item in capturas.artefatos], ["03_formulario", "99_falha"])
+
+    def test_falha_sem_erro_nao_grava_nada(self) -> None:
+        capturas = CapturasExecucao("P1", "falha", 3)
+        capturas.capturar(self.driver, "01_entrada")
+        self.assertEqual((capturas.salvos, capturas.artefatos), ([], []))
+
+    def test_driver_sem_tela_nao_interrompe(self) -> None:
+        driver = mock.Mock()
+        driver.get_screenshot_as_png.side_effect = RuntimeError("janela fechada")
+        capturas = CapturasExecucao("P1", "falha", 3)
+        capturas.capturar(driver, "01_entrada")
+        self.assertEqual(capturas.registrar_falha(driver), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
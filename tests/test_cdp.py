@@ -0,0 +1,28 @@
+import unittest
+from unittest import mock
+
+import robo_cdp
+from robo_cdp import url_websocket_pagina
+
+
+ALVOS = [
+    {"type": "service_worker", "id": "SW", "webSocketDebuggerUrl": "ws://sw"},
+    {"type": "page", "id": "outra", "webSocketDebuggerUrl": "ws://outra"},
+    {"type": "page", "id": "abc123", "webSocketDebuggerUrl": "ws://minha"},
+]
+
+
+class UrlWebsocketPaginaTest(unittest.TestCase):
+    def test_encontra_a_aba_pelo_id(self) -> None:
+        with mock.patch.object(robo_cdp, "listar_alvos", return_value=ALVOS):
+            self.assertEqual(url_websocket_pagina("127.0.0.1:9222", "ABC123"), "ws://minha")
+
+    def test_sem_a_aba_exata_nao_usa_outra(self) -> None:
+        with mock.patch.object(robo_cdp, "listar_alvos", return_value=ALVOS):
+            self.assertEqual(url_websocket_pagina("127.0.0.1:9222", "fechada"), "")
+            self.assertEqual(url_websocket_pagina("127.0.0.1:9222", ""), "")
+            self.assertEqual(url_websocket_pagina("127.0.0.1:9222", "SW"), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from typing import Any, Dict
+
+from robo_tjsp_base import (
+    condicao_documento_trocado,
+    condicao_texto_novo,
+    marcar_documento,
+    texto_pagina_normalizado,
+)
+
+
+class DriverFalso:
+    # Responde so aos scripts das condicoes: texto da pagina e a marca do documento.
+    def __init__(self, texto: str) -> None:
+        self.texto = texto
+        self.janela: Dict[str, Any] = {}
+
+    def navegar(self, texto: str) -> None:
+        self.texto = texto
+        self.janela = {}
+
+    def execute_script(self, script: str, *argumentos: Any) -> Any:
+        if "innerText" in script:
+            return self.texto
+        if script.startswith("window.__peticionadorMarca ="):
+            self.janela["marca"] = argumentos[0]
+            return None
+        if "__peticionadorMarca !==" in script:
+            return self.janela.get("marca") != argumentos[0]
+        raise AssertionError(script)
+
+
+TERMOS = ["protocolado", "recibo", "comprovante"]
+
+
+class CondicoesPosProtocoloTest(unittest.TestCase):
+    def test_termo_que_ja_estava_no_formulario_nao_conta(self) -> None:
+        driver = DriverFalso("Anexe o PDF. O comprovante sera emitido apos o envio.")
+        condicao = condicao_texto_novo(TERMOS, texto_pagina_normalizado(driver))
+
+        self.assertFalse(condicao(driver))
+        driver.texto += " Peticao protocolada. Comprovante disponivel."
+        self.assertTrue(condicao(driver))
+
+    def test_documento_novo_na_mesma_url(self) -> None:
+        driver = DriverFalso("Formulario")
+        condicao = condicao_documento_trocado(marcar_documento(driver))
+
+        self.assertFalse(condicao(driver))
+        driver.navegar("Formulario")
+        self.assertTrue(condicao(driver))
+
+    def test_sem_marca_nao_passa(self) -> None:
+        self.assertFalse(condicao_documento_trocado("")(DriverFalso("")))
+
+
+if __name__ == "__main__":
+    unittest.main()
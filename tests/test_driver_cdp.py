@@ -0,0 +1,44 @@
+import os
+import threading
+import unittest
+from unittest import mock
+
+from robo_driver_cdp import DriverCdp
+from robo_tjsp_base import driver_cdp_ativo
+
+
+class DriverCdpTest(unittest.TestCase):
+    def test_backend_so_com_a_flag_experimental(self) -> None:
+        with mock.patch.dict(os.environ, {"PETICIONADOR_DRIVER": "cdp"}):
+            os.environ.pop("PETICIONADOR_DRIVER_CDP_EXPERIMENTAL", None)
+            self.assertFalse(driver_cdp_ativo())
+        with mock.patch.dict(
+            os.environ, {"PETICIONADOR_DRIVER": "cdp", "PETICIONADOR_DRIVER_CDP_EXPERIMENTAL": "1"}
+        ):
+            self.assertTrue(driver_cdp_ativo())
+        with mock.patch.dict(
+            os.environ, {"PETICIONADOR_DRIVER": "selenium", "PETICIONADOR_DRIVER_CDP_EXPERIMENTAL": "1"}
+        ):
+            self.assertFalse(driver_cdp_ativo())
+
+    def test_ordem_das_abas_entre_threads(self) -> None:
+        driver = DriverCdp("chrome", "127.0.0.1:0")
+        self.addCleanup(driver.quit)
+
+        def abrir_e_fechar(prefixo: str) -> None:
+            for indice in range(200):
+                aba = f"{prefixo}{indice}"
+                driver._registrar_abas([aba, "principal"])
+                driver._remover_aba(aba)
+
+        threads = [threading.Thread(target=abrir_e_fechar, args=(f"t{n}-",)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(driver._registrar_abas([]), ["principal"])
+
+
+if __name__ == "__main__":
+    unittest.main()
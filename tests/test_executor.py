@@ -0,0 +1,259 @@
+import threading
+import time
+import unittest
+from typing import Any, Dict, List
+from unittest import mock
+
+import robo_tjsp_base
+from robo_executor import BaldeTokens, ExecutorPeticoes, LimitesExecutor
+from robo_tjsp_base import liberar_navegadores_ociosos
+
+
+def payload_real(protocolo: str, prazo: str = "", host: str = "eproc1g.tjsp.jus.br") -> Dict[str, Any]:
+    payload = {
+        "tribunal": "tjsp",
+        "modoExecucao": "real",
+        "protocolo": protocolo,
+        "tjsp": {"canal": "eproc", "entradaUrl": f"https://{host}/eproc/"},
+    }
+    if prazo:
+        payload["prazo"] = prazo
+    return payload
+
+
+class BaldeTokensTest(unittest.TestCase):
+    def test_rajada_e_reposicao(self) -> None:
+        balde = BaldeTokens(por_minuto=60, rajada=2)
+        agora = time.monotonic()
+        self.assertEqual(balde.espera(agora), 0.0)
+        balde.consumir(agora)
+        self.assertEqual(balde.espera(agora), 0.0)
+        balde.consumir(agora)
+        self.assertAlmostEqual(balde.espera(agora), 1.0)
+        self.assertAlmostEqual(balde.espera(agora + 0.25), 0.75)
+        self.assertEqual(balde.espera(agora + 1.0), 0.0)
+
+    def test_reposicao_nao_passa_da_rajada(self) -> None:
+        balde = BaldeTokens(por_minuto=60, rajada=2)
+        agora = time.monotonic()
+        for _ in range(3):
+            self.assertEqual(balde.espera(agora), 0.0)
+            balde.consumir(agora)
+            agora += 3600.0
+        balde.consumir(agora)
+        balde.consumir(agora)
+        self.assertAlmostEqual(balde.espera(agora), 1.0)
+
+    def test_consulta_anterior_a_criacao_nao_gera_espera(self) -> None:
+        agora = time.monotonic()
+        balde = BaldeTokens(por_minuto=12, rajada=1)
+        self.assertEqual(balde.espera(agora), 0.0)
+
+    def test_taxa_zero_nao_limita(self) -> None:
+        balde = BaldeTokens(por_minuto=0, rajada=1)
+        for _ in range(10):
+            balde.consumir(1000.0)
+        self.assertEqual(balde.espera(1000.0), 0.0)
+
+
+class EsperaParaIniciarTest(unittest.TestCase):
+    def executor(self, **limites: Any) -> ExecutorPeticoes:
+        limites.setdefault("taxa_por_minuto", {})
+        return ExecutorPeticoes(LimitesExecutor(**limites), lambda payload: {"ok": True})
+
+    def test_limite_global_usa_o_menor_entre_peticoes_e_navegadores(self) -> None:
+        executor = self.executor(max_simultaneas=4, max_navegadores=2, por_tribunal={}, por_host={})
+        executor._ativos = 1
+        self.assertEqual(executor._espera_para_iniciar("tjsp", "host", 0.0), 0.0)
+        executor._ativos = 2
+        self.assertIsNone(executor._espera_para_iniciar("tjsp", "host", 0.0))
+
+    def test_limite_por_tribunal_e_por_host(self) -> None:
+        executor = self.executor(por_tribunal={"tjsp": 1, "*": 0}, por_host={"*": 2})
+        executor._ativos = 1
+        executor._ativos_tribunal = {"tjsp": 1}
+        executor._ativos_host = {"a": 1}
+        self.assertIsNone(executor._espera_para_iniciar("tjsp", "a", 0.0))
+        self.assertEqual(executor._espera_para_iniciar("tjsp2", "a", 0.0), 0.0)
+        executor._ativos_host = {"a": 2}
+        self.assertIsNone(executor._espera_para_iniciar("tjsp2", "a", 0.0))
+        self.assertEqual(executor._espera_para_iniciar("tjsp2", "b", 0.0), 0.0)
+
+    def test_balde_vazio_devolve_a_espera(self) -> None:
+        executor = self.executor(por_host={}, taxa_por_minuto={"*": 60}, rajada=1)
+        agora = time.monotonic()
+        executor._balde("a").consumir(agora)
+        self.assertAlmostEqual(executor._espera_para_iniciar("tjsp", "a", agora), 1.0)
+        self.assertEqual(executor._espera_para_iniciar("tjsp", "b", agora), 0.0)
+
+
+class ExecutorGruposTest(unittest.TestCase):
+    def executor(self, registro: List[Dict[str, Any]]) -> ExecutorPeticoes:
+        trava = threading.Lock()
+
+        def executar(payload: Dict[str, Any]) -> Dict[str, Any]:
+            with trava:
+                registro.append({"protocolo": payload["protocolo"], "thread": threading.get_ident()})
+            return {"ok": True, "protocolo": payload["protocolo"]}
+
+        limites = LimitesExecutor(max_simultaneas=4, max_navegadores=4, por_host={"*": 0}, taxa_por_minuto={"*": 0})
+        return ExecutorPeticoes(limites, executar)
+
+    def test_grupo_roda_em_sequencia_na_mesma_vaga(self) -> None:
+        registro: List[Dict[str, Any]] = []
+        payloads = [
+            payload_real("a1", "2026-10-30"),
+            payload_real("b1"),
+            payload_real("a2", "2026-10-20"),
+            payload_real("b2"),
+        ]
+
+        resultados = self.executor(registro).executar_lote(payloads, [[0, 2], [1, 3]])
+
+        self.assertEqual([resultado["protocolo"] for resultado in resultados], ["a1", "b1", "a2", "b2"])
+        grupo_a = [item for item in registro if item["protocolo"].startswith("a")]
+        grupo_b = [item for item in registro if item["protocolo"].startswith("b")]
+        self.assertEqual(len({item["thread"] for item in grupo_a}), 1)
+        self.assertEqual(len({item["thread"] for item in grupo_b}), 1)
+        # Dentro do grupo, prazo mais curto primeiro.
+        self.assertEqual([item["protocolo"] for item in grupo_a], ["a2", "a1"])
+
+    def test_sem_grupos_cada_peticao_ocupa_sua_vaga(self) -> None:
+        registro: List[Dict[str, Any]] = []
+        payloads = [payload_real("a1"), payload_real("a2"), {"tribunal": "tjsp", "protocolo": "s1"}]
+
+        resultados = self.executor(registro).executar_lote(payloads)
+
+        self.assertTrue(all(resultado["ok"] for resultado in resultados))
+        self.assertEqual(sorted(item["protocolo"] for item in registro), ["a1", "a2", "s1"])
+
+    def test_grupo_com_hosts_diferentes_respeita_o_limite_de_cada_host(self) -> None:
+        registro: List[Dict[str, Any]] = []
+        executor = self.executor(registro)
+        executor.limites.por_host = {"*": 1}
+        unidades: List[Any] = []
+        rodar = executor._rodar_com_navegador
+
+        def rodar_registrando(itens: Any, tribunal: str, host: str, resultados: Any) -> None:
+            unidades.append((host, [item[1]["protocolo"] for item in itens]))
+            rodar(itens, tribunal, host, resultados)
+
+        executor._rodar_com_navegador = rodar_registrando  # type: ignore[assignment]
+        payloads = [payload_real("a1"), payload_real("b1", host="eproc2g.tjsp.jus.br"), payload_real("a2")]
+        executor.executar_lote(payloads, [[0, 1, 2]])
+
+        self.assertEqual(
+            sorted(unidades),
+            [("eproc1g.tjsp.jus.br", ["a1", "a2"]), ("eproc2g.tjsp.jus.br", ["b1"])],
+        )
+
+
+class DriverFalso:
+    def __init__(self) -> None:
+        self.fechado = False
+
+    def quit(self) -> None:
+        self.fechado = True
+
+
+class NavegadoresOciososTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.addCleanup(robo_tjsp_base.SESSOES_NAVEGADOR.clear)
+        self.addCleanup(robo_tjsp_base.SESSOES_RETOMADA.clear)
+        self.addCleanup(robo_tjsp_base.NAVEGADORES_COMPARTILHADOS.clear)
+
+    def sessao(self, ultimo_uso: float) -> Dict[str, Any]:
+        return {"driver": DriverFalso(), "ultimoUso": ultimo_uso}
+
+    def test_fecha_os_mais_antigos_ate_caber(self) -> None:
+        antiga, media, nova = self.sessao(1.0), self.sessao(2.0), self.sessao(3.0)
+        robo_tjsp_base.SESSOES_NAVEGADOR[("eproc", "a", "c1")] = [antiga, nova]
+        robo_tjsp_base.SESSOES_NAVEGADOR[("eproc", "b", "c1")] = [media]
+        ociosa_compartilhada = {"driver": DriverFalso(), "contextos": 0}
+        em_uso_compartilhada = {"driver": DriverFalso(), "contextos": 1}
+        robo_tjsp_base.NAVEGADORES_COMPARTILHADOS[("eproc", "x", "c1")] = ociosa_compartilhada
+        robo_tjsp_base.NAVEGADORES_COMPARTILHADOS[("eproc", "y", "c1")] = em_uso_compartilhada
+
+        self.assertEqual(liberar_navegadores_ociosos(2), 2)
+
+        self.assertTrue(ociosa_compartilhada["driver"].fechado)
+        self.assertTrue(antiga["driver"].fechado)
+        self.assertFalse(em_uso_compartilhada["driver"].fechado)
+        self.assertEqual(robo_tjsp_base.SESSOES_NAVEGADOR[("eproc", "a", "c1")], [nova])
+        self.assertEqual(robo_tjsp_base.SESSOES_NAVEGADOR[("eproc", "b", "c1")], [media])
+
+    def test_sessao_da_proxima_peticao_nao_conta(self) -> None:
+        reaproveitada, outra = self.sessao(1.0), self.sessao(2.0)
+        robo_tjsp_base.SESSOES_NAVEGADOR[("eproc", "a", "c1")] = [reaproveitada]
+        robo_tjsp_base.SESSOES_NAVEGADOR[("eproc", "b", "c1")] = [outra]
+        robo_tjsp_base.SESSOES_RETOMADA["P1"] = {"driver": DriverFalso(), "retidaEm": 0.5}
+
+        self.assertEqual(liberar_navegadores_ociosos(0, preservar=("eproc", "a", "c1")), 2)
+
+        self.assertFalse(reaproveitada["driver"].fechado)
+        self.assertTrue(outra["driver"].fechado)
+        self.assertEqual(robo_tjsp_base.SESSOES_RETOMADA, {})
+
+
+class NavegadorCompartilhadoTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.addCleanup(robo_tjsp_base.NAVEGADORES_COMPARTILHADOS.clear)
+
+    def test_abre_fora_da_trava_e_uma_vez_por_chave(self) -> None:
+        liberar = threading.Event()
+        abertos: List[DriverFalso] = []
+
+        def criar(**_: Any) -> Any:
+            # Outra chave consegue reservar enquanto este navegador ainda abre.
+            self.assertFalse(robo_tjsp_base._TRAVA_NAVEGADORES_COMPARTILHADOS.locked())
+            liberar.wait(5)
+            abertos.append(DriverFalso())
+            return abertos[-1], "chrome"
+
+        reservados: List[Dict[str, Any]] = []
+        with mock.patch.object(robo_tjsp_base, "criar_driver_selenium", side_effect=criar), mock.patch.object(
+            robo_tjsp_base, "endereco_debugger", return_value="127.0.0.1:9222"
+        ):
+            threads = [
+                threading.Thread(
+                    target=lambda: reservados.append(
+                        robo_tjsp_base._reservar_navegador_compartilhado(("eproc", "a", "c1"), True, [])
+                    )
+                )
+                for _ in range(3)
+            ]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.1)
+            liberar.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(len(abertos), 1)
+        self.assertEqual(len({id(item) for item in reservados}), 1)
+        self.assertIs(reservados[0]["driver"], abertos[0])
+        self.assertEqual(reservados[0]["contextos"], 3)
+
+    def test_falha_ao_abrir_libera_a_chave(self) -> None:
+        with mock.patch.object(robo_tjsp_base, "criar_driver_selenium", side_effect=RuntimeError("sem navegador")):
+            with self.assertRaises(RuntimeError):
+                robo_tjsp_base._reservar_navegador_compartilhado(("eproc", "a", "c1"), True, [])
+        self.assertEqual(robo_tjsp_base.NAVEGADORES_COMPARTILHADOS, {})
+
+    def test_uso_contado_ao_fechar_contexto(self) -> None:
+        compartilhado = {
+            "chave": ("eproc", "a", "c1"),
+            "driver": DriverFalso(),
+            "trava": threading.Lock(),
+            "contextos": 1,
+            "usos": 0,
+            "reciclar": False,
+        }
+        sessao = {"driver": DriverFalso(), "contexto": "", "compartilhado": compartilhado}
+        robo_tjsp_base.fechar_contexto_isolado(sessao)
+        self.assertEqual((compartilhado["usos"], compartilhado["contextos"]), (1, 0))
+        self.assertFalse(compartilhado["driver"].fechado)
+
+
+if __name__ == "__main__":
+    unittest.main()
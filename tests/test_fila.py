@@ -0,0 +1,153 @@
+import sqlite3
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict
+from unittest import mock
+
+from robo_fila import PASSO_PROTOCOLO, FilaPeticoes
+
+
+def payload(protocolo: str, prazo: str = "") -> Dict[str, Any]:
+    dados = {"tribunal": "tjsp", "protocolo": protocolo, "modoExecucao": "real"}
+    if prazo:
+        dados["prazo"] = prazo
+    return dados
+
+
+def dpapi_falsa() -> Any:
+    # Simula a DPAPI fora do Windows: qualquer transformacao reversivel que esconda o texto serve.
+    return mock.patch.multiple(
+        "robo_segredos",
+        protecao_disponivel=lambda: True,
+        _cifrar_dpapi=lambda dados: bytes(reversed(dados)),
+        _decifrar_dpapi=lambda dados: bytes(reversed(dados)),
+    )
+
+
+class FilaPeticoesTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.arquivo = Path(pasta.name) / "fila.sqlite3"
+        self.fila = FilaPeticoes(self.arquivo)
+
+    def estado(self, trabalho_id: int) -> str:
+        return next(item["estado"] for item in self.fila.listar() if item["id"] == trabalho_id)
+
+    def test_reserva_por_prazo_mais_curto(self) -> None:
+        self.fila.enfileirar(payload("sem-prazo"))
+        self.fila.enfileirar(payload("tarde", "2026-10-30"))
+        self.fila.enfileirar(payload("cedo", "2026-10-20T18:00:00-03:00"))
+        self.fila.enfileirar(payload("outro-sem-prazo"))
+
+        ordem = []
+        while True:
+            trabalho = self.fila.reservar("teste")
+            if trabalho is None:
+                break
+            ordem.append(trabalho["payload"]["protocolo"])
+        self.assertEqual(ordem, ["cedo", "tarde", "sem-prazo", "outro-sem-prazo"])
+
+    def test_erro_transiente_volta_para_fila_ate_o_limite(self) -> None:
+        trabalho_id = self.fila.enfileirar(payload("p1"), max_tentativas=2)["id"]
+
+        trabalho = self.fila.reservar("teste")
+        self.assertEqual(trabalho["tentativa"], 1)
+        estado = self.fila.concluir(trabalho_id, {"ok": False, "statusExecucao": "erro"}, atraso_base_segundos=0)
+        self.assertEqual(estado, "pendente")
+
+        trabalho = self.fila.reservar("teste")
+        self.assertEqual(trabalho["tentativa"], 2)
+        estado = self.fila.concluir(trabalho_id, {"ok": False, "statusExecucao": "erro"}, atraso_base_segundos=0)
+        self.assertEqual(estado, "falhou")
+        self.assertIsNone(self.fila.reservar("teste"))
+
+    def test_nova_tentativa_respeita_o_atraso(self) -> None:
+        trabalho_id = self.fila.enfileirar(payload("p1"))["id"]
+        self.fila.reservar("teste")
+        self.fila.concluir(trabalho_id, {"ok": False, "statusExecucao": "erro"}, atraso_base_segundos=600)
+        self.assertEqual(self.estado(trabalho_id), "pendente")
+        self.assertIsNone(self.fila.reservar("teste"))
+
+    def test_erro_de_validacao_nao_repete(self) -> None:
+        trabalho_id = self.fila.enfileirar(payload("p1"))["id"]
+        self.fila.reservar("teste")
+        estado = self.fila.concluir(trabalho_id, {"ok": False, "statusExecucao": "payload_invalido"})
+        self.assertEqual(estado, "falhou")
+
+    def test_sucesso_conclui(self) -> None:
+        trabalho_id = self.fila.enfileirar(payload("p1"))["id"]
+        self.fila.reservar("teste")
+        self.assertEqual(self.fila.concluir(trabalho_id, {"ok": True}), "concluido")
+
+    def test_falha_depois_do_protocolo_vai_para_conferir(self) -> None:
+        trabalho_id = self.fila.enfileirar(payload("p1"))["id"]
+        self.fila.reservar("teste")
+        self.fila.registrar_passo(trabalho_id, PASSO_PROTOCOLO)
+        estado = self.fila.concluir(trabalho_id, {"ok": False, "statusExecucao": "erro"}, atraso_base_segundos=0)
+        self.assertEqual(estado, "conferir")
+        self.assertIsNone(self.fila.reservar("teste"))
+
+    def test_clique_informado_na_resposta_vai_para_conferir(self) -> None:
+        trabalho_id = self.fila.enfileirar(payload("p1"))["id"]
+        self.fila.reservar("teste")
+        resposta = {"ok": False, "statusExecucao": "erro", "detalhesExecucao": {"cliqueProtocoloEfetuado": True}}
+        self.assertEqual(self.fila.concluir(trabalho_id, resposta, atraso_base_segundos=0), "conferir")
+
+    def test_reserva_vencida_volta_ou_vai_para_conferir(self) -> None:
+        antes = self.fila.enfileirar(payload("antes"))["id"]
+        depois = self.fila.enfileirar(payload("depois"))["id"]
+        self.fila.reservar("robo-1")
+        self.fila.reservar("robo-2")
+        self.fila.registrar_passo(depois, PASSO_PROTOCOLO)
+
+        with mock.patch("robo_fila.time.time", return_value=4102444800.0):
+            trabalho = self.fila.reservar("robo-3")
+
+        self.assertEqual(trabalho["id"], antes)
+        self.assertEqual(trabalho["tentativa"], 2)
+        self.assertEqual(self.estado(depois), "conferir")
+
+
+    def test_senha_do_certificado_nao_fica_em_claro(self) -> None:
+        dados = {**payload("p1"), "certificado": {"arquivo": "c.pfx", "senha": "senha-secreta-123"}}
+        with dpapi_falsa():
+            self.fila.enfileirar(dados)
+            with sqlite3.connect(str(self.arquivo)) as conexao:
+                gravado = conexao.execute("SELECT payload FROM trabalhos").fetchone()[0]
+            trabalho = self.fila.reservar("teste")
+
+        self.assertNotIn("senha-secreta-123", gravado)
+        self.assertEqual(trabalho["payload"]["certificado"], {"arquivo": "c.pfx", "senha": "senha-secreta-123"})
+
+    def test_senha_que_nao_abre_vai_vazia_para_o_robo(self) -> None:
+        dados = {**payload("p1"), "certificado": {"arquivo": "c.pfx", "senha": "s"}}
+        with dpapi_falsa():
+            self.fila.enfileirar(dados)
+        with mock.patch("robo_segredos._decifrar_dpapi", side_effect=OSError("outro usuario")):
+            trabalho = self.fila.reservar("teste")
+        self.assertEqual(trabalho["payload"]["certificado"]["senha"], "")
+
+    def test_prever_aponta_o_trabalho_que_perde_o_prazo(self) -> None:
+        # Sem historico, a peticao real leva os 240 s padrao: a segunda passa do prazo de 6 min.
+        prazo = datetime.fromtimestamp(time.time() + 360).astimezone().isoformat()
+        self.fila.enfileirar(payload("p1", prazo))
+        self.fila.enfileirar(payload("p2", prazo))
+        self.fila.enfileirar(payload("sem-prazo"))
+
+        previsao = self.fila.prever(1)
+
+        self.assertEqual(previsao["emRisco"], 1)
+        self.assertEqual(
+            [(item["protocolo"], item["emRisco"]) for item in previsao["trabalhos"]],
+            [("p1", False), ("p2", True), ("sem-prazo", False)],
+        )
+        self.assertIsNone(previsao["trabalhos"][2]["folgaSegundos"])
+        self.assertEqual(self.fila.prever(2)["emRisco"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
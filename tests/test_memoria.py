@@ -0,0 +1,53 @@
+import os
+import unittest
+from unittest import mock
+
+from robo_memoria import memoria_arvore_processos_mb
+from robo_tjsp_base import motivo_reciclagem_navegador
+
+
+class MotivoReciclagemTest(unittest.TestCase):
+    def setUp(self) -> None:
+        ambiente = mock.patch.dict(
+            os.environ,
+            {"PETICIONADOR_RECICLAR_APOS_PETICOES": "3", "PETICIONADOR_LIMITE_MEMORIA_NAVEGADOR_MB": "1000"},
+        )
+        ambiente.start()
+        self.addCleanup(ambiente.stop)
+
+    def test_recicla_na_ultima_peticao_permitida(self) -> None:
+        self.assertEqual(motivo_reciclagem_navegador({"usos": 1}, 100.0), "")
+        self.assertEqual(motivo_reciclagem_navegador({"usos": 2}, 100.0), "peticoes")
+
+    def test_recicla_acima_do_orcamento_de_memoria(self) -> None:
+        self.assertEqual(motivo_reciclagem_navegador({"usos": 0}, 1000.0), "")
+        self.assertEqual(motivo_reciclagem_navegador({"usos": 0}, 1000.1), "memoria")
+
+    def test_sem_medicao_so_conta_peticoes(self) -> None:
+        self.assertEqual(motivo_reciclagem_navegador({"usos": 0}, None), "")
+
+    def test_contexto_isolado_conta_os_usos_do_navegador_compartilhado(self) -> None:
+        sessao = {"usos": 0, "compartilhado": {"usos": 2}}
+        self.assertEqual(motivo_reciclagem_navegador(sessao, 100.0), "peticoes")
+
+    def test_limite_zero_desliga_o_criterio(self) -> None:
+        with mock.patch.dict(
+            os.environ,
+            {"PETICIONADOR_RECICLAR_APOS_PETICOES": "0", "PETICIONADOR_LIMITE_MEMORIA_NAVEGADOR_MB": "0"},
+        ):
+            self.assertEqual(motivo_reciclagem_navegador({"usos": 500}, 99999.0), "")
+
+
+class MemoriaArvoreProcessosTest(unittest.TestCase):
+    def test_pid_invalido_nao_mede(self) -> None:
+        self.assertIsNone(memoria_arvore_processos_mb(0))
+
+    def test_mede_o_proprio_processo(self) -> None:
+        rss = memoria_arvore_processos_mb(os.getpid())
+        if rss is None:
+            self.skipTest("sem psutil nem /proc nesta plataforma")
+        self.assertGreater(rss, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
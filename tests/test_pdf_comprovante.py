@@ -0,0 +1,100 @@
+import base64
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List
+from unittest import mock
+
+from robo_tjsp_base import _gravar_pdf_por_stream, salvar_pdf_pagina
+
+PDF = b"%PDF-1.4 comprovante " + bytes(range(256))
+
+
+class DriverPdf:
+    def __init__(self, blocos: List[Dict[str, Any]], stream: bool = True) -> None:
+        self.blocos = list(blocos)
+        self.stream = stream
+        self.comandos: List[str] = []
+
+    def execute_cdp_cmd(self, comando: str, parametros: Dict[str, Any]) -> Dict[str, Any]:
+        self.comandos.append(comando)
+        if comando == "Page.printToPDF":
+            if parametros.get("transferMode") == "ReturnAsStream":
+                if not self.stream:
+                    raise RuntimeError("transferMode nao suportado")
+                return {"stream": "h1"}
+            return {"data": base64.b64encode(PDF).decode("ascii")}
+        if comando == "IO.read":
+            return self.blocos.pop(0)
+        return {}
+
+
+def blocos_base64(dados: bytes, tamanho: int) -> List[Dict[str, Any]]:
+    partes = [dados[inicio : inicio + tamanho] for inicio in range(0, len(dados), tamanho)]
+    return [
+        {"data": base64.b64encode(parte).decode("ascii"), "base64Encoded": True, "eof": indice == len(partes) - 1}
+        for indice, parte in enumerate(partes)
+    ]
+
+
+class PdfPorStreamTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+        ambiente = mock.patch.dict(
+            "os.environ", {"PETICIONADOR_DATA_DIR": pasta.name, "PETICIONADOR_GRAVACAO_ASSINCRONA": "0"}
+        )
+        ambiente.start()
+        self.addCleanup(ambiente.stop)
+
+    def test_junta_os_blocos_e_fecha_o_stream(self) -> None:
+        driver = DriverPdf(blocos_base64(PDF, 100))
+        arquivo = self.pasta / "recibo.pdf"
+
+        self.assertEqual(_gravar_pdf_por_stream(driver, arquivo), len(PDF))
+
+        self.assertEqual(arquivo.read_bytes(), PDF)
+        self.assertEqual(driver.comandos.count("IO.read"), 3)
+        self.assertEqual(driver.comandos[-1], "IO.close")
+
+    def test_stream_vazio_nao_deixa_arquivo(self) -> None:
+        driver = DriverPdf([{"data": "", "eof": True}])
+        arquivo = self.pasta / "recibo.pdf"
+
+        with self.assertRaises(RuntimeError):
+            _gravar_pdf_por_stream(driver, arquivo)
+
+        self.assertEqual(list(self.pasta.iterdir()), [])
+        self.assertEqual(driver.comandos[-1], "IO.close")
+
+    def test_salvar_pdf_usa_o_stream(self) -> None:
+        metricas: Dict[str, Any] = {}
+        caminho = salvar_pdf_pagina(DriverPdf(blocos_base64(PDF, 1000)), "P1", "comprovante", metricas)
+
+        self.assertEqual(Path(caminho).read_bytes(), PDF)
+        self.assertEqual((metricas["modo"], metricas["bytes"]), ("stream", len(PDF)))
+
+    def test_sem_stream_volta_para_base64(self) -> None:
+        metricas: Dict[str, Any] = {}
+        driver = DriverPdf([], stream=False)
+
+        caminho = salvar_pdf_pagina(driver, "P1", "comprovante", metricas)
+
+        self.assertEqual(Path(caminho).read_bytes(), PDF)
+        self.assertEqual((metricas["modo"], metricas["bytes"]), ("base64", len(PDF)))
+        self.assertNotIn("IO.read", driver.comandos)
+
+    def test_stream_interrompido_volta_para_base64(self) -> None:
+        metricas: Dict[str, Any] = {}
+        driver = DriverPdf(blocos_base64(PDF, 100)[:1])
+
+        caminho = salvar_pdf_pagina(driver, "P1", "comprovante", metricas)
+
+        self.assertEqual(Path(caminho).read_bytes(), PDF)
+        self.assertEqual(metricas["modo"], "base64")
+        self.assertEqual(list(Path(caminho).parent.glob("*.tmp")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
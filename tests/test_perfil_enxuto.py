@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, Dict
+from unittest import mock
+
+from robo_relatorios import ArmazemRelatorios
+from robo_tjsp_base import (
+    ARGUMENTOS_PERFIL_ENXUTO,
+    argumentos_perfil_enxuto,
+    padroes_bloqueio_url,
+    perfil_enxuto_ativo,
+)
+
+
+ACESSO_TJSP = {"entradaUrl": "https://esaj.tjsp.jus.br/esaj/portal.do"}
+ACESSO_OUTRO = {"entradaUrl": "https://pje.exemplo.jus.br/login"}
+
+
+def _relatorio(bytes_recebidos: int, enxuto: bool, ok: bool = True) -> Dict[str, Any]:
+    return {
+        "modoExecucao": "real",
+        "resposta": {
+            "ok": ok,
+            "modoExecucao": "real",
+            "detalhesExecucao": {"perfilEnxuto": enxuto, "rede": {"bytesRecebidos": bytes_recebidos}},
+        },
+    }
+
+
+class PerfilEnxutoTest(unittest.TestCase):
+    def test_desligado_por_padrao_mesmo_headless(self) -> None:
+        with mock.patch.dict(os.environ, {"PETICIONADOR_HEADLESS": "1"}):
+            os.environ.pop("PETICIONADOR_PERFIL_ENXUTO", None)
+            self.assertFalse(perfil_enxuto_ativo())
+        with mock.patch.dict(os.environ, {"PETICIONADOR_PERFIL_ENXUTO": "1"}):
+            self.assertTrue(perfil_enxuto_ativo())
+
+    def test_bloqueio_por_tipo_conforme_o_host(self) -> None:
+        tjsp = argumentos_perfil_enxuto(ACESSO_TJSP)
+        outro = argumentos_perfil_enxuto(ACESSO_OUTRO)
+
+        self.assertEqual(tjsp[: len(ARGUMENTOS_PERFIL_ENXUTO)], ARGUMENTOS_PERFIL_ENXUTO)
+        self.assertIn("--blink-settings=imagesEnabled=false", tjsp)
+        self.assertIn("--disable-remote-fonts", tjsp)
+        self.assertNotIn("--blink-settings=imagesEnabled=false", outro)
+        self.assertIn("--disable-remote-fonts", outro)
+
+    def test_padroes_de_url_so_para_terceiros(self) -> None:
+        with mock.patch.dict(os.environ, {"PETICIONADOR_BLOQUEAR_URLS": "*chat.exemplo.com*"}):
+            padroes = padroes_bloqueio_url(ACESSO_TJSP)
+
+        self.assertIn("*google-analytics.com*", padroes)
+        self.assertIn("*chat.exemplo.com*", padroes)
+        self.assertFalse([padrao for padrao in padroes if padrao.startswith("*.")])
+
+
+class ReferenciaRedeTest(unittest.TestCase):
+    def test_mediana_so_de_execucoes_sem_perfil(self) -> None:
+        with tempfile.TemporaryDirectory() as pasta:
+            armazem = ArmazemRelatorios(Path(pasta) / "execucoes.sqlite3")
+            for bytes_recebidos, enxuto, ok in (
+                (1000, False, True),
+                (3000, False, True),
+                (2000, False, True),
+                (100, True, True),
+                (9000, False, False),
+                (0, False, True),
+            ):
+                armazem.registrar("", "TJSP", _relatorio(bytes_recebidos, enxuto, ok))
+
+            self.assertEqual(armazem.bytes_rede_sem_perfil_enxuto("tjsp"), 2000)
+            self.assertEqual(armazem.bytes_rede_sem_perfil_enxuto("TRF3"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
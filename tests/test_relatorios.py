@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, Dict
+from unittest import mock
+
+import robo_tjsp_base
+from robo_relatorios import ArmazemRelatorios
+
+
+def relatorio(status: str, registrado_em: str, modo: str = "real", ok: bool = False, **resposta: Any) -> Dict[str, Any]:
+    return {
+        "modoExecucao": modo,
+        "resposta": {"ok": ok, "statusExecucao": status, "protocoladoEm": registrado_em, **resposta},
+    }
+
+
+class ArmazemRelatoriosTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+        self.armazem = ArmazemRelatorios(self.pasta / "execucoes.sqlite3")
+
+    def test_consultar_por_filtros(self) -> None:
+        erro = self.armazem.registrar("P1", "tjsp", relatorio("erro", "2026-10-10T10:00:00Z"))
+        sucesso = self.armazem.registrar("P2", "tjsp", relatorio("sucesso", "2026-10-11T10:00:00Z", ok=True))
+        simulado = self.armazem.registrar("P3", "trf3", relatorio("simulado", "2026-10-12T10:00:00Z", modo="simulado"))
+
+        self.assertEqual([item["id"] for item in self.armazem.consultar()], [simulado, sucesso, erro])
+        self.assertEqual([item["id"] for item in self.armazem.consultar(tribunal="tjsp")], [sucesso, erro])
+        self.assertEqual([item["id"] for item in self.armazem.consultar(status_execucao="erro")], [erro])
+        self.assertEqual([item["id"] for item in self.armazem.consultar(modo_execucao="simulado")], [simulado])
+        self.assertEqual([item["id"] for item in self.armazem.consultar(protocolo="P2")], [sucesso])
+        self.assertEqual(
+            [item["id"] for item in self.armazem.consultar(desde="2026-10-11", ate="2026-10-12")],
+            [sucesso],
+        )
+        self.assertEqual(len(self.armazem.consultar(limite=1)), 1)
+
+        (item,) = self.armazem.consultar(execucao_id=sucesso)
+        self.assertEqual((item["protocolo"], item["tribunal"], item["ok"]), ("P2", "TJSP", True))
+        self.assertEqual(item["conteudo"]["resposta"]["statusExecucao"], "sucesso")
+        self.assertNotIn("conteudo", self.armazem.consultar(execucao_id=sucesso, incluir_conteudo=False)[0])
+
+    def test_podar_remove_as_antigas_e_devolve_o_conteudo(self) -> None:
+        self.armazem.registrar("P1", "tjsp", relatorio("erro", "2026-06-01T10:00:00Z"))
+        recente = self.armazem.registrar("P2", "tjsp", relatorio("sucesso", "2026-08-01T10:00:00Z"))
+
+        removidos = self.armazem.podar("2026-07-01")
+
+        self.assertEqual([item["resposta"]["statusExecucao"] for item in removidos], ["erro"])
+        self.assertEqual([item["id"] for item in self.armazem.consultar()], [recente])
+        self.assertEqual(self.armazem.podar("2026-07-01"), [])
+
+    def test_importar_json_legado_uma_vez(self) -> None:
+        (self.pasta / "P1_execucao.json").write_text(
+            json.dumps(relatorio("erro", "2026-10-01T10:00:00Z", tribunal="TJSP", protocolo="P1")), encoding="utf-8"
+        )
+        sem_data = self.pasta / "P2_execucao.json"
+        sem_data.write_text(json.dumps({"resposta": {"ok": True, "protocolo": "P2"}}), encoding="utf-8")
+        os.utime(sem_data, (1_790_000_000, 1_790_000_000))
+        (self.pasta / "P3_execucao.json").write_text("{corrompido", encoding="utf-8")
+        (self.pasta / "P4_execucao.json").write_text("[]", encoding="utf-8")
+
+        self.assertEqual(self.armazem.importar_json_legado(self.pasta), {"importados": 2, "ignorados": 2})
+        self.assertEqual(self.armazem.importar_json_legado(self.pasta), {"importados": 0, "ignorados": 4})
+
+        por_protocolo = {item["protocolo"]: item for item in self.armazem.consultar()}
+        self.assertEqual(por_protocolo["P1"]["tribunal"], "TJSP")
+        # Sem protocoladoEm, a data do arquivo vira a data da execucao.
+        self.assertTrue(por_protocolo["P2"]["registradoEm"].startswith("2026-09-21"))
+
+    def test_referencia_de_rede_sem_perfil_enxuto(self) -> None:
+        for bytes_recebidos, enxuto in ((100, False), (300, False), (200, False), (10, True)):
+            conteudo = relatorio(
+                "sucesso",
+                "2026-10-10T10:00:00Z",
+                ok=True,
+                detalhesExecucao={"perfilEnxuto": enxuto, "rede": {"bytesRecebidos": bytes_recebidos}},
+            )
+            self.armazem.registrar("P", "tjsp", conteudo)
+        self.assertEqual(self.armazem.bytes_rede_sem_perfil_enxuto("tjsp"), 200)
+        self.assertEqual(self.armazem.bytes_rede_sem_perfil_enxuto("trf3"), 0)
+
+
+class AnexarRelatorioExecucaoTest(unittest.TestCase):
+    def test_resposta_traz_o_id_da_execucao(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        with mock.patch.dict("os.environ", {"PETICIONADOR_DATA_DIR": pasta.name}):
+            resposta: Dict[str, Any] = {"ok": True}
+            robo_tjsp_base.anexar_relatorio_execucao(resposta, "P1", "tjsp", {"resposta": {"ok": True}})
+            consultado = robo_tjsp_base.armazem_relatorios().consultar(execucao_id=resposta["relatorioExecucaoId"])
+
+        self.assertNotIn("arquivoLogExecucao", resposta)
+        self.assertEqual([item["protocolo"] for item in consultado], ["P1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
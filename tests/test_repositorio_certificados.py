@@ -0,0 +1,99 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, Dict
+from unittest import mock
+
+import robo_tjsp_base
+from robo_tjsp_base import (
+    RepositorioCertificados,
+    RepositorioCertificadosMemoria,
+    RepositorioCertificadosWindows,
+    liberar_certificado,
+    repositorio_certificados,
+)
+
+
+class RepositorioCertificadosTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pfx = Path(pasta.name) / "certificado.pfx"
+        self.pfx.write_bytes(b"conteudo do pfx")
+        self.thumbprint = hashlib.sha1(b"conteudo do pfx").hexdigest().upper()
+
+    def test_base_exige_todos_os_metodos(self) -> None:
+        with self.assertRaises(TypeError):
+            RepositorioCertificados()
+
+        class SemRemover(RepositorioCertificados):
+            def importar(self, caminho_arquivo: str, senha: str) -> Dict[str, Any]:
+                return {}
+
+            def presente(self, thumbprint: str) -> bool:
+                return False
+
+        with self.assertRaises(TypeError):
+            SemRemover()
+
+    def test_memoria_importa_e_consulta(self) -> None:
+        repositorio = RepositorioCertificadosMemoria()
+        resultado = repositorio.importar(str(self.pfx), "senha")
+
+        self.assertTrue(resultado["importado"])
+        self.assertEqual(resultado["thumbprint"], self.thumbprint)
+        self.assertEqual(repositorio.importacoes, 1)
+        self.assertTrue(repositorio.presente(self.thumbprint.lower()))
+        self.assertFalse(repositorio.presente("00" * 20))
+
+    def test_memoria_so_remove_com_remocao_habilitada(self) -> None:
+        repositorio = RepositorioCertificadosMemoria()
+        repositorio.importar(str(self.pfx), "senha")
+
+        with mock.patch.dict(os.environ, {"PETICIONADOR_REMOVER_CERT_A1": "0"}):
+            repositorio.remover(self.thumbprint)
+        self.assertTrue(repositorio.presente(self.thumbprint))
+
+        with mock.patch.dict(os.environ, {"PETICIONADOR_REMOVER_CERT_A1": "1"}):
+            repositorio.remover(self.thumbprint)
+        self.assertFalse(repositorio.presente(self.thumbprint))
+
+    def test_liberar_sem_cache_respeita_remocao(self) -> None:
+        repositorio = RepositorioCertificadosMemoria()
+        importacao = repositorio.importar(str(self.pfx), "senha")
+
+        with mock.patch.dict(os.environ, {"PETICIONADOR_REMOVER_CERT_A1": "0"}):
+            liberar_certificado(repositorio, None, importacao)
+        self.assertTrue(repositorio.presente(self.thumbprint))
+
+        with mock.patch.dict(os.environ, {"PETICIONADOR_REMOVER_CERT_A1": "1"}):
+            liberar_certificado(repositorio, None, importacao)
+        self.assertFalse(repositorio.presente(self.thumbprint))
+
+    @unittest.skipIf(os.name == "nt", "fora do Windows o repositorio nao toca o CurrentUser\\My")
+    def test_windows_fora_do_windows_nao_importa(self) -> None:
+        repositorio = RepositorioCertificadosWindows()
+
+        self.assertFalse(repositorio.importar(str(self.pfx), "senha")["importado"])
+        self.assertFalse(repositorio.presente(self.thumbprint))
+        with mock.patch.dict(os.environ, {"PETICIONADOR_REMOVER_CERT_A1": "1"}):
+            repositorio.remover(self.thumbprint)
+
+    def test_repositorio_por_configuracao(self) -> None:
+        with mock.patch.dict(robo_tjsp_base._REPOSITORIOS_CERTIFICADOS, clear=True), mock.patch.dict(
+            os.environ,
+            {
+                "PETICIONADOR_REPOSITORIO_CERTIFICADOS": "memoria",
+                "PETICIONADOR_REPOSITORIO_CERTIFICADOS_ATRASO_MS": "250",
+            },
+        ):
+            repositorio = repositorio_certificados()
+            self.assertIsInstance(repositorio, RepositorioCertificadosMemoria)
+            self.assertEqual(repositorio.atraso_segundos, 0.25)
+            self.assertIs(repositorio_certificados(), repositorio)
+
+
+if __name__ == "__main__":
+    unittest.main()
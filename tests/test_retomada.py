@@ -0,0 +1,222 @@
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+from unittest import mock
+
+import robo_tjsp_base
+from robo_retomada import PontosRetomada
+from robo_tjsp_base import ProtocoloJaAcionado, certificado_ponto_retomada, chave_ponto_retomada
+
+ACESSO = {
+    "canal": "eproc",
+    "entradaUrl": "ENTRADA",
+    "loginUrl": "https://sso/login",
+    "serviceUrl": "https://svc",
+    "portalUrl": "https://svc",
+}
+
+
+class PontosRetomadaTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pontos = PontosRetomada(Path(pasta.name))
+
+    def test_ponto_antes_do_protocolo_vence_e_exige_o_mesmo_certificado(self) -> None:
+        self.pontos.salvar("P1", "peticao", {"etapa": "upload"}, "cert-a")
+        self.assertEqual(self.pontos.carregar("P1", "peticao", 60, "cert-a")["etapa"], "upload")
+        self.assertEqual(self.pontos.carregar("P1", "peticao", 60, "cert-b"), {})
+        self.assertEqual(self.pontos.carregar("P1", "outra-peticao", 60, "cert-a"), {})
+        with mock.patch("robo_retomada.time.time", return_value=time.time() + 120):
+            self.assertEqual(self.pontos.carregar("P1", "peticao", 60, "cert-a"), {})
+
+    def test_ponto_do_protocolo_nao_vence_ate_ser_liberado(self) -> None:
+        self.pontos.salvar("P1", "peticao", {"etapa": "protocolo", "url": "https://svc/form"}, "cert-a")
+        with mock.patch("robo_retomada.time.time", return_value=time.time() + 30 * 24 * 3600):
+            self.assertEqual(self.pontos.carregar("P1", "peticao", 60, "cert-b")["etapa"], "protocolo")
+        self.assertEqual(
+            [item["protocolo"] for item in self.pontos.pendentes_conferencia()],
+            ["P1"],
+        )
+        self.pontos.descartar("P1")
+        self.assertEqual(self.pontos.carregar("P1", "peticao", 60, "cert-a"), {})
+        self.assertEqual(self.pontos.pendentes_conferencia(), [])
+
+
+class ChavePontoRetomadaTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+
+    def test_chave_pelo_conteudo_do_pdf_e_nao_pelo_caminho(self) -> None:
+        original = self.pasta / "peticao.pdf"
+        copia = self.pasta / "movida" / "renomeada.pdf"
+        copia.parent.mkdir()
+        original.write_bytes(b"%PDF-a")
+        copia.write_bytes(b"%PDF-a")
+        payload = {"arquivo": str(original), "numeroProcesso": "1"}
+        chave = chave_ponto_retomada(payload, ACESSO, {})
+        self.assertEqual(chave, chave_ponto_retomada({**payload, "arquivo": str(copia)}, ACESSO, {}))
+        self.assertNotEqual(chave, chave_ponto_retomada({**payload, "numeroProcesso": "2"}, ACESSO, {}))
+        copia.write_bytes(b"%PDF-b")
+        self.assertNotEqual(chave, chave_ponto_retomada({**payload, "arquivo": str(copia)}, ACESSO, {}))
+
+    def test_certificado_pelo_conteudo_do_pfx(self) -> None:
+        pfx = self.pasta / "a.pfx"
+        copia = self.pasta / "b.pfx"
+        pfx.write_bytes(b"pfx")
+        copia.write_bytes(b"pfx")
+        self.assertEqual(
+            certificado_ponto_retomada({"arquivo": str(pfx)}),
+            certificado_ponto_retomada({"arquivo": str(copia)}),
+        )
+
+
+class DriverFluxo:
+    def __init__(self) -> None:
+        self.current_url = "about:blank"
+        self.window_handles = ["principal"]
+        self.fechado = False
+        self.switch_to = mock.Mock()
+
+    def get(self, url: str) -> None:
+        self.current_url = "https://sso/login" if url == "ENTRADA" else "https://svc/form"
+
+    def set_page_load_timeout(self, segundos: float) -> None:
+        pass
+
+    def execute_cdp_cmd(self, comando: str, parametros: Dict[str, Any]) -> Dict[str, Any]:
+        return {}
+
+    def execute_script(self, script: str, *argumentos: Any) -> Any:
+        return "complete"
+
+    def quit(self) -> None:
+        self.fechado = True
+
+
+class FluxoRealRetomadaTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+        ambiente = mock.patch.dict(
+            "os.environ",
+            {
+                "PETICIONADOR_DATA_DIR": str(self.pasta / "dados"),
+                "PETICIONADOR_REPOSITORIO_CERTIFICADOS": "memoria",
+                "PETICIONADOR_POOL_SESSOES": "1",
+                "PETICIONADOR_SCREENSHOTS": "falha",
+            },
+        )
+        ambiente.start()
+        self.addCleanup(ambiente.stop)
+        self.addCleanup(robo_tjsp_base.encerrar_sessoes_navegador)
+
+        self.drivers: List[DriverFluxo] = []
+        self.uploads: List[str] = []
+        self.cliques: List[str] = []
+        self.falhas = {"upload": 0, "clique": 0}
+        falsos = {
+            "criar_driver_selenium": self.criar_driver,
+            "aguardar_login": self.aguardar_login,
+            "login_concluido": lambda url, acesso: url.startswith("https://svc"),
+            "aguardar_condicao": lambda *args, **kwargs: {},
+            "resolver_campos_formulario": lambda *args: None,
+            "tentar_preencher_texto": lambda *args: (True, "input"),
+            "preparar_formulario_para_upload": lambda *args: (False, ""),
+            "anexar_arquivo": self.anexar,
+            "clicar_botao_protocolar": self.clicar,
+            "abrir_comprovante": lambda *args: (False, ""),
+            "amostrar_memoria_navegador": lambda *args: {"rssMb": 0},
+            "descartar_log_rede": lambda *args, **kwargs: 0,
+            "restaurar_sessao_salva": lambda *args, **kwargs: 0,
+            "guardar_sessao_navegador": lambda *args, **kwargs: 0,
+            "preaquecer_dns": lambda *args, **kwargs: 0,
+        }
+        substituicao = mock.patch.multiple(robo_tjsp_base, **falsos)
+        substituicao.start()
+        self.addCleanup(substituicao.stop)
+
+        self.pdf = self.pasta / "peticao.pdf"
+        self.pdf.write_bytes(b"%PDF-1.4 peticao")
+        self.pfx = self.pasta / "certificado.pfx"
+        self.pfx.write_bytes(b"pfx")
+
+    def criar_driver(self, **_: Any) -> Tuple[DriverFluxo, str]:
+        self.drivers.append(DriverFluxo())
+        return self.drivers[-1], "chrome"
+
+    def aguardar_login(self, driver: DriverFluxo, acesso: Dict[str, str], limite: int) -> str:
+        driver.current_url = "https://svc/form"
+        return driver.current_url
+
+    def anexar(self, *args: Any) -> Tuple[bool, str]:
+        self.uploads.append("anexo")
+        if self.falhas["upload"]:
+            self.falhas["upload"] -= 1
+            return False, ""
+        return True, "input[type=file]"
+
+    def clicar(self, *args: Any) -> Tuple[bool, str]:
+        self.cliques.append("clique")
+        if self.falhas["clique"]:
+            self.falhas["clique"] -= 1
+            return False, ""
+        return True, "Protocolar"
+
+    def executar(self, protocolo: str, arquivo: Path) -> Dict[str, Any]:
+        payload = {"protocolo": protocolo, "arquivo": str(arquivo), "numeroProcesso": "0001"}
+        return robo_tjsp_base.executar_fluxo_real(payload, ACESSO, {"arquivo": str(self.pfx), "senha": "s"}, {})
+
+    def test_retoma_do_anexo_no_mesmo_navegador(self) -> None:
+        self.falhas["clique"] = 1
+        with self.assertRaises(robo_tjsp_base.ErroFluxoReal) as falha:
+            self.executar("P1", self.pdf)
+        self.assertEqual(falha.exception.etapa, "upload")
+
+        resultado = self.executar("P1", self.pdf)
+
+        self.assertEqual(resultado["preparo"]["retomadaDe"], "upload")
+        self.assertIn("sessao_retomada", resultado["passos"])
+        self.assertEqual((len(self.drivers), len(self.uploads), len(self.cliques)), (1, 1, 2))
+        self.assertEqual(robo_tjsp_base.pontos_retomada().pendentes_conferencia(), [])
+
+    def test_recusa_segundo_clique_mesmo_com_o_pdf_movido(self) -> None:
+        def morre(*args: Any) -> Any:
+            raise KeyboardInterrupt
+
+        with mock.patch.object(robo_tjsp_base, "clicar_botao_protocolar", morre):
+            with self.assertRaises(KeyboardInterrupt):
+                self.executar("P2", self.pdf)
+
+        movido = self.pasta / "outra" / "peticao-final.pdf"
+        movido.parent.mkdir()
+        movido.write_bytes(self.pdf.read_bytes())
+        with mock.patch("robo_retomada.time.time", return_value=time.time() + 7 * 24 * 3600):
+            with self.assertRaises(ProtocoloJaAcionado):
+                self.executar("P2", movido)
+        self.assertEqual(self.cliques, [])
+
+        pendentes = robo_tjsp_base.pontos_retomada().pendentes_conferencia()
+        self.assertEqual([item["protocolo"] for item in pendentes], ["P2"])
+        robo_tjsp_base.pontos_retomada().descartar("P2")
+        resultado = self.executar("P2", movido)
+        self.assertEqual(resultado["botaoAcionado"], "Protocolar")
+
+    def test_ponto_gravado_sem_caminhos(self) -> None:
+        self.falhas["clique"] = 1
+        with self.assertRaises(robo_tjsp_base.ErroFluxoReal):
+            self.executar("P3", self.pdf)
+        pasta = robo_tjsp_base.pasta_automacao() / "retomadas"
+        conteudo = json.loads(next(pasta.glob("*.json")).read_text(encoding="utf-8"))
+        self.assertEqual(conteudo["protocolo"], "P3")
+        self.assertNotIn(str(self.pasta), json.dumps(conteudo))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List
+from unittest import mock
+
+from robo_sessoes import CofreSessoes
+from robo_tjsp_base import chave_cofre_sessao, guardar_sessao_navegador, restaurar_sessao_salva
+
+ACESSO = {
+    "canal": "eproc",
+    "entradaUrl": "https://eproc1g.tjsp.jus.br/eproc/",
+    "loginUrl": "https://sso.tjsp.jus.br/login",
+    "serviceUrl": "",
+    "portalUrl": "",
+}
+
+
+def cookie(nome: str, dominio: str, **extras: Any) -> Dict[str, Any]:
+    return {"name": nome, "value": f"valor-{nome}", "domain": dominio, "path": "/", **extras}
+
+
+class DriverCookies:
+    def __init__(self, cookies: List[Dict[str, Any]]) -> None:
+        self.cookies = cookies
+        self.restaurados: List[Dict[str, Any]] = []
+
+    def execute_cdp_cmd(self, comando: str, parametros: Dict[str, Any]) -> Dict[str, Any]:
+        if comando == "Network.getAllCookies":
+            return {"cookies": self.cookies}
+        self.restaurados.extend(parametros["cookies"])
+        return {}
+
+
+class CofreSessoesTest(unittest.TestCase):
+    def setUp(self) -> None:
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+        self.cofre = CofreSessoes(self.pasta / "sessoes")
+
+    def test_salvar_e_carregar_por_chave(self) -> None:
+        self.cofre.salvar("eproc_a", [cookie("JSESSIONID", "eproc1g.tjsp.jus.br")])
+        self.assertEqual([item["name"] for item in self.cofre.carregar("eproc_a", 3600)], ["JSESSIONID"])
+        self.assertEqual(self.cofre.carregar("eproc_b", 3600), [])
+        self.cofre.descartar("eproc_a")
+        self.assertEqual(self.cofre.carregar("eproc_a", 3600), [])
+
+    def test_sessao_salva_ha_mais_que_a_validade_e_ignorada(self) -> None:
+        self.cofre.salvar("eproc_a", [cookie("JSESSIONID", "eproc1g.tjsp.jus.br")])
+        with mock.patch("robo_sessoes.time.time", return_value=time.time() + 7200):
+            self.assertEqual(self.cofre.carregar("eproc_a", 3600), [])
+            self.assertEqual(len(self.cofre.carregar("eproc_a", 3 * 3600)), 1)
+
+    def test_cookie_vencido_nao_volta(self) -> None:
+        self.cofre.salvar(
+            "eproc_a",
+            [
+                cookie("vencido", "eproc1g.tjsp.jus.br", expires=time.time() - 60),
+                cookie("valido", "eproc1g.tjsp.jus.br", expires=time.time() + 3600),
+            ],
+        )
+        self.assertEqual([item["name"] for item in self.cofre.carregar("eproc_a", 3600)], ["valido"])
+
+    def test_cofre_cifrado_com_dpapi(self) -> None:
+        with mock.patch.multiple(
+            "robo_segredos",
+            protecao_disponivel=lambda: True,
+            _cifrar_dpapi=lambda dados: bytes(reversed(dados)),
+            _decifrar_dpapi=lambda dados: bytes(reversed(dados)),
+        ):
+            self.cofre.salvar("eproc_a", [cookie("SSO", "sso.tjsp.jus.br")])
+            self.assertEqual(len(self.cofre.carregar("eproc_a", 3600)), 1)
+        gravado = (self.pasta / "sessoes" / "eproc_a.json").read_bytes()
+        self.assertTrue(gravado.startswith(b"dpapi1:"))
+        self.assertNotIn(b"valor-SSO", gravado)
+
+        with mock.patch("robo_segredos._decifrar_dpapi", side_effect=OSError("outro usuario")):
+            self.assertEqual(self.cofre.carregar("eproc_a", 3600), [])
+
+    def test_chave_pelo_conteudo_do_pfx_e_pelo_canal(self) -> None:
+        pfx = self.pasta / "a.pfx"
+        copia = self.pasta / "copia.pfx"
+        pfx.write_bytes(b"pfx-a")
+        copia.write_bytes(b"pfx-a")
+        chave = chave_cofre_sessao(ACESSO, {"arquivo": str(pfx)})
+        self.assertTrue(chave.startswith("eproc_"))
+        self.assertEqual(chave, chave_cofre_sessao(ACESSO, {"arquivo": str(copia)}))
+        self.assertNotEqual(chave, chave_cofre_sessao({**ACESSO, "canal": "esaj"}, {"arquivo": str(pfx)}))
+        self.assertEqual(chave_cofre_sessao(ACESSO, {"arquivo": str(self.pasta / "sumiu.pfx")}), "")
+
+    def test_guarda_so_cookies_dos_hosts_do_portal_e_restaura(self) -> None:
+        origem = DriverCookies(
+            [
+                cookie("portal", ".tjsp.jus.br", size=10, session=True),
+                cookie("sso", "sso.tjsp.jus.br"),
+                cookie("outro", "google.com"),
+            ]
+        )
+        self.assertEqual(guardar_sessao_navegador(origem, self.cofre, "eproc_a", ACESSO), 2)
+
+        destino = DriverCookies([])
+        with mock.patch.dict("os.environ", {"PETICIONADOR_SESSOES_VALIDADE_HORAS": "8"}):
+            self.assertEqual(restaurar_sessao_salva(destino, self.cofre, "eproc_a"), 2)
+        self.assertEqual(sorted(item["name"] for item in destino.restaurados), ["portal", "sso"])
+        self.assertNotIn("size", destino.restaurados[0])
+
+
+if __name__ == "__main__":
+    unittest.main()